@@ -97,10 +97,20 @@ def get_email_rate_limit_windows() -> list:
 
 
 def get_keyword_cache_ttl() -> int:
-    """获取关键词缓存过期时间（秒）"""
+    """获取关键词缓存新鲜期/软 TTL（秒）：期间直接复用缓存结果"""
     return get_config('keyword_cache_ttl', 3600, int)
 
 
+def get_keyword_cache_hard_ttl() -> int:
+    """获取关键词缓存硬 TTL（秒）：软 TTL 之后到硬 TTL 之前复用过时结果并后台刷新"""
+    return max(get_config('keyword_cache_hard_ttl', 21600, int), get_keyword_cache_ttl())
+
+
+def get_keyword_cache_negative_ttl() -> int:
+    """获取关键词负缓存时间（秒）：爬取失败或没有结果时只缓存这么久"""
+    return max(get_config('keyword_cache_negative_ttl', 60, int), 1)
+
+
 def get_index_recent_tasks_count() -> int:
     """获取首页显示最近任务数量"""
     return get_config('index_recent_tasks_count', 15, int)
@@ -126,6 +136,16 @@ def get_result_expire_hours() -> int:
     return get_config('result_expire_hours', 24, int)
 
 
+def get_result_retention_hours() -> int:
+    """
+    获取任务与结果的保留时间（小时）：更早的任务、结果与资源由定时任务删除
+
+    不小于结果页面过期时间加关键词缓存硬 TTL：命中关键词缓存的新任务仍会展示原任务的结果
+    """
+    floor = get_result_expire_hours() + -(-get_keyword_cache_hard_ttl() // 3600)
+    return max(get_config('result_retention_hours', 72, int), floor)
+
+
 def get_email_config() -> dict:
     """获取邮件配置"""
     import os
@@ -144,3 +164,63 @@ def get_crawl_timeout_seconds() -> int:
     """获取爬虫超时时间（秒）"""
     return get_config('crawl_timeout_seconds', 1200, int)
 
+
+
+def get_crawl_mode() -> str:
+    """获取爬虫执行模式：subprocess（每任务独立子进程）或 daemon（常驻爬虫服务）"""
+    mode = (get_config('crawl_mode', 'subprocess') or '').strip().lower()
+    return mode if mode in ('subprocess', 'daemon') else 'subprocess'
+
+
+def get_crawl_fanout_group_size() -> int:
+    """获取分站点并行爬取时每个子任务包含的站点数（0 表示不拆分，整个任务在一个进程内爬取）"""
+    return max(get_config('crawl_fanout_group_size', 0, int), 0)
+
+
+def get_crawl_fanout_timeout_seconds() -> int:
+    """获取分站点并行爬取时每个子任务的超时时间（秒），未配置或为 0 时沿用爬虫超时时间"""
+    return get_config('crawl_fanout_timeout_seconds', None, int) or get_crawl_timeout_seconds()
+
+
+def get_crawl_batch_size() -> int:
+    """获取批量爬取时一次爬虫运行最多合并的关键词任务数（1 表示不合并；分站点并行开启时不生效）"""
+    return max(get_config('crawl_batch_size', 1, int), 1)
+
+
+def get_crawl_batch_window_seconds() -> int:
+    """获取批量爬取的合并窗口（秒）：任务入队后等待该时间再开始爬取，期间到达的任务一起执行"""
+    return max(get_config('crawl_batch_window_seconds', 2, int), 0)
+
+
+def get_http_cache_ttls() -> dict:
+    """获取爬虫响应缓存时间（秒），按请求类型区分，0 表示不缓存"""
+    return {
+        'workflow': max(get_config('httpcache_ttl_workflow', 0, int), 0),
+        'search': max(get_config('httpcache_ttl_search', 600, int), 0),
+        'detail': max(get_config('httpcache_ttl_detail', 86400, int), 0),
+    }
+
+
+def get_workflow_cache_ttl() -> int:
+    """获取工作流变量（token / cookie）的缓存时间（秒），0 表示每次爬取都重新执行工作流"""
+    return max(get_config('workflow_cache_ttl', 600, int), 0)
+
+
+def get_extract_pool_config() -> dict:
+    """获取解析池配置：workers 为 0 时在 reactor 线程中解析，pool 为 thread（线程池）或 process（进程池）"""
+    pool = get_config('crawl_extract_pool', 'thread')
+    return {
+        'workers': max(get_config('crawl_extract_workers', 0, int), 0),
+        'pool': pool if pool in ('thread', 'process') else 'thread',
+    }
+
+
+def get_rate_limit_config() -> dict:
+    """获取站点全局限速配置（速率单位：请求/秒）"""
+    return {
+        'enabled': get_config('rate_limit_enabled', True, bool),
+        'min_rate': get_config('rate_limit_min_rps', 0.2, float) or 0.2,
+        'max_rate': get_config('rate_limit_max_rps', 5.0, float) or 5.0,
+        'increase': get_config('rate_limit_increase_rps', 0.1, float),
+        'decrease_factor': get_config('rate_limit_decrease_factor', 0.5, float) or 0.5,
+    }
@@ -77,11 +77,12 @@ class EmailRuleForm(forms.ModelForm):
 
 
 class SystemConfigForm(forms.ModelForm):
+    key = forms.ChoiceField(choices=[('', '---------')] + SystemConfig.KEY_CHOICES, label='配置键')
+
     class Meta:
         model = SystemConfig
         fields = ['key', 'value', 'description']
         widgets = {
-            'key': forms.Select(choices=SystemConfig.KEY_CHOICES),
             'value': forms.Textarea(attrs={'rows': 3}),
             'description': forms.TextInput(attrs={'placeholder': '可选，用于说明此配置的用途'}),
         }
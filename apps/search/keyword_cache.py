@@ -0,0 +1,154 @@
+"""
+关键词缓存与单飞（single-flight）认领
+
+kw:{规范化关键词} 的值为负责该关键词的任务 task_id（hex）：
+- 提交时用 SET NX 原子认领，同一关键词同一时间只会有一个爬取任务，
+  并发提交者作为 is_cache=True 的跟随者挂到该任务的 related_task_id 上；
+- 爬取期间该 key 是 leader 的租约（有效期覆盖爬取超时），爬取结束后按缓存策略续期；
+- leader 爬取失败时：已有跟随者则交接（续约并重新爬取一次），否则写入负缓存。
+
+缓存策略（stale-while-revalidate）：
+- 软 TTL（keyword_cache_ttl）内结果新鲜，直接复用（kw:fresh:{关键词} 标记存活期间）；
+- 软 TTL 与硬 TTL（keyword_cache_hard_ttl）之间结果过时，仍直接复用，
+  同时由第一个命中的请求发起一次后台刷新（kw:refresh:{关键词} 认领），刷新成功后切换到新任务；
+- 失败或没有结果的爬取只缓存 keyword_cache_negative_ttl 秒，很快会重新爬取。
+"""
+from .config_utils import (
+    get_crawl_fanout_timeout_seconds, get_crawl_timeout_seconds, get_keyword_cache_hard_ttl,
+    get_keyword_cache_negative_ttl, get_keyword_cache_ttl
+)
+
+KEYWORD_CACHE_KEY = 'kw:{keyword}'
+FRESH_KEY = 'kw:fresh:{keyword}'
+REFRESH_KEY = 'kw:refresh:{keyword}'
+HANDOVER_KEY = 'kw:handover:{task_hex}'
+STATS_KEY = 'kw:stats'
+# 命中统计项：hit=新鲜命中，stale=过时命中（触发后台刷新），miss=未命中发起爬取
+STATS_FIELDS = ('hit', 'stale', 'miss')
+# leader 失败后最多交接重试的次数，避免持续失败的关键词反复爬取
+MAX_HANDOVERS = 1
+# 租约在爬取超时之外额外保留的时间（排队、进程启动与结果落库）
+LEASE_GRACE_SECONDS = 300
+
+# 仅当 key 仍属于指定任务时才续期，避免覆盖其他任务的新租约
+_COMPARE_AND_EXPIRE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# KEYS: kw, fresh；ARGV: task_hex, kw 有效期, 新鲜期, force
+# force=1（后台刷新成功）时无条件切换到该任务，否则仅当 kw 仍属于该任务时写入
+_SETTLE_LUA = """
+if ARGV[4] == '1' or redis.call('GET', KEYS[1]) == ARGV[1] then
+  redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+  redis.call('SET', KEYS[2], ARGV[1], 'EX', ARGV[3])
+  return 1
+end
+return 0
+"""
+
+
+def normalize_keyword(keyword: str) -> str:
+    return (keyword or '').strip().lower()
+
+
+def keyword_cache_key(norm_keyword: str) -> str:
+    return KEYWORD_CACHE_KEY.format(keyword=norm_keyword)
+
+
+def get_lease_seconds() -> int:
+    """租约有效期：覆盖一次完整爬取"""
+    crawl_seconds = max(get_crawl_timeout_seconds(), get_crawl_fanout_timeout_seconds())
+    return crawl_seconds + LEASE_GRACE_SECONDS
+
+
+def claim_keyword(rds, norm_keyword: str, task_hex: str, attempts: int = 3):
+    """
+    认领关键词
+
+    Returns:
+        (is_leader, leader_hex)：认领成功时 leader_hex 即 task_hex；
+        否则返回当前 leader（key 在读取前恰好过期时重试认领）
+    """
+    key = keyword_cache_key(norm_keyword)
+    lease_seconds = get_lease_seconds()
+    for _ in range(attempts):
+        if rds.set(key, task_hex, nx=True, ex=lease_seconds):
+            return True, task_hex
+        leader_hex = rds.get(key)
+        if leader_hex:
+            return False, leader_hex
+    return False, None
+
+
+def is_fresh(rds, norm_keyword: str, task_hex: str) -> bool:
+    """缓存的任务是否仍在软 TTL（或负缓存 TTL）内"""
+    return rds.get(FRESH_KEY.format(keyword=norm_keyword)) == task_hex
+
+
+def claim_refresh(rds, norm_keyword: str, task_hex: str) -> bool:
+    """认领过时缓存的后台刷新，同一关键词同一时间只有一个刷新任务"""
+    return bool(rds.set(REFRESH_KEY.format(keyword=norm_keyword), task_hex, nx=True, ex=get_lease_seconds()))
+
+
+def is_refresh(rds, norm_keyword: str, task_hex: str) -> bool:
+    return rds.get(REFRESH_KEY.format(keyword=norm_keyword)) == task_hex
+
+
+def settle_keyword(rds, norm_keyword: str, task_hex: str, has_results: bool, refresh: bool = False) -> bool:
+    """
+    爬取结束后按缓存策略写入关键词缓存
+
+    Args:
+        has_results: 爬取成功且有结果；否则按负缓存处理
+        refresh: 该任务是过时缓存的后台刷新
+    """
+    kw_key = keyword_cache_key(norm_keyword)
+    fresh_key = FRESH_KEY.format(keyword=norm_keyword)
+    if refresh:
+        refresh_key = REFRESH_KEY.format(keyword=norm_keyword)
+        if not has_results:
+            # 刷新失败继续提供旧结果，负缓存时间后允许再次刷新
+            rds.eval(_COMPARE_AND_EXPIRE_LUA, 1, refresh_key, task_hex, get_keyword_cache_negative_ttl())
+            return False
+        rds.delete(refresh_key)
+        return bool(rds.eval(_SETTLE_LUA, 2, kw_key, fresh_key, task_hex,
+                             get_keyword_cache_hard_ttl(), get_keyword_cache_ttl(), 1))
+
+    if has_results:
+        kw_ttl = get_keyword_cache_hard_ttl()
+        fresh_ttl = get_keyword_cache_ttl()
+    else:
+        kw_ttl = fresh_ttl = get_keyword_cache_negative_ttl()
+    return bool(rds.eval(_SETTLE_LUA, 2, kw_key, fresh_key, task_hex, kw_ttl, fresh_ttl, 0))
+
+
+def renew_keyword(rds, norm_keyword: str, task_hex: str, ttl: int) -> bool:
+    """续期 leader 的认领（交接重试时按租约续期）"""
+    return bool(rds.eval(_COMPARE_AND_EXPIRE_LUA, 1, keyword_cache_key(norm_keyword), task_hex, int(ttl)))
+
+
+def take_handover(rds, task_hex: str) -> bool:
+    """登记一次交接重试，超过 MAX_HANDOVERS 次返回 False"""
+    key = HANDOVER_KEY.format(task_hex=task_hex)
+    pipe = rds.pipeline()
+    pipe.incr(key)
+    pipe.expire(key, get_lease_seconds())
+    count, _ = pipe.execute()
+    return count <= MAX_HANDOVERS
+
+
+def record_cache_event(rds, event: str):
+    rds.hincrby(STATS_KEY, event, 1)
+
+
+def get_cache_stats(rds) -> dict:
+    """关键词缓存命中统计：{'hit', 'stale', 'miss', 'total', 'hit_ratio'}"""
+    raw = rds.hgetall(STATS_KEY) or {}
+    stats = {field: int(raw.get(field) or 0) for field in STATS_FIELDS}
+    stats['total'] = sum(stats.values())
+    served = stats['hit'] + stats['stale']
+    stats['hit_ratio'] = round(served * 100 / stats['total'], 1) if stats['total'] else 0
+    return stats
@@ -13,13 +13,32 @@ class Command(BaseCommand):
             ('email_rate_limit_60', '3', '邮箱限流：60秒内最多3次请求'),
             ('email_rate_limit_3600', '10', '邮箱限流：3600秒内最多10次请求'),
             ('email_rate_limit_86400', '30', '邮箱限流：86400秒内最多30次请求'),
-            ('keyword_cache_ttl', '3600', '关键词缓存过期时间（秒）'),
+            ('keyword_cache_ttl', '3600', '关键词缓存新鲜期（秒）：期间相同关键词直接复用结果'),
+            ('keyword_cache_hard_ttl', '21600', '关键词缓存硬过期时间（秒）：超过新鲜期后仍复用旧结果并在后台刷新，超过该时间重新爬取'),
+            ('keyword_cache_negative_ttl', '60', '关键词负缓存时间（秒）：爬取失败或没有结果时只缓存这么久'),
             ('index_recent_tasks_count', '15', '首页显示最近任务数量'),
             ('square_display_count', '50', '资源广场显示数量'),
             ('square_fetch_count', '200', '资源广场去重前获取数量'),
             ('square_expire_hours', '24', '资源广场资源过期时间（小时）'),
             ('result_expire_hours', '24', '结果页面过期时间（小时）'),
+            ('result_retention_hours', '72', '任务与结果保留时间（小时）：更早的任务、结果与资源由定时任务删除，不小于结果页面过期时间加关键词缓存硬过期时间'),
             ('crawl_timeout_seconds', '1200', '爬虫超时时间（秒）'),
+            ('crawl_mode', 'subprocess', '爬虫执行模式：subprocess=每个任务独立子进程，daemon=投递到常驻爬虫服务（run_crawler_daemon）'),
+            ('crawl_fanout_group_size', '0', '分站点并行爬取：每个 Celery 子任务包含的站点数，0 表示不拆分'),
+            ('crawl_fanout_timeout_seconds', '0', '分站点并行爬取：每个子任务的超时时间（秒），0 表示沿用爬虫超时时间'),
+            ('crawl_batch_size', '1', '批量爬取：一次爬虫运行最多合并的关键词任务数，1 表示不合并（分站点并行开启时不生效）'),
+            ('crawl_batch_window_seconds', '2', '批量爬取：任务入队后等待合并的时间（秒）'),
+            ('httpcache_ttl_workflow', '0', '响应缓存：工作流请求（获取 token/cookie）的缓存时间（秒），0 表示不缓存'),
+            ('httpcache_ttl_search', '600', '响应缓存：搜索请求的缓存时间（秒），0 表示不缓存'),
+            ('httpcache_ttl_detail', '86400', '响应缓存：详情页的缓存时间（秒），0 表示不缓存'),
+            ('workflow_cache_ttl', '600', '工作流变量缓存时间（秒）：工作流提取的 token 与 cookie 按站点缓存，期间的爬取直接搜索，0 表示不缓存'),
+            ('crawl_extract_workers', '0', '解析池工作线程/进程数：结果页与详情页的解析提交到解析池执行，不阻塞其他站点的下载，0 表示在爬虫主线程中解析'),
+            ('crawl_extract_pool', 'thread', '解析池类型：thread（线程池）或 process（进程池，可利用多核，有序列化开销）'),
+            ('rate_limit_enabled', 'true', '站点全局限速：所有爬虫进程通过 Redis 共享每个站点的请求速率'),
+            ('rate_limit_min_rps', '0.2', '站点全局限速：最小速率（请求/秒），收到 403/429/503 时最多降到该值'),
+            ('rate_limit_max_rps', '5', '站点全局限速：最大速率（请求/秒），正常响应时最多升到该值（不超过站点 delay 对应的速率）'),
+            ('rate_limit_increase_rps', '0.1', '站点全局限速：正常响应时每秒增加的速率（请求/秒）'),
+            ('rate_limit_decrease_factor', '0.5', '站点全局限速：收到 403/429/503 时速率乘以该因子'),
         ]
 
         created = 0
@@ -0,0 +1,25 @@
+"""
+启动常驻爬虫服务
+配合 SystemConfig crawl_mode=daemon 使用，crawl_task 会把爬取任务投递给本服务执行
+"""
+from django.core.management.base import BaseCommand
+
+from scraper.daemon import CrawlerDaemon
+
+
+class Command(BaseCommand):
+    help = '启动常驻爬虫服务（保持 reactor 常驻，通过 Redis 队列接收 crawl_task 爬取任务）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help='工作进程数量')
+        parser.add_argument('--max-jobs', type=int, default=50, help='每个工作进程执行多少个任务后回收重启')
+        parser.add_argument('--max-concurrent', type=int, default=4, help='每个工作进程同时执行的任务数')
+        parser.add_argument('--max-rss-mb', type=int, default=0, help='工作进程内存峰值超过该值(MB)后回收重启，0 表示不限制')
+
+    def handle(self, *args, **options):
+        CrawlerDaemon(
+            workers=max(options['workers'], 1),
+            max_jobs=options['max_jobs'],
+            max_concurrent=max(options['max_concurrent'], 1),
+            max_rss_mb=options['max_rss_mb'],
+        ).serve_forever()
@@ -0,0 +1,17 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # 配置键不再使用字段 choices（下拉选项由 SystemConfigForm 提供），之后新增配置项不需要迁移
+
+    dependencies = [
+        ('search', '0009_systemconfig'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='systemconfig',
+            name='key',
+            field=models.CharField(db_index=True, max_length=100, unique=True, verbose_name='配置键'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0010_alter_systemconfig_key'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='searchtask',
+            name='status',
+            field=models.CharField(choices=[('PENDING', '排队中'), ('RUNNING', '正在爬取'), ('SUCCESS', '检索成功'), ('PARTIAL', '部分完成'), ('FAILURE', '检索失败')], default='PENDING', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='searchtask',
+            name='site_status',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
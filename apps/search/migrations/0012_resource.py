@@ -0,0 +1,195 @@
+import hashlib
+import re
+from urllib.parse import unquote, urlsplit, urlunsplit
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# 迁移已有结果时每批处理的行数
+BATCH_SIZE = 2000
+
+# 以下为编写本迁移时 config/rules.yaml 与 scraper.spiders.utils 中链接识别、规范化逻辑的固定副本：
+# 之后修改规则或规范化代码不会改变本迁移的结果
+OTHER_DISK = "其他"
+SHARE_CODE_PARAMS = ('pwd', 'password', 'passcode', 'pass')
+_BTIH_RE = re.compile(r'btih:([a-zA-Z0-9]+)')
+# (name, pattern, canonical_host)，按顺序匹配
+NETDISK_RULES = [
+    ("百度网盘", r"(?:https?://)?(?:pan\.baidu\.com|bdpan\.com|baiduyun\.com)/", None),
+    ("夸克网盘", r"(?:https?://)?pan\.quark\.cn/", None),
+    ("迅雷网盘", r"(?:https?://)?pan\.xunlei\.com/", None),
+    ("UC网盘", r"(?:https?://)?(?:pan\.uc\.cn|drive\.uc\.cn)/", "drive.uc.cn"),
+    ("悟空网盘", r"(?:https?://)?pan\.wkbrowser\.com/", None),
+    ("快兔网盘", r"(?:https?://)?(?:diskyun\.com|www\.diskyun\.com)/", None),
+    ("115网盘", r"(?:https?://)?(?:115\.com|115pan\.com|115cdn\.com|anxia\.com)/", "115cdn.com"),
+    ("阿里云盘", r"(?:https?://)?(?:drive\.aliyun\.com|aliyundrive\.com|alipan\.com)/", "www.alipan.com"),
+    ("天翼云盘", r"(?:https?://)?cloud\.189\.cn/", None),
+    ("移动云盘", r"(?:https?://)?(?:pan\.10086\.cn|caiyun\.139\.com|yun\.139\.com)/", None),
+    ("联通云盘", r"(?:https?://)?pan\.wo\.cn/", None),
+    ("123云盘", r"(?:https?://)?(?:123pan\.com|123\d{3}\.com)/", "www.123pan.com"),
+    ("PikPak", r"(?:https?://)?(?:www\.)?pikpak\.com/", "mypikpak.com"),
+    ("磁力链接", r"^magnet:\?xt=urn:btih:", None),
+    ("迅雷链接", r"thunder://[A-Za-z0-9+/=]+", None),
+    ("电驴链接", r"^ed2k://", None),
+]
+_COMPILED_RULES = [(name, re.compile(pattern, re.IGNORECASE), host) for name, pattern, host in NETDISK_RULES]
+
+
+def classify_link(link):
+    link = link.strip().lower()
+    for name, pattern, _ in _COMPILED_RULES:
+        if pattern.search(link):
+            return name
+    return OTHER_DISK
+
+
+def canonicalize_link(link, disk=None):
+    """返回 (canonical_url, dedup_key)，与 0012 编写时的 NetdiskClassifier.canonicalize 一致"""
+    link = link.strip()
+    lower = link.lower()
+    if lower.startswith('magnet:'):
+        match = _BTIH_RE.search(link)
+        if not match:
+            return link, link
+        info_hash = match.group(1)
+        info_hash = info_hash.lower() if len(info_hash) == 40 else info_hash.upper()
+        link = link[:match.start(1)] + info_hash + link[match.end(1):]
+        return link, f'btih:{info_hash}'
+    if lower.startswith('ed2k://'):
+        parts = link.split('|')
+        if len(parts) >= 5 and parts[1].lower() == 'file':
+            return link, f'ed2k:{parts[3]}:{parts[4].lower()}'
+        return link, link
+    if not lower.startswith(('http://', 'https://')):
+        return link, link
+
+    try:
+        parts = urlsplit(link)
+        host = (parts.hostname or '').rstrip('.')
+        port = parts.port
+    except ValueError:
+        return link, link
+    rule = next((rule for rule in _COMPILED_RULES if rule[0] == disk), None)
+    scheme = parts.scheme.lower()
+    if rule is not None:
+        scheme = 'https'
+        if rule[2] and rule[1].search(host + '/'):
+            host, port = rule[2], None
+    if port and port != {'http': 80, 'https': 443}.get(scheme):
+        host = f'{host}:{port}'
+
+    path = re.sub(r'/{2,}', '/', parts.path).rstrip('/') or '/'
+    query, code = [], None
+    for piece in parts.query.split('&'):
+        if not piece:
+            continue
+        name, _, value = piece.partition('=')
+        if unquote(name).lower() in SHARE_CODE_PARAMS:
+            value = unquote(value).strip()
+            if value and code is None:
+                code = (name, value)
+            continue
+        query.append(piece)
+    fragment = parts.fragment if '/' in parts.fragment else ''
+
+    key = urlunsplit(('', host, path, '&'.join(query), fragment)).lstrip('/')
+    if code:
+        query.append(f'{code[0]}={code[1]}')
+    return urlunsplit((scheme, host, path, '&'.join(query), fragment)), key
+
+
+def get_md5(text):
+    return hashlib.md5(text.encode('utf-8')).hexdigest()
+
+
+def link_resources(apps, schema_editor):
+    """
+    把 resource_results 中已有的结果迁移到全局资源表：按规范化链接的 md5 合并相同资源，
+    每行关联到对应的 Resource，同一任务内的重复资源只保留最早的一行
+    """
+    from django.db.models import Count, Min
+
+    ResourceResult = apps.get_model('search', 'ResourceResult')
+    Resource = apps.get_model('search', 'Resource')
+
+    last_id = 0
+    while True:
+        batch = list(ResourceResult.objects.filter(id__gt=last_id).order_by('id')[:BATCH_SIZE])
+        if not batch:
+            break
+        last_id = batch[-1].id
+
+        first, last_seen, hashes = {}, {}, {}
+        for row in batch:
+            disk = classify_link(row.url)
+            url, dedup_key = canonicalize_link(row.url, None if disk == OTHER_DISK else disk)
+            url_hash = hashes[row.id] = get_md5(dedup_key)
+            first.setdefault(url_hash, Resource(
+                url_hash=url_hash, title=row.title, disk_type=row.disk_type, url=url, site_source=row.site_source,
+                last_seen_at=row.created_at,
+            ))
+            last_seen[url_hash] = max(last_seen.get(url_hash, row.created_at), row.created_at)
+        Resource.objects.bulk_create(list(first.values()), ignore_conflicts=True)
+
+        resources = list(Resource.objects.filter(url_hash__in=list(first)))
+        for resource in resources:
+            resource.last_seen_at = max(resource.last_seen_at, last_seen[resource.url_hash])
+        Resource.objects.bulk_update(resources, ['last_seen_at'])
+
+        ids = {resource.url_hash: resource.id for resource in resources}
+        for row in batch:
+            row.resource_id = ids[hashes[row.id]]
+        ResourceResult.objects.bulk_update(batch, ['resource'])
+
+    duplicates = (ResourceResult.objects.values('task_id', 'resource_id')
+                  .annotate(keep_id=Min('id'), rows=Count('id')).filter(rows__gt=1))
+    for dup in duplicates.iterator():
+        (ResourceResult.objects.filter(task_id=dup['task_id'], resource_id=dup['resource_id'])
+         .exclude(id=dup['keep_id']).delete())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0011_searchtask_partial_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Resource',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('url_hash', models.CharField(max_length=32, unique=True)),
+                ('title', models.CharField(max_length=500)),
+                ('disk_type', models.CharField(help_text='如：阿里云盘', max_length=50)),
+                ('url', models.TextField()),
+                ('site_source', models.CharField(max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_seen_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'db_table': 'resources',
+            },
+        ),
+        # 0006 重建 resource_results 表时 task 外键已改为 task_id 字段（UUID，带索引），这里只同步迁移状态
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.RemoveField(
+                    model_name='resourceresult',
+                    name='task',
+                ),
+                migrations.AddField(
+                    model_name='resourceresult',
+                    name='task_id',
+                    field=models.UUIDField(db_index=True),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='resourceresult',
+            name='resource',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='task_links',
+                                    to='search.resource'),
+        ),
+        migrations.RunPython(link_resources, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    # 与 0012 的数据迁移分开执行：PostgreSQL 中同一事务内更新外键列后不能再 ALTER TABLE
+
+    dependencies = [
+        ('search', '0012_resource'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='resourceresult',
+            name='resource',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='task_links',
+                                    to='search.resource'),
+        ),
+        migrations.RemoveField(
+            model_name='resourceresult',
+            name='title',
+        ),
+        migrations.RemoveField(
+            model_name='resourceresult',
+            name='disk_type',
+        ),
+        migrations.RemoveField(
+            model_name='resourceresult',
+            name='url',
+        ),
+        migrations.AddConstraint(
+            model_name='resourceresult',
+            constraint=models.UniqueConstraint(fields=('task_id', 'resource'), name='resource_results_task_resource_uniq'),
+        ),
+        # 表名不变（db_table = 'resource_results'），只重命名模型
+        migrations.RenameModel(
+            old_name='ResourceResult',
+            new_name='TaskResource',
+        ),
+    ]
@@ -0,0 +1,71 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_dimensions(apps, schema_editor):
+    """把已有资源与关联中的网盘类型、站点名称写入维度表，按名称批量回填外键（每个名称一条 UPDATE）"""
+    DiskType = apps.get_model('search', 'DiskType')
+    SiteSource = apps.get_model('search', 'SiteSource')
+    Resource = apps.get_model('search', 'Resource')
+    TaskResource = apps.get_model('search', 'TaskResource')
+
+    disk_names = set(Resource.objects.values_list('disk_type', flat=True).distinct())
+    site_names = set(Resource.objects.values_list('site_source', flat=True).distinct())
+    site_names.update(TaskResource.objects.values_list('site_source', flat=True).distinct())
+
+    for name in disk_names:
+        disk = DiskType.objects.get_or_create(name=name)[0]
+        Resource.objects.filter(disk_type=name).update(disk=disk)
+    for name in site_names:
+        site = SiteSource.objects.get_or_create(name=name)[0]
+        Resource.objects.filter(site_source=name).update(site=site)
+        TaskResource.objects.filter(site_source=name).update(site=site)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0013_rename_resourceresult_taskresource'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiskType',
+            fields=[
+                ('id', models.SmallAutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100, unique=True)),
+            ],
+            options={
+                'db_table': 'disk_types',
+            },
+        ),
+        migrations.CreateModel(
+            name='SiteSource',
+            fields=[
+                ('id', models.SmallAutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100, unique=True)),
+            ],
+            options={
+                'db_table': 'site_sources',
+            },
+        ),
+        migrations.AddField(
+            model_name='resource',
+            name='disk',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+',
+                                    to='search.disktype'),
+        ),
+        migrations.AddField(
+            model_name='resource',
+            name='site',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+',
+                                    to='search.sitesource'),
+        ),
+        migrations.AddField(
+            model_name='taskresource',
+            name='site',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT,
+                                    related_name='+', to='search.sitesource'),
+        ),
+        migrations.RunPython(fill_dimensions, migrations.RunPython.noop),
+    ]
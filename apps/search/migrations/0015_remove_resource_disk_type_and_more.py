@@ -0,0 +1,43 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    # 与 0014 的数据回填分开执行（同 0013）
+
+    dependencies = [
+        ('search', '0014_disktype_sitesource'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='resource',
+            name='disk',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+',
+                                    to='search.disktype'),
+        ),
+        migrations.AlterField(
+            model_name='resource',
+            name='site',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+',
+                                    to='search.sitesource'),
+        ),
+        migrations.AlterField(
+            model_name='taskresource',
+            name='site',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='+',
+                                    to='search.sitesource'),
+        ),
+        migrations.RemoveField(
+            model_name='resource',
+            name='disk_type',
+        ),
+        migrations.RemoveField(
+            model_name='resource',
+            name='site_source',
+        ),
+        migrations.RemoveField(
+            model_name='taskresource',
+            name='site_source',
+        ),
+    ]
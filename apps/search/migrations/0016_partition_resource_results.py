@@ -0,0 +1,95 @@
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+# 迁移时创建的未来分区天数，之后由 purge_expired_results_task 每小时补齐（见 apps.search.retention）
+PARTITION_DAYS_AHEAD = 7
+
+
+def fill_task_date(apps, schema_editor):
+    """
+    其他数据库：已有结果的 task_date 取发现日期
+
+    这些数据库不按 task_date 分区，同一任务内唯一由 (task_id, resource) 唯一约束保证；
+    search_tasks.task_id 由 0006 的 SQL 创建、不在迁移状态中，这里不按任务关联查询
+    """
+    if schema_editor.connection.vendor == 'postgresql':
+        return
+    TaskResource = apps.get_model('search', 'TaskResource')
+    TaskResource.objects.update(task_date=TruncDate('created_at'))
+
+
+def partition_resource_results(apps, schema_editor):
+    """
+    PostgreSQL：把 resource_results 重建为按任务日期 task_date 每天一个分区的分区表
+
+    - 分区表的主键与唯一约束必须包含分区键：主键为 (id, task_date)，唯一约束为 (task_id, resource_id, task_date)；
+      task_date 由 task_id 决定（爬取任务的创建日期，同一任务的结果都在同一分区），该唯一约束等价于同一任务内唯一，
+      写库时 ON CONFLICT 仍能去重；
+    - 已有数据的 task_date 取所属任务的创建日期（任务已删除时取发现日期），放入覆盖到今天零点的一个分区（按昨天命名），
+      随保留期整体删除；今天起每天一个分区；
+    - 另建默认分区 resource_results_default：定时任务长时间未运行、没有当天分区时写入仍然成功，过期行由定时任务分批 DELETE
+    其他数据库保持普通表，过期数据分批 DELETE。
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    today = timezone.now().date()
+    yesterday = today - timedelta(days=1)
+    execute = schema_editor.execute
+    execute("ALTER TABLE resource_results RENAME TO resource_results_old")
+    # 沿用原表的列类型；分区表（PostgreSQL 17 之前）不支持 identity 列，id 改用普通序列
+    execute("CREATE TABLE resource_results (LIKE resource_results_old) PARTITION BY RANGE (task_date)")
+    execute("ALTER TABLE resource_results ALTER COLUMN task_date SET NOT NULL")
+    execute(f"CREATE TABLE resource_results_p{yesterday:%Y%m%d} PARTITION OF resource_results "
+            f"FOR VALUES FROM (MINVALUE) TO ('{today.isoformat()}')")
+    for offset in range(PARTITION_DAYS_AHEAD):
+        day = today + timedelta(days=offset)
+        execute(f"CREATE TABLE resource_results_p{day:%Y%m%d} PARTITION OF resource_results "
+                f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')")
+    execute("CREATE TABLE resource_results_default PARTITION OF resource_results DEFAULT")
+    execute(
+        "INSERT INTO resource_results (id, task_id, resource_id, site_id, created_at, task_date) "
+        "SELECT r.id, r.task_id, r.resource_id, r.site_id, r.created_at, COALESCE(t.created_at::date, r.created_at::date) "
+        "FROM resource_results_old r LEFT JOIN search_tasks t ON t.task_id = r.task_id"
+    )
+    # 旧表的序列随旧表删除
+    execute("DROP TABLE resource_results_old")
+    execute("CREATE SEQUENCE IF NOT EXISTS resource_results_id_seq")
+    execute("ALTER SEQUENCE resource_results_id_seq OWNED BY resource_results.id")
+    execute("SELECT setval('resource_results_id_seq', COALESCE((SELECT MAX(id) FROM resource_results), 0) + 1, false)")
+    execute("ALTER TABLE resource_results ALTER COLUMN id SET DEFAULT nextval('resource_results_id_seq')")
+
+    execute("ALTER TABLE resource_results ADD PRIMARY KEY (id, task_date)")
+    execute("ALTER TABLE resource_results ADD CONSTRAINT resource_results_task_resource_uniq "
+            "UNIQUE (task_id, resource_id, task_date)")
+    execute("CREATE INDEX resource_results_task_id_idx ON resource_results (task_id)")
+    execute("CREATE INDEX resource_results_resource_id_idx ON resource_results (resource_id)")
+    execute("ALTER TABLE resource_results ADD CONSTRAINT resource_results_resource_id_fk "
+            "FOREIGN KEY (resource_id) REFERENCES resources (id) DEFERRABLE INITIALLY DEFERRED")
+    execute("ALTER TABLE resource_results ADD CONSTRAINT resource_results_site_id_fk "
+            "FOREIGN KEY (site_id) REFERENCES site_sources (id) DEFERRABLE INITIALLY DEFERRED")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0015_remove_resource_disk_type_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='taskresource',
+            name='task_date',
+            field=models.DateField(null=True),
+        ),
+        migrations.RunPython(fill_task_date, migrations.RunPython.noop),
+        migrations.RunPython(partition_resource_results, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='taskresource',
+            name='task_date',
+            field=models.DateField(),
+        ),
+    ]
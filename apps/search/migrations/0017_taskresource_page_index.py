@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0016_partition_resource_results'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='taskresource',
+            index=models.Index(fields=['task_id', 'created_at', 'id'], name='resource_results_task_page_idx'),
+        ),
+        migrations.AlterField(
+            model_name='taskresource',
+            name='task_id',
+            field=models.UUIDField(),
+        ),
+    ]
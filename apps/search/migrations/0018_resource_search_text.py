@@ -0,0 +1,78 @@
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+BACKFILL_BATCH = 2000
+
+# 以下为编写本迁移时 apps.search.search_index 中切分检索词逻辑的固定副本：之后修改切分规则不会改变本迁移的结果
+_CJK_CHARS = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af'
+_CJK_RUN_RE = re.compile(f'[{_CJK_CHARS}]+')
+_RUN_RE = re.compile(f'[{_CJK_CHARS}]+|[a-z]+|[0-9]+')
+
+
+def _runs(text):
+    return _RUN_RE.findall(unicodedata.normalize('NFKC', text or '').lower())
+
+
+def search_text(title, url=''):
+    tokens, chars = [], set()
+    for run in _runs(title) + _runs(url):
+        if _CJK_RUN_RE.fullmatch(run):
+            tokens.extend([run[i:i + 2] for i in range(len(run) - 1)] if len(run) > 1 else [run])
+            chars.update(run)
+        else:
+            tokens.append(run)
+    return ' '.join(tokens + sorted(chars))
+
+
+def fill_search_text(apps, schema_editor):
+    """按主键分批为已有资源生成检索词"""
+    Resource = apps.get_model('search', 'Resource')
+    last_id = 0
+    while True:
+        batch = list(Resource.objects.filter(id__gt=last_id).order_by('id').only('id', 'title', 'url')[:BACKFILL_BATCH])
+        if not batch:
+            return
+        for resource in batch:
+            resource.search_text = search_text(resource.title, resource.url)
+        Resource.objects.bulk_update(batch, ['search_text'])
+        last_id = batch[-1].id
+
+
+def add_search_vector(apps, schema_editor):
+    """
+    PostgreSQL：search_vector 为 search_text 的 tsvector 生成列（写入 search_text 时自动计算），建 GIN 索引
+
+    模型中没有该列，Django 插入资源时不会写入它；其他数据库不创建，广场检索退回 icontains
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        "ALTER TABLE resources ADD COLUMN search_vector tsvector "
+        "GENERATED ALWAYS AS (to_tsvector('simple', search_text)) STORED"
+    )
+    schema_editor.execute("CREATE INDEX resources_search_vector_idx ON resources USING gin (search_vector)")
+
+
+def drop_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("ALTER TABLE resources DROP COLUMN IF EXISTS search_vector")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0017_taskresource_page_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resource',
+            name='search_text',
+            field=models.TextField(default='', editable=False),
+        ),
+        migrations.RunPython(fill_search_text, migrations.RunPython.noop),
+        migrations.RunPython(add_search_vector, drop_search_vector),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0018_resource_search_text'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='searchtask',
+            name='is_refresh',
+            field=models.BooleanField(default=False),
+        ),
+    ]
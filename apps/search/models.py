@@ -2,11 +2,25 @@ from django.db import models
 import uuid
 
 
+def cache_summary(site_status):
+    """各站点响应缓存统计的汇总：{'hits', 'misses', 'hit_ratio', 'bytes_saved'}"""
+    sites = (site_status or {}).values()
+    hits = sum(s.get('cache_hits', 0) for s in sites)
+    misses = sum(s.get('cache_misses', 0) for s in sites)
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits * 100 / (hits + misses), 1) if hits + misses else 0,
+        'bytes_saved': sum(s.get('cache_bytes_saved', 0) for s in sites),
+    }
+
+
 class SearchTask(models.Model):
     STATUS_CHOICES = [
         ('PENDING', '排队中'),
         ('RUNNING', '正在爬取'),
         ('SUCCESS', '检索成功'),
+        ('PARTIAL', '部分完成'),
         ('FAILURE', '检索失败'),
     ]
 
@@ -14,13 +28,28 @@ class SearchTask(models.Model):
     task_id = models.UUIDField(default=uuid.uuid4, editable=False, unique=True, db_index=True)
     related_task_id = models.UUIDField(default=uuid.uuid4, editable=False, db_index=True)
     is_cache = models.BooleanField(default=False, db_index=True)
+    # 关键词缓存过时后由系统发起的后台刷新任务（不是用户提交），不在首页最近任务中展示
+    is_refresh = models.BooleanField(default=False)
     keyword = models.CharField(max_length=255, verbose_name="搜索关键词")
     email = models.EmailField(verbose_name="通知邮箱")
     notify_email = models.BooleanField(default=True, db_index=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
     expire_time = models.DateTimeField(null=True, blank=True)
+    # 各站点完成情况：{site_key: {'name', 'reason', 'complete', 'items', 'skipped_requests'}}
+    site_status = models.JSONField(default=dict, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    @property
+    def site_completion(self):
+        """(完整完成的站点数, 站点总数)"""
+        sites = self.site_status or {}
+        return sum(1 for s in sites.values() if s.get('complete')), len(sites)
+
+    @property
+    def cache_summary(self):
+        """响应缓存效果：{'hits', 'misses', 'hit_ratio', 'bytes_saved'}"""
+        return cache_summary(self.site_status)
+
     @property
     def masked_email(self):
         email = self.email or ''
@@ -40,16 +69,148 @@ class SearchTask(models.Model):
         db_table = 'search_tasks'
 
 
-class ResourceResult(models.Model):
-    task_id = models.UUIDField(db_index=True)
+class Dimension(models.Model):
+    """
+    维度表基类：取值很少、几乎不变的名称（网盘类型、来源站点）只存一份，结果表中用 smallint 外键引用
+
+    名称与 id 的对应关系缓存在进程内存中，整张表只在首次使用或遇到其他进程新增的 id 时读取；
+    新名称在首次写入结果时插入维度表
+    """
+    id = models.SmallAutoField(primary_key=True)
+    name = models.CharField(max_length=100, unique=True)
+
+    # {name: id} / {id: name}，每个子类各自一份
+    _name_to_id = None
+    _id_to_name = None
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def _load(cls):
+        name_to_id = dict(cls.objects.values_list('name', 'id'))
+        cls._name_to_id = name_to_id
+        cls._id_to_name = {dim_id: name for name, dim_id in name_to_id.items()}
+
+    @classmethod
+    def id_for(cls, name: str) -> int:
+        """名称对应的 id，新名称插入维度表（需在事务外调用，事务回滚后缓存中不会留下不存在的 id）"""
+        if cls._name_to_id is None:
+            cls._load()
+        dim_id = cls._name_to_id.get(name)
+        if dim_id is None:
+            dim_id = cls.objects.get_or_create(name=name)[0].id
+            cls._name_to_id[name] = dim_id
+            cls._id_to_name[dim_id] = name
+        return dim_id
+
+    @classmethod
+    def lookup_id(cls, name: str):
+        """名称对应的 id，不存在时返回 None（不插入维度表，用于查询过滤）"""
+        if cls._name_to_id is None or name not in cls._name_to_id:
+            cls._load()
+        return cls._name_to_id.get(name)
+
+    @classmethod
+    def name_for(cls, dim_id: int) -> str:
+        if cls._id_to_name is None or dim_id not in cls._id_to_name:
+            # 其他进程新增的维度
+            cls._load()
+        return cls._id_to_name.get(dim_id, '')
+
+
+class DiskType(Dimension):
+    """网盘类型，如：阿里云盘"""
+
+    class Meta:
+        db_table = 'disk_types'
+
+
+class SiteSource(Dimension):
+    """来源站点（SiteConfig 的 name）"""
+
+    class Meta:
+        db_table = 'site_sources'
+
+
+class Resource(models.Model):
+    """
+    全局资源：同一资源（规范化链接）只存一份，被多少个任务找到都只有一行
+
+    url_hash 为规范化链接去重键的 md5（与爬虫 item 的 resource_key 一致），
+    title / site 为首次发现时的标题与站点，last_seen_at 为最近一次被任务找到的时间；
+    网盘类型与站点存为维度表外键，disk_type / site_source 属性返回名称；
+    search_text 为资源广场检索用的检索词（见 apps.search.search_index），PostgreSQL 中另有其生成的
+    search_vector 列与 GIN 索引（迁移 0018）
+    """
+    id = models.BigAutoField(primary_key=True)
+    url_hash = models.CharField(max_length=32, unique=True)
     title = models.CharField(max_length=500)
-    disk_type = models.CharField(max_length=50, help_text="如：阿里云盘")
+    disk = models.ForeignKey(DiskType, on_delete=models.PROTECT, related_name='+')
     url = models.TextField()
-    site_source = models.CharField(max_length=100)
+    site = models.ForeignKey(SiteSource, on_delete=models.PROTECT, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_seen_at = models.DateTimeField(db_index=True)
+    search_text = models.TextField(default='', editable=False)
+
+    @property
+    def disk_type(self):
+        return DiskType.name_for(self.disk_id)
+
+    @property
+    def site_source(self):
+        return SiteSource.name_for(self.site_id)
+
+    class Meta:
+        db_table = 'resources'
+
+
+class TaskResource(models.Model):
+    """
+    任务与资源的关联：任务找到的每个资源一行（同一任务内唯一），site 为本任务中找到该资源的站点
+
+    沿用原 resource_results 表；title / disk_type / url 从 Resource 读取，site_source 返回站点名称，
+    模板与导出代码不需要区分
+    task_date 为爬取任务的创建日期（写库时按 task_id 查出），同一任务的结果 task_date 相同；
+    PostgreSQL 中 resource_results 为按 task_date 每天一个分区的分区表（迁移 0016），主键为 (id, task_date)，
+    唯一约束为 (task_id, resource_id, task_date)，与同一任务内唯一等价；过期分区由定时任务删除
+    """
+    # 按任务查询由 (task_id, created_at, id) 复合索引与 (task_id, resource) 唯一约束覆盖，不再单独建索引
+    task_id = models.UUIDField()
+    resource = models.ForeignKey(Resource, on_delete=models.CASCADE, related_name='task_links')
+    # 结果表是最大的表，不按站点查询，不建索引
+    site = models.ForeignKey(SiteSource, on_delete=models.PROTECT, related_name='+', db_index=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    task_date = models.DateField()
+
+    @property
+    def title(self):
+        return self.resource.title
+
+    @property
+    def disk_type(self):
+        return self.resource.disk_type
+
+    @property
+    def url(self):
+        return self.resource.url
+
+    @property
+    def site_source(self):
+        return SiteSource.name_for(self.site_id)
 
     class Meta:
         db_table = 'resource_results'
+        constraints = [
+            models.UniqueConstraint(fields=['task_id', 'resource'], name='resource_results_task_resource_uniq'),
+        ]
+        indexes = [
+            # 结果页与结果 API 按 (created_at, id) 倒序键集分页
+            models.Index(fields=['task_id', 'created_at', 'id'], name='resource_results_task_page_idx'),
+        ]
 
 
 class SiteConfig(models.Model):
@@ -110,12 +271,15 @@ class SystemConfig(models.Model):
         ('email_rate_limit_60', '邮箱限流-60秒内次数'),
         ('email_rate_limit_3600', '邮箱限流-3600秒内次数'),
         ('email_rate_limit_86400', '邮箱限流-86400秒内次数'),
-        ('keyword_cache_ttl', '关键词缓存过期时间(秒)'),
+        ('keyword_cache_ttl', '关键词缓存新鲜期/软TTL(秒)'),
+        ('keyword_cache_hard_ttl', '关键词缓存硬TTL(秒)'),
+        ('keyword_cache_negative_ttl', '关键词负缓存时间(秒)'),
         ('index_recent_tasks_count', '首页显示最近任务数量'),
         ('square_display_count', '资源广场显示数量'),
         ('square_fetch_count', '资源广场去重前获取数量'),
         ('square_expire_hours', '资源广场资源过期时间(小时)'),
         ('result_expire_hours', '结果页面过期时间(小时)'),
+        ('result_retention_hours', '任务与结果保留时间(小时)'),
         ('email_host', '邮件服务器地址'),
         ('email_port', '邮件服务器端口'),
         ('email_use_ssl', '邮件使用SSL'),
@@ -124,9 +288,26 @@ class SystemConfig(models.Model):
         ('email_from', '邮件发件人'),
         ('site_base_url', '站点基础URL'),
         ('crawl_timeout_seconds', '爬虫超时时间(秒)'),
+        ('crawl_mode', '爬虫执行模式(subprocess/daemon)'),
+        ('crawl_fanout_group_size', '分站点并行-每个子任务站点数'),
+        ('crawl_fanout_timeout_seconds', '分站点并行-子任务超时时间(秒)'),
+        ('crawl_batch_size', '批量爬取-每次合并的任务数'),
+        ('crawl_batch_window_seconds', '批量爬取-合并窗口(秒)'),
+        ('httpcache_ttl_workflow', '响应缓存-工作流请求缓存时间(秒)'),
+        ('httpcache_ttl_search', '响应缓存-搜索请求缓存时间(秒)'),
+        ('httpcache_ttl_detail', '响应缓存-详情页缓存时间(秒)'),
+        ('workflow_cache_ttl', '工作流变量缓存时间(秒)'),
+        ('crawl_extract_workers', '解析池工作线程/进程数'),
+        ('crawl_extract_pool', '解析池类型(thread/process)'),
+        ('rate_limit_enabled', '站点全局限速-是否启用'),
+        ('rate_limit_min_rps', '站点全局限速-最小速率(请求/秒)'),
+        ('rate_limit_max_rps', '站点全局限速-最大速率(请求/秒)'),
+        ('rate_limit_increase_rps', '站点全局限速-每秒加性回升(请求/秒)'),
+        ('rate_limit_decrease_factor', '站点全局限速-限流时乘性下降因子'),
     ]
 
-    key = models.CharField(max_length=100, unique=True, db_index=True, choices=KEY_CHOICES, verbose_name="配置键")
+    # KEY_CHOICES 只用于后台表单的下拉选项，不作为字段 choices：新增配置项不需要迁移
+    key = models.CharField(max_length=100, unique=True, db_index=True, verbose_name="配置键")
     value = models.TextField(verbose_name="配置值")
     description = models.CharField(max_length=500, blank=True, default='', verbose_name="描述")
     created_at = models.DateTimeField(auto_now_add=True)
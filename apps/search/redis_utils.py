@@ -0,0 +1,15 @@
+"""
+Redis 客户端工具
+Web 视图、Celery 任务与爬虫进程共用同一个 Redis 连接配置
+"""
+import os
+
+import redis
+
+
+def get_redis_url() -> str:
+    return os.getenv('REDIS_URL') or os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0')
+
+
+def get_redis_client(decode_responses=True):
+    return redis.Redis.from_url(get_redis_url(), decode_responses=decode_responses)
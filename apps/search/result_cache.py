@@ -0,0 +1,92 @@
+"""
+已结束任务的结果页与结果 API 响应缓存
+
+任务到达最终状态（SUCCESS / PARTIAL / FAILURE）后结果不再变化：渲染好的结果页与结果 API 的 JSON
+按 related_task_id + 缓存版本 + 查询参数存入 Django 缓存，命中时不查询数据库；
+响应带 ETag（内容的 md5）与 Last-Modified，浏览器重复访问时返回 304。
+任务状态变化时 invalidate_result_cache() 删除版本号，该任务的旧缓存随之失效。
+缓存时间不超过结果的过期时间，过期后回到数据库查询（可能有新的缓存命中任务延长了有效期）。
+"""
+import hashlib
+import time
+import uuid
+from datetime import datetime
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+# 缓存时间（秒）
+RESULT_CACHE_TTL = 600
+RESULT_CACHE_VERSION_KEY = 'result_cache:version:{task_id}'
+# 版本号的保留时间（秒），长于缓存时间：版本号过期后该任务已有的缓存不会再被读到
+RESULT_CACHE_VERSION_TTL = 24 * 3600
+RESULT_CACHE_KEY = 'result_cache:{kind}:{task_id}:{version}:{variant}'
+
+
+def _task_hex(task_id) -> str:
+    return uuid.UUID(str(task_id)).hex
+
+
+def _cache_version(task_id) -> str:
+    """任务当前的缓存版本；版本号不存在（从未缓存、已失效或被淘汰）时生成新版本，旧缓存不会再被读到"""
+    key = RESULT_CACHE_VERSION_KEY.format(task_id=_task_hex(task_id))
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, RESULT_CACHE_VERSION_TTL)
+        version = cache.get(key)
+    return version
+
+
+def invalidate_result_cache(task_id):
+    cache.delete(RESULT_CACHE_VERSION_KEY.format(task_id=_task_hex(task_id)))
+
+
+def _cache_key(request, kind: str, task_id) -> str:
+    # 同一任务不同查询参数（游标、字段、过滤条件）分别缓存
+    query = '&'.join(f'{k}={v}' for k, values in sorted(request.GET.lists()) for v in values)
+    variant = hashlib.md5(query.encode('utf-8')).hexdigest()
+    return RESULT_CACHE_KEY.format(kind=kind, task_id=_task_hex(task_id), version=_cache_version(task_id),
+                                   variant=variant)
+
+
+def _conditional(request, response, etag: str, last_modified: int):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # 浏览器每次都带 If-None-Match 重新验证，内容未变时返回 304
+    response['Cache-Control'] = 'no-cache'
+    return get_conditional_response(request, etag=etag, last_modified=last_modified, response=response)
+
+
+def get_cached_response(request, kind: str, task_id):
+    """命中缓存时返回响应（或 304），否则返回 None"""
+    entry = cache.get(_cache_key(request, kind, task_id))
+    if entry is None:
+        return None
+    response = HttpResponse(entry['content'], content_type=entry['content_type'])
+    return _conditional(request, response, entry['etag'], entry['last_modified'])
+
+
+def cache_response(request, kind: str, task_id, response, expire_time: datetime = None):
+    """
+    缓存已结束任务的响应并加上 ETag / Last-Modified，返回要发送的响应（请求带有匹配的条件头时为 304）
+
+    expire_time 为结果的过期时间，缓存时间不超过它
+    """
+    if response.status_code != 200 or response.streaming:
+        return response
+    ttl = RESULT_CACHE_TTL
+    if expire_time:
+        ttl = min(ttl, int((expire_time - timezone.now()).total_seconds()))
+    etag = f'"{hashlib.md5(response.content).hexdigest()}"'
+    last_modified = int(time.time())
+    if ttl > 0:
+        cache.set(_cache_key(request, kind, task_id), {
+            'content': response.content,
+            'content_type': response['Content-Type'],
+            'etag': etag,
+            'last_modified': last_modified,
+        }, ttl)
+    return _conditional(request, response, etag, last_modified)
@@ -0,0 +1,106 @@
+"""
+任务结果的实时推送（Redis Stream）
+
+每个爬取任务一个 Stream（task:events:{task_id}）：
+- DjangoPipeline 每批写库成功后追加一条 results 事件，内容为本批新写入的结果；
+- 任务状态变化（RUNNING / SUCCESS / PARTIAL / FAILURE）时追加一条 status 事件。
+结果页渲染时记下 Stream 的最新位置，再通过 SSE 接口（views.result_events）从该位置读取，
+新结果到达即追加到页面，不需要刷新页面重新查询整个任务的结果。
+Stream 按条数截断并设置过期时间；推送失败只记录日志，不影响爬取与写库。
+"""
+import json
+import logging
+import uuid
+
+import redis
+
+from apps.search.redis_utils import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+RESULT_EVENTS_KEY = 'task:events:{task_id}'
+# 每个任务最多保留的事件数（每条 results 事件为一批结果）
+RESULT_EVENTS_MAXLEN = 1000
+# 最后一条事件之后 Stream 的保留时间（秒）
+RESULT_EVENTS_TTL = 3600
+# 任务的最终状态：推送后 SSE 连接结束
+TERMINAL_STATUSES = ('SUCCESS', 'PARTIAL', 'FAILURE')
+
+
+def result_events_key(task_id) -> str:
+    # 爬虫中的 task_id 为带连字符的字符串，视图中为 UUID，统一为 32 位 hex
+    return RESULT_EVENTS_KEY.format(task_id=uuid.UUID(str(task_id)).hex)
+
+
+def publish_results(rows):
+    """
+    按任务追加 results 事件
+
+    Args:
+        rows: DjangoPipeline 的行字典，包含 task_id / title / disk_type / url / site_source
+    """
+    if not rows:
+        return
+    by_task = {}
+    for row in rows:
+        by_task.setdefault(row['task_id'], []).append({
+            'title': row['title'],
+            'disk_type': row['disk_type'],
+            'url': row['url'],
+            'site_source': row['site_source'],
+        })
+    try:
+        rds = get_redis_client()
+        try:
+            pipe = rds.pipeline(transaction=False)
+            for task_id, results in by_task.items():
+                key = result_events_key(task_id)
+                pipe.xadd(key, {'type': 'results', 'data': json.dumps(results, ensure_ascii=False)},
+                          maxlen=RESULT_EVENTS_MAXLEN, approximate=True)
+                pipe.expire(key, RESULT_EVENTS_TTL)
+            pipe.execute()
+        finally:
+            rds.close()
+    except redis.RedisError as e:
+        logger.warning(f"结果推送失败: {e}")
+
+
+def publish_status(task_id, status: str):
+    """追加 status 事件：{'status': 'RUNNING', 'display': '正在爬取'}"""
+    from apps.search.models import SearchTask
+
+    data = {'status': status, 'display': dict(SearchTask.STATUS_CHOICES).get(status, status)}
+    try:
+        rds = get_redis_client()
+        try:
+            key = result_events_key(task_id)
+            pipe = rds.pipeline(transaction=False)
+            pipe.xadd(key, {'type': 'status', 'data': json.dumps(data, ensure_ascii=False)},
+                      maxlen=RESULT_EVENTS_MAXLEN, approximate=True)
+            pipe.expire(key, RESULT_EVENTS_TTL)
+            pipe.execute()
+        finally:
+            rds.close()
+    except redis.RedisError as e:
+        logger.warning(f"任务状态推送失败: task_id={task_id}, error={e}")
+
+
+def last_result_event_id(rds, task_id) -> str:
+    """Stream 中最新一条事件的 id，没有事件时为 '0-0'（从头读取）"""
+    entries = rds.xrevrange(result_events_key(task_id), count=1)
+    return entries[0][0] if entries else '0-0'
+
+
+def read_result_events(rds, task_id, last_id: str, block_ms: int) -> list:
+    """
+    读取 last_id 之后的事件，没有新事件时最多阻塞 block_ms 毫秒
+
+    Returns:
+        [(event_id, event_type, data_json), ...]
+    """
+    streams = rds.xread({result_events_key(task_id): last_id}, block=block_ms)
+    events = []
+    for _, entries in streams or []:
+        for event_id, fields in entries:
+            events.append((event_id, fields.get('type', 'message'), fields.get('data', '{}')))
+    return events
@@ -0,0 +1,182 @@
+"""
+过期任务与结果的清理
+
+保留时间由 get_result_retention_hours() 决定，由 Celery beat 定时执行的 purge_expired_results_task 调用：
+- PostgreSQL：resource_results 按任务日期 task_date 每天一个分区（迁移 0016），提前创建未来几天的分区，
+  整个分区都过期后直接 DROP（任务的结果随任务整体删除），不产生死元组，表与索引大小只取决于保留期内的数据量；
+  写库前按需补建当天的分区（定时任务未运行时），仍没有对应分区的行落入默认分区，过期后分批 DELETE；
+- 其他数据库（或未分区的表）：按主键分批 DELETE，每批一个短事务，不长时间锁表；
+- search_tasks 与 resources（最近被找到的时间早于保留期）同样分批删除。
+"""
+import logging
+import re
+from datetime import datetime, timedelta
+
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+from apps.search.config_utils import get_result_retention_hours
+from apps.search.models import Resource, SearchTask, TaskResource
+
+logger = logging.getLogger(__name__)
+
+# 提前创建的分区天数：定时任务停止运行这么多天内写入不受影响
+RESULT_PARTITION_DAYS_AHEAD = 7
+# 今天起已有的连续分区少于该天数时记录错误日志（定时任务可能未运行）
+RESULT_PARTITION_MIN_HORIZON = 2
+# 分批删除时每批的行数
+RETENTION_DELETE_BATCH = 5000
+
+_PARTITION_SUFFIX_RE = re.compile(r'_p(\d{8})$')
+
+# 本进程中已确认有分区（或已尝试创建）的任务日期，写库时不重复查询
+_ensured_partition_days = set()
+
+
+def partition_name(day) -> str:
+    """day 当天的分区表名：resource_results_pYYYYMMDD，范围为 [day, day + 1)"""
+    return f'{TaskResource._meta.db_table}_p{day:%Y%m%d}'
+
+
+def default_partition_name() -> str:
+    """默认分区的表名：没有对应日期分区的行写入这里（迁移 0016 创建）"""
+    return f'{TaskResource._meta.db_table}_default'
+
+
+def results_partitioned() -> bool:
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)",
+                       [TaskResource._meta.db_table])
+        return cursor.fetchone() is not None
+
+
+def list_result_partitions() -> list:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(%s) ORDER BY c.relname",
+            [TaskResource._meta.db_table],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def create_result_partitions(start, days=RESULT_PARTITION_DAYS_AHEAD) -> list:
+    """
+    创建 start 起 days 天每天一个分区（已存在时跳过），返回新建的分区名
+
+    默认分区中已有某天的行时不能再创建该天的分区（这些行留在默认分区，过期后分批删除），跳过并记录警告；
+    每个分区在单独的短事务中创建，失败（并发创建、与旧数据分区范围重叠）时跳过，不影响其他分区
+    """
+    existing = set(list_result_partitions())
+    table = connection.ops.quote_name(TaskResource._meta.db_table)
+    default = connection.ops.quote_name(default_partition_name())
+    created = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        name = partition_name(day)
+        if name in existing:
+            continue
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(f"SELECT 1 FROM {default} WHERE task_date >= %s AND task_date < %s LIMIT 1",
+                               [day, day + timedelta(days=1)])
+                if cursor.fetchone():
+                    logger.warning(f"默认分区中已有 {day} 的结果，不再创建分区 {name}")
+                    continue
+                # DDL 不能使用绑定参数，边界为 date.isoformat() 生成的日期字面量
+                cursor.execute(
+                    f"CREATE TABLE IF NOT EXISTS {connection.ops.quote_name(name)} PARTITION OF {table} "
+                    f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')"
+                )
+        except DatabaseError as e:
+            logger.warning(f"结果分区 {name} 创建失败: {e}")
+            continue
+        created.append(name)
+    return created
+
+
+def ensure_result_partitions(days) -> list:
+    """
+    写库前确保这些任务日期的分区存在（DjangoPipeline 调用），返回新建的分区名
+
+    分区正常由定时任务提前创建；这里补建说明定时任务没有按时运行，记录错误日志。
+    须在写入结果的事务之外调用：创建分区会锁住整张结果表直到事务结束
+    """
+    missing = set(days) - _ensured_partition_days
+    if not missing:
+        return []
+    if not results_partitioned():
+        _ensured_partition_days.update(missing)
+        return []
+    created = []
+    for day in sorted(missing):
+        created += create_result_partitions(day, 1)
+        _ensured_partition_days.add(day)
+    if created:
+        logger.error(f"结果分区由写库时补建: {created}，请检查 Celery beat（purge_expired_results_task）是否运行")
+    return created
+
+
+def partition_horizon_days(today) -> int:
+    """今天起连续存在的每日分区天数"""
+    existing = set(list_result_partitions())
+    days = 0
+    while partition_name(today + timedelta(days=days)) in existing:
+        days += 1
+    return days
+
+
+def drop_result_partitions(cutoff) -> list:
+    """删除整个范围都早于 cutoff 的分区（pYYYYMMDD 覆盖到次日零点），返回删除的分区名"""
+    dropped = []
+    with connection.cursor() as cursor:
+        for name in list_result_partitions():
+            match = _PARTITION_SUFFIX_RE.search(name)
+            if not match:
+                continue
+            day = datetime.strptime(match.group(1), '%Y%m%d').date()
+            if day + timedelta(days=1) > cutoff.date():
+                continue
+            cursor.execute(f"DROP TABLE IF EXISTS {connection.ops.quote_name(name)}")
+            dropped.append(name)
+            logger.info(f"过期结果分区已删除: {name}")
+    return dropped
+
+
+def delete_in_batches(qs, batch_size=RETENTION_DELETE_BATCH) -> int:
+    """按主键分批删除 qs 中的行，返回删除的行数（不含级联删除的关联行）"""
+    total = 0
+    while True:
+        ids = list(qs.order_by().values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return total
+        qs.model.objects.filter(pk__in=ids).delete()
+        total += len(ids)
+
+
+def purge_expired(now=None) -> dict:
+    """
+    清理保留期之前的任务、任务结果与资源
+
+    Returns:
+        {'cutoff', 'partitions_created', 'partitions_dropped', 'results_deleted', 'resources_deleted', 'tasks_deleted'}
+    """
+    now = now or timezone.now()
+    cutoff = now - timedelta(hours=get_result_retention_hours())
+    report = {'cutoff': cutoff.isoformat(), 'partitions_created': [], 'partitions_dropped': [], 'results_deleted': 0}
+    if results_partitioned():
+        report['partitions_created'] = create_result_partitions(now.date())
+        report['partitions_dropped'] = drop_result_partitions(cutoff)
+        horizon = partition_horizon_days(now.date())
+        if horizon < RESULT_PARTITION_MIN_HORIZON:
+            logger.error(f"结果表只有今天起 {horizon} 天的分区，之后的结果将写入默认分区")
+        # 剩下的过期行只在默认分区（以及迁移时的旧数据分区）中，其余分区按 task_date 裁剪
+        report['results_deleted'] = delete_in_batches(TaskResource.objects.filter(task_date__lt=cutoff.date()))
+    else:
+        report['results_deleted'] = delete_in_batches(TaskResource.objects.filter(created_at__lt=cutoff))
+    # 资源每次被任务找到都会刷新 last_seen_at，早于保留期的资源只剩（分区中未满一天的）过期关联，随资源级联删除
+    report['resources_deleted'] = delete_in_batches(Resource.objects.filter(last_seen_at__lt=cutoff))
+    report['tasks_deleted'] = delete_in_batches(SearchTask.objects.filter(created_at__lt=cutoff))
+    return report
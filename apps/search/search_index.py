@@ -0,0 +1,103 @@
+"""
+资源广场的全文检索
+
+标题与链接切分为检索词，存入 resources.search_text（写库时由 DjangoPipeline 生成）：
+- 中日韩文字连续片段切为相邻两字（bigram），并另外收录出现过的单字，供单字查询；
+- 字母、数字片段各为一个词（全角转半角、转小写）。
+PostgreSQL：search_vector 为 to_tsvector('simple', search_text) 的生成列，建 GIN 索引（迁移 0018）；
+查询按同样规则切分，中文片段的相邻 bigram 用 <-> 要求位置相邻（等价于子串匹配），字母数字词按前缀匹配，
+按 ts_rank 相关度排序。pg_trgm 的三元组无法为两个字的中文查询使用索引，因此不采用。
+其他数据库（本地开发的 SQLite）退回 icontains 过滤，在最近的候选结果中按 Python 计算的相关度排序。
+"""
+import re
+import unicodedata
+
+from django.db import connection, models
+from django.db.models.expressions import RawSQL
+
+from apps.search.models import DiskType, Resource, SiteSource
+
+# 中日韩文字：假名、CJK 统一汉字（含扩展 A）、兼容汉字、韩文音节
+_CJK_CHARS = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af'
+_CJK_RUN_RE = re.compile(f'[{_CJK_CHARS}]+')
+_RUN_RE = re.compile(f'[{_CJK_CHARS}]+|[a-z]+|[0-9]+')
+
+# 非 PostgreSQL 时参与相关度排序的最近候选数
+SQUARE_SEARCH_CANDIDATES = 1000
+
+
+def _runs(text: str) -> list:
+    return _RUN_RE.findall(unicodedata.normalize('NFKC', text or '').lower())
+
+
+def _bigrams(run: str) -> list:
+    if len(run) < 2:
+        return [run]
+    return [run[i:i + 2] for i in range(len(run) - 1)]
+
+
+def search_text(title: str, url: str = '') -> str:
+    """资源的检索词（空格分隔）：同一中文片段的 bigram 位置相邻，单字统一放在末尾"""
+    tokens, chars = [], set()
+    for run in _runs(title) + _runs(url):
+        if _CJK_RUN_RE.fullmatch(run):
+            tokens.extend(_bigrams(run))
+            chars.update(run)
+        else:
+            tokens.append(run)
+    return ' '.join(tokens + sorted(chars))
+
+
+def build_tsquery(q: str) -> str:
+    """
+    把搜索关键词转为 to_tsquery('simple', ...) 的查询串，没有可检索的词时返回空串
+
+    中文片段 '复仇者' -> (复仇 <-> 仇者)，单字 '剧' -> 剧，字母数字 '1080p' -> 1080:* & p:*，各片段之间为 &
+    """
+    terms = []
+    for run in _runs(q):
+        if not _CJK_RUN_RE.fullmatch(run):
+            terms.append(f'{run}:*')
+        elif len(run) == 1:
+            terms.append(run)
+        else:
+            terms.append('(' + ' <-> '.join(_bigrams(run)) + ')')
+    return ' & '.join(terms)
+
+
+def _dimension_filter(q: str):
+    # 网盘类型、站点只在很小的维度表中匹配名称，资源表按 smallint id 过滤
+    return (models.Q(disk_id__in=DiskType.objects.filter(name__icontains=q).values('id'))
+            | models.Q(site_id__in=SiteSource.objects.filter(name__icontains=q).values('id')))
+
+
+def _relevance(resource, needle: str) -> int:
+    title = resource.title.lower()
+    if title.startswith(needle):
+        return 3
+    if needle in title:
+        return 2
+    return 1
+
+
+def _search_fallback(qs, q: str, limit: int) -> list:
+    """icontains 过滤后取最近的候选，按相关度排序（同分保持最近被找到的顺序）"""
+    qs = qs.filter(models.Q(title__icontains=q) | models.Q(url__icontains=q) | _dimension_filter(q))
+    candidates = list(qs.order_by('-last_seen_at')[:SQUARE_SEARCH_CANDIDATES])
+    needle = q.lower()
+    candidates.sort(key=lambda resource: _relevance(resource, needle), reverse=True)
+    return candidates[:limit]
+
+
+def search_resources(qs, q: str, limit: int) -> list:
+    """
+    在资源查询集 qs（已按时间范围过滤）中检索关键词 q，按相关度、最近被找到的时间排序，返回前 limit 个资源
+    """
+    tsquery = build_tsquery(q)
+    if connection.vendor != 'postgresql' or not tsquery:
+        return _search_fallback(qs, q, limit)
+    vector = f'{connection.ops.quote_name(Resource._meta.db_table)}.search_vector'
+    matched = RawSQL(f"{vector} @@ to_tsquery('simple', %s)", [tsquery], output_field=models.BooleanField())
+    rank = RawSQL(f"ts_rank({vector}, to_tsquery('simple', %s))", [tsquery], output_field=models.FloatField())
+    qs = qs.filter(matched | _dimension_filter(q)).annotate(rank=rank).order_by('-rank', '-last_seen_at')
+    return list(qs[:limit])
@@ -1,11 +1,28 @@
 import os
+import json
 import logging
 import sys
 import subprocess
+import uuid
 from datetime import timedelta
+import redis
+from celery import chord
 from scraper.celery import app
-from apps.search.models import SearchTask, SiteConfig
-from apps.search.config_utils import get_result_expire_hours, get_email_config, get_crawl_timeout_seconds
+from apps.search.models import SearchTask, SiteConfig, TaskResource, cache_summary
+from apps.search.config_utils import (
+    get_result_expire_hours, get_email_config, get_crawl_timeout_seconds, get_crawl_mode,
+    get_crawl_fanout_group_size, get_crawl_fanout_timeout_seconds, get_crawl_batch_size,
+    get_crawl_batch_window_seconds
+)
+from apps.search.keyword_cache import (
+    get_lease_seconds, is_refresh, normalize_keyword, renew_keyword, settle_keyword, take_handover
+)
+from apps.search.redis_utils import get_redis_client
+from apps.search.result_cache import invalidate_result_cache
+from apps.search.result_events import publish_status
+from apps.search.retention import purge_expired
+from scraper.daemon import STOP_GRACE_SECONDS, is_daemon_alive, submit_job, wait_job_result
+from scraper.runner import compute_deadline, parse_site_reports
 import django
 from django.db import close_old_connections
 from django.utils import timezone
@@ -16,6 +33,9 @@ logger = logging.getLogger(__name__)
 # 配置Scrapy日志（级别由 Django LOGGING 配置控制，统一为 INFO）
 scrapy_logger = logging.getLogger('scrapy')
 
+# 批量爬取：等待合并的关键词任务队列，元素为 JSON [task_id, keyword]
+CRAWL_BATCH_PENDING_KEY = 'crawl:batch:pending'
+
 # 确保Django环境已初始化
 def ensure_django_initialized():
     if not hasattr(django, 'apps') or not django.apps.apps.ready:
@@ -125,6 +145,204 @@ def send_email_task(self, task_id):
     finally:
         close_old_connections()
 
+class CrawlTimeoutError(TimeoutError):
+    """爬取超时被强制终止；site_status 为终止前已结束站点的完成报告"""
+
+    def __init__(self, message, site_status=None):
+        super().__init__(message)
+        self.site_status = site_status or {}
+
+
+def _run_crawl_subprocess(jobs, timeout_seconds, site_keys=None):
+    # 在 Celery worker 进程内直接跑 CrawlerProcess 容易卡死：Twisted reactor
+    # 在同一进程中只能启动一次；Celery prefork worker 会复用进程执行多个任务。
+    # 这里改为每个任务启动一个独立子进程执行 Scrapy，彻底隔离 reactor。
+    BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    logger.info(f"开始执行爬取（子进程模式）: 项目根目录={BASE_DIR}")
+
+    env = os.environ.copy()
+    env.update({
+        'CRAWL_JOBS': json.dumps([[str(t), str(k)] for t, k in jobs], ensure_ascii=False),
+        'CRAWL_BASE_DIR': str(BASE_DIR),
+        'CRAWL_SITE_KEYS': ','.join(site_keys or []),
+        # 爬虫在截止时间前主动收尾，强制终止只作为兜底
+        'CRAWL_DEADLINE': str(compute_deadline(timeout_seconds)),
+    })
+
+    logger.info(f"启动 Scrapy 子进程: jobs={len(jobs)}, timeout={timeout_seconds}s")
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'scraper.runner'],
+        cwd=BASE_DIR,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+
+    try:
+        stdout, stderr = proc.communicate(timeout=timeout_seconds)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        stdout, stderr = proc.communicate()
+        raise CrawlTimeoutError(f"Scrapy 子进程超时 {timeout_seconds}s，已终止", parse_site_reports(stdout))
+
+    if stdout:
+        logger.info("Scrapy 子进程输出(stdout):\n" + stdout[-20000:])
+    if stderr:
+        logger.warning("Scrapy 子进程输出(stderr):\n" + stderr[-20000:])
+
+    if proc.returncode != 0:
+        raise RuntimeError(f"Scrapy 子进程退出码异常: {proc.returncode}")
+    return parse_site_reports(stdout)
+
+
+def _run_crawl_daemon(rds, job_id, jobs, timeout_seconds, site_keys=None):
+    # 常驻服务模式：任务投递到常驻 reactor，省去每次启动解释器与 django.setup() 的冷启动开销
+    logger.info(f"开始执行爬取（常驻服务模式）: job_id={job_id}, jobs={len(jobs)}, timeout={timeout_seconds}s")
+    submit_job(rds, job_id, jobs, timeout_seconds, site_keys)
+
+    # 常驻服务自身负责按 timeout 停止爬虫，这里额外留出停止宽限，避免结果在途时提前放弃
+    result = wait_job_result(rds, job_id, timeout_seconds + STOP_GRACE_SECONDS + 10)
+    if result is None:
+        raise CrawlTimeoutError(f"常驻爬虫服务 {timeout_seconds}s 内未返回结果")
+    if result.get('timed_out'):
+        raise CrawlTimeoutError(
+            f"常驻爬虫服务爬取超时 {timeout_seconds}s: {result.get('error') or ''}", result.get('sites')
+        )
+    if not result.get('ok'):
+        raise RuntimeError(f"常驻爬虫服务爬取失败: {result.get('error')}")
+    return result.get('sites') or {}
+
+
+def _run_crawl(jobs, timeout_seconds, site_keys=None, job_id=None):
+    """
+    执行一次爬取
+
+    Args:
+        jobs: [(task_id, keyword), ...]，批量爬取时多个关键词任务共用一次爬虫运行
+        job_id: 常驻服务模式下的任务标识，默认取第一个 task_id
+
+    Returns:
+        各站点完成报告 {site_key: {'name', 'reason', 'complete', 'items', 'skipped_requests'}}
+    """
+    if get_crawl_mode() == 'daemon':
+        rds = get_redis_client()
+        if is_daemon_alive(rds):
+            return _run_crawl_daemon(rds, job_id or jobs[0][0], jobs, timeout_seconds, site_keys)
+        logger.warning("常驻爬虫服务不在线，回退到子进程模式")
+    return _run_crawl_subprocess(jobs, timeout_seconds, site_keys)
+
+
+def _resolve_crawl_status(task_id, site_status, interrupted=False):
+    """
+    根据各站点完成情况确定任务最终状态
+
+    - 全部站点完整完成：SUCCESS
+    - 部分站点完成或已有结果入库（超时/部分站点失败）：PARTIAL
+    - 没有任何站点完成且没有结果：FAILURE
+    """
+    if not interrupted and all(s.get('complete') for s in site_status.values()):
+        return 'SUCCESS'
+    if any(s.get('complete') for s in site_status.values()):
+        return 'PARTIAL'
+    if TaskResource.objects.filter(task_id=task_id).exists():
+        return 'PARTIAL'
+    return 'FAILURE'
+
+
+def _mark_missing_sites(site_status, sites, reason='timeout'):
+    """爬取被中断时，没有报告的站点按未完成记录"""
+    for site in sites:
+        site_status.setdefault(site.key, {'name': site.name, 'reason': reason, 'complete': False})
+    return site_status
+
+
+def _task_site_status(site_status, task_id):
+    """从批量爬取的站点报告中取出单个任务的视图（结果数按任务拆分）"""
+    result = {}
+    for key, report in site_status.items():
+        report = dict(report)
+        task_items = report.pop('task_items', None)
+        if task_items is not None:
+            report['items'] = task_items.get(str(task_id), 0)
+        result[key] = report
+    return result
+
+
+def _settle_keyword_claim(task_id, status):
+    """
+    leader 任务结束后处理关键词认领（见 keyword_cache）与等待中的跟随者
+
+    Returns:
+        True 表示失败的任务已交接重试，任务保持运行中
+    """
+    task = SearchTask.objects.filter(task_id=task_id).only('keyword').first()
+    if not task:
+        return False
+    task_hex = uuid.UUID(str(task_id)).hex
+    norm_keyword = normalize_keyword(task.keyword)
+    waiting = SearchTask.objects.filter(related_task_id=task_id, is_cache=True, status__in=('PENDING', 'RUNNING'))
+
+    has_results = status != 'FAILURE' and TaskResource.objects.filter(task_id=task_id).exists()
+
+    try:
+        rds = get_redis_client()
+        if not norm_keyword:
+            pass
+        elif is_refresh(rds, norm_keyword, task_hex):
+            # 过时缓存的后台刷新：成功则切换缓存到本任务，失败继续提供旧结果
+            settle_keyword(rds, norm_keyword, task_hex, has_results, refresh=True)
+        elif status == 'FAILURE' and waiting.exists() and take_handover(rds, task_hex):
+            # 已有用户在等待该关键词的结果：续约并重新爬取，跟随者继续等待
+            renew_keyword(rds, norm_keyword, task_hex, get_lease_seconds())
+            logger.warning(f"爬取失败，已有跟随者等待，交接重试: task_id={task_id}")
+            crawl_task.delay(str(task_id), task.keyword)
+            return True
+        else:
+            # 缓存从完成时开始计时；失败或没有结果时只做短时间的负缓存
+            settle_keyword(rds, norm_keyword, task_hex, has_results)
+    except redis.RedisError as e:
+        logger.warning(f"更新关键词认领失败: task_id={task_id}, error={e}")
+
+    # 跟随者同步最终状态，并各自发送邮件通知
+    follower_ids = list(waiting.values_list('task_id', flat=True))
+    SearchTask.objects.filter(task_id__in=follower_ids).update(status=status)
+    if status != 'FAILURE':
+        for follower_id in follower_ids:
+            send_email_task.delay(str(follower_id))
+    return False
+
+
+def _fail_crawl(task_ids):
+    """爬取任务异常终止：标记失败并释放（或交接）关键词认领"""
+    for task_id in task_ids:
+        if not _settle_keyword_claim(task_id, 'FAILURE'):
+            SearchTask.objects.filter(task_id=task_id).update(status='FAILURE')
+            invalidate_result_cache(task_id)
+            publish_status(task_id, 'FAILURE')
+
+
+def _finish_crawl(task_id, site_status, interrupted=False):
+    status = _resolve_crawl_status(task_id, site_status, interrupted)
+    incomplete = [k for k, s in site_status.items() if not s.get('complete')]
+    if _settle_keyword_claim(task_id, status):
+        return 'RUNNING'
+    logger.info(f"爬取完成，更新任务状态为{status}: task_id={task_id}, 未完整完成站点={incomplete}")
+    SearchTask.objects.filter(task_id=task_id).update(status=status, site_status=site_status)
+    invalidate_result_cache(task_id)
+    publish_status(task_id, status)
+    cache = cache_summary(site_status)
+    logger.info(
+        f"响应缓存: task_id={task_id}, 命中={cache['hits']}, 未命中={cache['misses']}, "
+        f"命中率={cache['hit_ratio']}%, 节省={cache['bytes_saved']} 字节"
+    )
+
+    # 邮件通知拆分为独立任务（可重试，且不影响爬虫主任务状态）
+    if status != 'FAILURE':
+        send_email_task.delay(task_id)
+    return status
+
+
 @app.task
 def crawl_task(task_id, keyword):
     logger.info(f"开始执行爬取任务: task_id={task_id}, keyword={keyword}")
@@ -141,113 +359,157 @@ def crawl_task(task_id, keyword):
             task.expire_time = now + timedelta(hours=get_result_expire_hours())
             task.save(update_fields=['expire_time'])
         SearchTask.objects.filter(task_id=task_id).update(status='RUNNING')
+        invalidate_result_cache(task_id)
+        publish_status(task_id, 'RUNNING')
         close_old_connections()
-        
-        # 获取项目根目录
-        BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-        logger.info(f"项目根目录: {BASE_DIR}")
 
         enabled_sites = list(SiteConfig.objects.filter(enabled=True).order_by('key'))
         logger.info(f"从数据库读取站点配置: enabled={len(enabled_sites)}")
         if not enabled_sites:
             raise RuntimeError("数据库中没有启用的站点配置（SiteConfig.enabled=True）")
-        
-        # 在 Celery worker 进程内直接跑 CrawlerProcess 容易卡死：Twisted reactor
-        # 在同一进程中只能启动一次；Celery prefork worker 会复用进程执行多个任务。
-        # 这里改为每个任务启动一个独立子进程执行 Scrapy，彻底隔离 reactor。
-        logger.info("开始执行爬取（子进程模式）")
-
-        crawl_script = r'''
-import os
-import sys
-import django
 
-from scrapy.crawler import CrawlerProcess
-from scrapy.utils.project import get_project_settings
-
-os.environ.setdefault("DJANGO_SETTINGS_MODULE", "scraper.settings")
-django.setup()
-
-from scraper.spiders.universal import UniversalSpider
-from apps.search.models import SiteConfig
-
-task_id = os.environ.get("CRAWL_TASK_ID")
-keyword = os.environ.get("CRAWL_KEYWORD")
-
-sites = SiteConfig.objects.filter(enabled=True).order_by('key')
-config = {'sites': {}}
-for s in sites:
-    cfg = s.config or {}
-    cfg.setdefault('name', s.name)
-    if s.host:
-        cfg.setdefault('host', s.host)
-    config['sites'][s.key] = cfg
-
-settings = get_project_settings()
-settings.set('ITEM_PIPELINES', {
-    'scraper.pipelines.DebugPipeline': 200,
-    'scraper.pipelines.DjangoPipeline': 300,
-})
-# 禁用 Scrapy 的原生日志输出，统一使用 Django 的日志系统
-settings.set('LOG_ENABLED', False)
-settings.set('FEED_EXPORT_ENCODING', 'utf-8')
-
-process = CrawlerProcess(settings)
-for site_name, site_cfg in config['sites'].items():
-    site_cfg['task_id'] = task_id
-    process.crawl(UniversalSpider, site_cfg=site_cfg, keyword=keyword)
-
-process.start(stop_after_crawl=True)
-'''
-
-        env = os.environ.copy()
-        env.update({
-            'CRAWL_TASK_ID': str(task_id),
-            'CRAWL_KEYWORD': str(keyword),
-            'CRAWL_BASE_DIR': str(BASE_DIR),
-        })
-
-        # 超时（秒）：防止站点无响应导致任务永久挂起
+        group_size = get_crawl_fanout_group_size()
+        if group_size <= 0 and get_crawl_batch_size() > 1:
+            # 批量模式：进入待合并队列，由 crawl_batch_task 在合并窗口后与其他关键词一起爬取
+            _enqueue_crawl_batch(task_id, keyword)
+            return task_id
+
+        if group_size > 0:
+            # 分站点并行模式：每组站点一个子任务，各自独立超时，由 chord 回调汇总任务状态
+            site_keys = [s.key for s in enabled_sites]
+            groups = [site_keys[i:i + group_size] for i in range(0, len(site_keys), group_size)]
+            logger.info(f"分站点并行爬取: groups={len(groups)}, group_size={group_size}")
+            chord(
+                crawl_sites_task.s(task_id, keyword, keys) for keys in groups
+            )(finalize_crawl_task.s(task_id))
+            return task_id
+
+        # 超时（秒）：爬虫在截止时间前主动收尾，超时仍未退出时强制终止
         timeout_seconds = get_crawl_timeout_seconds()
-        logger.info(f"启动 Scrapy 子进程: timeout={timeout_seconds}s")
-
-        proc = subprocess.Popen(
-            [sys.executable, '-c', crawl_script],
-            cwd=BASE_DIR,
-            env=env,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-        )
-
         try:
-            stdout, stderr = proc.communicate(timeout=timeout_seconds)
-        except subprocess.TimeoutExpired:
-            proc.kill()
-            stdout, stderr = proc.communicate()
-            raise TimeoutError(f"Scrapy 子进程超时 {timeout_seconds}s，已终止")
-
-        if stdout:
-            logger.info("Scrapy 子进程输出(stdout):\n" + stdout[-20000:])
-        if stderr:
-            logger.warning("Scrapy 子进程输出(stderr):\n" + stderr[-20000:])
-
-        if proc.returncode != 0:
-            raise RuntimeError(f"Scrapy 子进程退出码异常: {proc.returncode}")
-        
-        # 更新任务状态为成功
-        logger.info("爬取完成，更新任务状态为SUCCESS")
-        SearchTask.objects.filter(task_id=task_id).update(status='SUCCESS')
-
-        # 邮件通知拆分为独立任务（可重试，且不影响爬虫主任务状态）
-        send_email_task.delay(task_id)
+            site_status = _run_crawl([(task_id, keyword)], timeout_seconds)
+            interrupted = False
+        except CrawlTimeoutError as e:
+            logger.warning(f"爬取超时，按已完成站点与已入库结果收尾: {e}")
+            site_status = _mark_missing_sites(e.site_status, enabled_sites)
+            interrupted = True
+
+        _finish_crawl(task_id, site_status, interrupted)
         
     except Exception as e:
         logger.error(f"任务执行失败: {e}", exc_info=True)
         # 更新任务状态为失败
-        SearchTask.objects.filter(task_id=task_id).update(status='FAILURE')
+        _fail_crawl([task_id])
         raise
     finally:
         close_old_connections()
         logger.info(f"爬取任务完成: task_id={task_id}")
         return task_id
+
+
+@app.task
+def crawl_sites_task(task_id, keyword, site_keys):
+    """
+    分站点并行模式下的子任务：只爬取指定的一组站点
+
+    失败不抛出异常（否则 chord 回调不会执行），而是返回结果交给 finalize_crawl_task 汇总
+    """
+    logger.info(f"开始爬取站点组: task_id={task_id}, sites={site_keys}")
+    try:
+        ensure_django_initialized()
+        close_old_connections()
+        # 同一任务的多个站点组可能同时投递到常驻服务，任务标识需要区分站点组
+        sites = _run_crawl([(task_id, keyword)], get_crawl_fanout_timeout_seconds(), site_keys,
+                           job_id=f"{task_id}:{','.join(site_keys)}")
+        return {'site_keys': site_keys, 'ok': True, 'error': None, 'sites': sites}
+    except CrawlTimeoutError as e:
+        logger.warning(f"站点组爬取超时: task_id={task_id}, sites={site_keys}, error={e}")
+        return {'site_keys': site_keys, 'ok': False, 'error': str(e), 'sites': e.site_status}
+    except Exception as e:
+        logger.warning(f"站点组爬取失败: task_id={task_id}, sites={site_keys}, error={e}")
+        return {'site_keys': site_keys, 'ok': False, 'error': str(e), 'sites': {}}
+    finally:
+        close_old_connections()
+
+
+@app.task
+def finalize_crawl_task(results, task_id):
+    """chord 回调：所有站点组结束（完成或超时）后汇总任务状态并发送邮件"""
+    try:
+        ensure_django_initialized()
+        results = [r for r in (results or []) if isinstance(r, dict)]
+        site_status = {}
+        for r in results:
+            site_status.update(r.get('sites') or {})
+            # 子任务失败且没有报告的站点，按未完成记录
+            for key in r.get('site_keys') or []:
+                site_status.setdefault(key, {'reason': r.get('error') or 'failed', 'complete': False})
+
+        interrupted = not results or any(not r.get('ok') for r in results)
+        _finish_crawl(task_id, site_status, interrupted)
+        return task_id
+    finally:
+        close_old_connections()
+
+
+def _enqueue_crawl_batch(task_id, keyword):
+    rds = get_redis_client()
+    rds.rpush(CRAWL_BATCH_PENDING_KEY, json.dumps([str(task_id), str(keyword)], ensure_ascii=False))
+    # 每个入队任务都对应一次合并执行，先到期的执行会带走窗口内排队的其他任务，后到的发现队列已空直接返回
+    crawl_batch_task.apply_async(countdown=get_crawl_batch_window_seconds())
+    logger.info(f"任务进入批量爬取队列: task_id={task_id}, keyword={keyword}")
+
+
+def _pop_crawl_batch(rds, size):
+    pipe = rds.pipeline()
+    pipe.lrange(CRAWL_BATCH_PENDING_KEY, 0, size - 1)
+    pipe.ltrim(CRAWL_BATCH_PENDING_KEY, size, -1)
+    raw, _ = pipe.execute()
+    return [tuple(json.loads(r)) for r in raw]
+
+
+@app.task
+def crawl_batch_task():
+    """批量爬取：取出最多 crawl_batch_size 个待合并的关键词任务，在一次爬虫运行中检索，各任务独立收尾"""
+    ensure_django_initialized()
+    jobs = _pop_crawl_batch(get_redis_client(), get_crawl_batch_size())
+    if not jobs:
+        return []
+
+    task_ids = [task_id for task_id, _ in jobs]
+    logger.info(f"开始批量爬取: tasks={len(jobs)}, keywords={[keyword for _, keyword in jobs]}")
+    try:
+        enabled_sites = list(SiteConfig.objects.filter(enabled=True).order_by('key'))
+        if not enabled_sites:
+            raise RuntimeError("数据库中没有启用的站点配置（SiteConfig.enabled=True）")
+
+        timeout_seconds = get_crawl_timeout_seconds()
+        try:
+            site_status = _run_crawl(jobs, timeout_seconds, job_id=f"batch:{uuid.uuid4().hex}")
+            interrupted = False
+        except CrawlTimeoutError as e:
+            logger.warning(f"批量爬取超时，按已完成站点与已入库结果收尾: {e}")
+            site_status = _mark_missing_sites(e.site_status, enabled_sites)
+            interrupted = True
+
+        for task_id in task_ids:
+            _finish_crawl(task_id, _task_site_status(site_status, task_id), interrupted)
+        return task_ids
+    except Exception as e:
+        logger.error(f"批量爬取失败: tasks={task_ids}, error={e}", exc_info=True)
+        _fail_crawl(task_ids)
+        raise
+    finally:
+        close_old_connections()
+
+
+@app.task
+def purge_expired_results_task():
+    """定时清理保留期之前的任务与结果（Celery beat 每小时执行），PostgreSQL 下同时补齐结果表未来几天的分区"""
+    ensure_django_initialized()
+    try:
+        report = purge_expired()
+        logger.info(f"过期数据清理完成: {report}")
+        return report
+    finally:
+        close_old_connections()
@@ -27,6 +27,8 @@ urlpatterns = [
     path('admin/configs/<int:config_id>/edit/', views.admin_system_config_edit, name='admin_system_config_edit'),
     path('admin/configs/<int:config_id>/delete/', views.admin_system_config_delete, name='admin_system_config_delete'),
     path('api/verify_task_email', views.verify_task_email, name='verify_task_email'),
+    path('api/results', views.api_results, name='api_results'),  # 任务结果 API（query: related_task_id、cursor、limit、fields）
+    path('api/results/events', views.result_events, name='result_events'),  # 任务结果实时推送（SSE）
     path('result', views.result, name='result'),        # 任务结果页（query: task_id=32位hex）
     path('result/<uuid:task_id>/', views.result_legacy, name='result_legacy'), # 兼容旧链接
     re_path(r'^result/(?P<task_id>[0-9a-f]{32})/$', views.result_legacy_hex, name='result_legacy_hex'),
@@ -1,11 +1,16 @@
+import base64
 import csv
+import io
 import json
 import uuid
 import time
 import urllib.request
-from datetime import timedelta
+from datetime import datetime, timedelta
 import os
 import re
+import logging
+import threading
+import zlib
 
 import redis
 
@@ -13,7 +18,8 @@ from django.db import models
 
 from django.core.exceptions import ValidationError
 from django.core.validators import validate_email
-from django.http import HttpResponse, JsonResponse
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect
 from django.urls import reverse
 from django.utils import timezone
@@ -21,18 +27,23 @@ from django.contrib.auth import authenticate, login as auth_login, logout as aut
 from django.contrib.auth.decorators import login_required, user_passes_test
 
 from .forms import AdminLoginForm, SiteConfigForm, EmailRuleForm, SystemConfigForm
-from .models import SearchTask, ResourceResult, SiteConfig, EmailRule, SystemConfig
+from .models import SearchTask, DiskType, Resource, SiteSource, TaskResource, SiteConfig, EmailRule, SystemConfig
 from .tasks import crawl_task
+from .redis_utils import get_redis_client
+from .result_cache import cache_response, get_cached_response
+from .result_events import TERMINAL_STATUSES, last_result_event_id, read_result_events
+from .search_index import search_resources
+from .keyword_cache import (
+    claim_keyword, claim_refresh, get_cache_stats, is_fresh, normalize_keyword, record_cache_event
+)
 from .config_utils import (
-    get_email_rate_limit_windows, get_keyword_cache_ttl, get_index_recent_tasks_count,
+    get_email_rate_limit_windows, get_index_recent_tasks_count,
     get_square_display_count, get_square_expire_hours,
     get_result_expire_hours, get_email_config, get_crawl_timeout_seconds
 )
 
 
-def _get_redis_client():
-    redis_url = os.getenv('REDIS_URL') or os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0')
-    return redis.Redis.from_url(redis_url, decode_responses=True)
+logger = logging.getLogger(__name__)
 
 
 _INCR_EXPIRE_LUA = """
@@ -59,8 +70,28 @@ def _check_email_rate_limit(rds, email: str):
     return None
 
 
-def _normalize_keyword(keyword: str) -> str:
-    return (keyword or '').strip().lower()
+def _start_keyword_refresh(rds, norm_keyword: str, keyword: str):
+    """过时缓存的后台刷新：以一个不发邮件的任务重新爬取，成功后关键词缓存切换到该任务"""
+    refresh_uuid = uuid.uuid4()
+    if not claim_refresh(rds, norm_keyword, refresh_uuid.hex):
+        return None
+    SearchTask.objects.create(
+        keyword=keyword,
+        email='',
+        notify_email=False,
+        expire_time=timezone.now() + timedelta(hours=get_result_expire_hours()),
+        task_id=refresh_uuid,
+        related_task_id=refresh_uuid,
+        is_cache=False,
+        is_refresh=True,
+    )
+    crawl_task.delay(refresh_uuid, keyword)
+    return refresh_uuid
+
+
+def _recent_tasks():
+    """首页展示的最近任务（不含后台刷新任务）"""
+    return SearchTask.objects.filter(is_refresh=False)[:get_index_recent_tasks_count()]
 
 
 def _load_email_rules():
@@ -105,35 +136,36 @@ def index(request):
         try:
             validate_email(email)
         except ValidationError:
-            recent_tasks = SearchTask.objects.all()[:get_index_recent_tasks_count()]
+            recent_tasks = _recent_tasks()
             return render(request, 'search/index.html', {
                 'recent_tasks': recent_tasks,
                 'error': '邮箱格式无效，请输入正确的邮箱地址。'
             })
 
         if not _is_email_allowed(email):
-            recent_tasks = SearchTask.objects.all()[:get_index_recent_tasks_count()]
+            recent_tasks = _recent_tasks()
             return render(request, 'search/index.html', {
                 'recent_tasks': recent_tasks,
                 'error': '该邮箱不允许提交请求，请更换邮箱或联系管理员。'
             })
 
-        rds = _get_redis_client()
+        rds = get_redis_client()
         limited = _check_email_rate_limit(rds, email)
         if limited:
-            recent_tasks = SearchTask.objects.all()[:get_index_recent_tasks_count()]
+            recent_tasks = _recent_tasks()
             return render(request, 'search/index.html', {
                 'recent_tasks': recent_tasks,
                 'error': '提交过于频繁，请稍后再试。'
             })
 
-        norm_keyword = _normalize_keyword(keyword)
-        cache_key = f"kw:{norm_keyword}"
-        cached_task_hex = rds.get(cache_key) if norm_keyword else None
+        norm_keyword = normalize_keyword(keyword)
+        task_uuid = uuid.uuid4()
+        # 单飞认领：同一关键词只有认领成功的任务发起爬取，其余提交挂到 leader 的结果上
+        is_leader, cached_task_hex = claim_keyword(rds, norm_keyword, task_uuid.hex) if norm_keyword else (True, None)
 
         expire_time = timezone.now() + timedelta(hours=get_result_expire_hours())
 
-        if cached_task_hex:
+        if not is_leader and cached_task_hex:
             try:
                 related_uuid = uuid.UUID(hex=cached_task_hex)
             except ValueError:
@@ -142,6 +174,12 @@ def index(request):
             if related_uuid:
                 related_task = SearchTask.objects.filter(task_id=related_uuid).order_by('-created_at').first()
                 status = related_task.status if related_task else 'PENDING'
+                if status in ('PENDING', 'RUNNING') or is_fresh(rds, norm_keyword, cached_task_hex):
+                    record_cache_event(rds, 'hit')
+                else:
+                    # 超过软 TTL：先复用旧结果，同时发起一次后台刷新
+                    record_cache_event(rds, 'stale')
+                    _start_keyword_refresh(rds, norm_keyword, keyword)
 
                 task = SearchTask.objects.create(
                     keyword=keyword,
@@ -155,7 +193,8 @@ def index(request):
                 )
                 return redirect(f"{reverse('result')}?related_task_id={task.related_task_id.hex}")
 
-        task_uuid = uuid.uuid4()
+        if norm_keyword:
+            record_cache_event(rds, 'miss')
         task = SearchTask.objects.create(
             keyword=keyword,
             email=email,
@@ -166,15 +205,12 @@ def index(request):
             is_cache=False,
         )
 
-        if norm_keyword:
-            rds.setex(cache_key, get_keyword_cache_ttl(), task_uuid.hex)
-
         crawl_task.delay(task.task_id, keyword)
 
         return redirect(f"{reverse('result')}?related_task_id={task.related_task_id.hex}")
 
     # 首页加载：获取最近的搜索动态给"广场"模块展示
-    recent_tasks = SearchTask.objects.all()[:get_index_recent_tasks_count()]
+    recent_tasks = _recent_tasks()
     return render(request, 'search/index.html', {'recent_tasks': recent_tasks})
 
 
@@ -217,21 +253,15 @@ def square(request):
     expire_hours = get_square_expire_hours()
     expire_time = timezone.now() - timedelta(hours=expire_hours)
     
-    # 按日期范围查询
-    qs = ResourceResult.objects.filter(created_at__gte=expire_time).order_by('-created_at')
+    # 按日期范围查询（资源全局唯一，被多个任务找到的资源只展示一次，按最近被找到的时间排序）
+    qs = Resource.objects.filter(last_seen_at__gte=expire_time).order_by('-last_seen_at')
     
-    # 如果有搜索关键词，在日期范围基础上进一步过滤
-    if q:
-        qs = qs.filter(
-            models.Q(title__icontains=q)
-            | models.Q(disk_type__icontains=q)
-            | models.Q(site_source__icontains=q)
-            | models.Q(url__icontains=q)
-        )
-    
-    # 直接返回指定数量的资源（去重由数据库层面处理）
+    # 直接返回指定数量的资源；有搜索关键词时在日期范围基础上全文检索，按相关度排序
     display_count = get_square_display_count()
-    resources = list(qs[:display_count])
+    if q:
+        resources = search_resources(qs, q, display_count)
+    else:
+        resources = list(qs[:display_count])
     
     return render(request, 'search/square.html', {'resources': resources, 'q': q})
 
@@ -241,10 +271,15 @@ def status(request):
     total_sites = SiteConfig.objects.count()
     enabled_sites = SiteConfig.objects.filter(enabled=True).count()
     sites = SiteConfig.objects.all().order_by('key')
+    try:
+        cache_stats = get_cache_stats(get_redis_client())
+    except Exception:
+        cache_stats = None
     return render(request, 'search/status.html', {
         'total_sites': total_sites,
         'enabled_sites': enabled_sites,
         'sites': sites,
+        'cache_stats': cache_stats,
     })
 
 
@@ -253,6 +288,168 @@ def about(request):
     return render(request, 'search/about.html')
 
 
+# 结果页首屏与结果 API 每页默认条数、最大条数
+RESULT_PAGE_SIZE = 60
+RESULT_PAGE_MAX = 200
+# 结果 API 可返回的字段（fields 参数为其子集，逗号分隔）及对应的查询列
+RESULT_API_COLUMNS = {
+    'id': 'id',
+    'title': 'resource__title',
+    'disk_type': 'resource__disk_id',
+    'url': 'resource__url',
+    'site_source': 'site_id',
+    'created_at': 'created_at',
+}
+
+
+# 导出时每次从数据库读取的行数（PostgreSQL 下为服务端游标的每批行数），也是每次写出的行数
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FIELDS = ('title', 'disk_type', 'url', 'site_source', 'created_at')
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+
+def _export_rows(related_uuid):
+    """按发现时间倒序逐行读取任务结果：(title, disk_type, url, site_source, created_at)"""
+    qs = (TaskResource.objects.filter(task_id=related_uuid).order_by('-created_at', '-id')
+          .values_list('resource__title', 'resource__disk_id', 'resource__url', 'site_id', 'created_at'))
+    for title, disk_id, url, site_id, created_at in qs.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield title, DiskType.name_for(disk_id), url, SiteSource.name_for(site_id), created_at
+
+
+def _batched(rows, size=EXPORT_CHUNK_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _csv_chunks(rows):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(EXPORT_FIELDS)
+    # 表头先发出，客户端立即开始下载
+    yield buf.getvalue()
+    for batch in _batched(rows):
+        buf.seek(0)
+        buf.truncate()
+        writer.writerows(batch)
+        yield buf.getvalue()
+
+
+def _ndjson_chunks(rows):
+    for batch in _batched(rows):
+        yield ''.join(
+            json.dumps(dict(zip(EXPORT_FIELDS, row)), ensure_ascii=False, cls=DjangoJSONEncoder) + '\n'
+            for row in batch
+        )
+
+
+def _gzip_chunks(chunks):
+    """边生成边压缩（gzip 格式）"""
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _export_response(related_uuid, export: str, use_gzip: bool = False):
+    """
+    流式导出任务结果：按批从数据库读取、按批写出，web 进程内存只保留一批数据，大文件也能立即开始下载
+    """
+    chunks = (_csv_chunks if export == 'csv' else _ndjson_chunks)(_export_rows(related_uuid))
+    filename = f'crawl-res-{related_uuid.hex}.{export}'
+    if use_gzip:
+        response = StreamingHttpResponse(_gzip_chunks(chunks), content_type='application/gzip')
+        filename += '.gz'
+    else:
+        response = StreamingHttpResponse(chunks, content_type=EXPORT_CONTENT_TYPES[export])
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def _load_result_task(related_uuid):
+    """
+    返回 (task, expire_time)：task 为爬取任务（缓存命中的任务展示原任务的结果），不存在时为 None；
+    过期时间以提交请求的任务为准
+    """
+    request_task = SearchTask.objects.filter(related_task_id=related_uuid).order_by('-created_at').first()
+    crawl_task_obj = SearchTask.objects.filter(task_id=related_uuid).order_by('-created_at').first()
+    task = crawl_task_obj or request_task
+    if not task:
+        return None, None
+    return task, (request_task.expire_time if request_task else task.expire_time)
+
+
+def _is_expired(expire_time) -> bool:
+    return bool(expire_time and timezone.now() > expire_time)
+
+
+def _encode_result_cursor(row) -> str:
+    raw = f"{row['created_at'].isoformat()}|{row['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _decode_result_cursor(cursor: str):
+    """游标为上一页最后一行的 (created_at, id)，格式错误时抛出 ValueError"""
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+    created_at, last_id = raw.rsplit('|', 1)
+    return datetime.fromisoformat(created_at), int(last_id)
+
+
+def _result_page(related_uuid, cursor=None, limit=RESULT_PAGE_SIZE, fields=tuple(RESULT_API_COLUMNS),
+                 disk_type=None, site_source=None):
+    """
+    任务结果的一页，按 (created_at, id) 倒序键集分页：
+    每页是 (task_id, created_at, id) 索引上的一次范围扫描，耗时与内存只取决于 limit，与任务结果总数和页码无关
+
+    Returns:
+        (rows, next_cursor)，rows 为只包含 fields 字段的字典列表，没有下一页时 next_cursor 为 None
+    """
+    qs = TaskResource.objects.filter(task_id=related_uuid)
+    if disk_type:
+        disk_id = DiskType.lookup_id(disk_type)
+        if disk_id is None:
+            return [], None
+        qs = qs.filter(resource__disk_id=disk_id)
+    if site_source:
+        site_id = SiteSource.lookup_id(site_source)
+        if site_id is None:
+            return [], None
+        qs = qs.filter(site_id=site_id)
+    if cursor:
+        created_at, last_id = cursor
+        qs = qs.filter(models.Q(created_at__lt=created_at) | models.Q(created_at=created_at, id__lt=last_id))
+
+    columns = {'id', 'created_at'} | {RESULT_API_COLUMNS[field] for field in fields}
+    rows = list(qs.order_by('-created_at', '-id').values(*columns)[:limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_result_cursor(rows[-1])
+
+    page = []
+    for row in rows:
+        item = {}
+        for field in fields:
+            value = row[RESULT_API_COLUMNS[field]]
+            if field == 'disk_type':
+                value = DiskType.name_for(value)
+            elif field == 'site_source':
+                value = SiteSource.name_for(value)
+            item[field] = value
+        page.append(item)
+    return page, next_cursor
+
+
 def result(request):
     related_task_id_hex = (request.GET.get('related_task_id') or '').strip().lower()
     if not related_task_id_hex:
@@ -263,40 +460,200 @@ def result(request):
     except ValueError:
         return render(request, 'search/result_detail.html', {'task': None, 'resources': []})
 
-    request_task = SearchTask.objects.filter(related_task_id=related_uuid).order_by('-created_at').first()
-    crawl_task_obj = SearchTask.objects.filter(task_id=related_uuid).order_by('-created_at').first()
-    task = crawl_task_obj or request_task
+    # 已结束任务的结果页命中缓存时不查询数据库
+    cached = get_cached_response(request, 'page', related_uuid)
+    if cached is not None:
+        return cached
+
+    task, expire_time = _load_result_task(related_uuid)
     if not task:
         return render(request, 'search/result_detail.html', {'task': None, 'resources': []})
 
     # 过期校验
-    now = timezone.now()
-    expire_time = (request_task.expire_time if request_task else task.expire_time)
-    if expire_time and now > expire_time:
+    if _is_expired(expire_time):
         return render(request, 'search/result_detail.html', {
             'task': task,
             'resources': [],
             'expired': True,
         })
 
-    resources_qs = ResourceResult.objects.filter(task_id=related_uuid).order_by('-created_at')
-
-    # 导出 CSV
-    if (request.GET.get('export') or '').lower() == 'csv':
-        response = HttpResponse(content_type='text/csv; charset=utf-8')
-        response['Content-Disposition'] = f'attachment; filename="crawl-res-{related_uuid.hex}.csv"'
-        writer = csv.writer(response)
-        writer.writerow(['title', 'disk_type', 'url', 'site_source', 'created_at'])
-        for r in resources_qs.iterator():
-            writer.writerow([r.title, r.disk_type, r.url, r.site_source, r.created_at])
-        return response
+    # 导出 CSV / NDJSON
+    export = (request.GET.get('export') or '').lower()
+    if export in EXPORT_CONTENT_TYPES:
+        use_gzip = (request.GET.get('gzip') or '').lower() in {'1', 'true', 'yes'}
+        return _export_response(related_uuid, export, use_gzip)
 
-    resources = list(resources_qs)
-    return render(request, 'search/result_detail.html', {
+    # 爬取进行中：先记下结果事件流的位置再查询结果，页面从该位置订阅新结果（重复的结果由页面脚本按链接去重）
+    events_since = None
+    if task.status not in TERMINAL_STATUSES:
+        try:
+            rds = get_redis_client()
+            try:
+                events_since = last_result_event_id(rds, related_uuid)
+            finally:
+                rds.close()
+        except redis.RedisError:
+            events_since = None
+
+    # 首屏只渲染第一页，后续页面由页面脚本通过结果 API 按游标加载
+    resources, next_cursor = _result_page(related_uuid)
+    response = render(request, 'search/result_detail.html', {
         'task': task,
         'resources': resources,
+        'next_cursor': next_cursor,
+        'events_since': events_since,
+        'events_poll_seconds': RESULT_EVENTS_POLL_SECONDS,
         'expired': False,
     })
+    if task.status in TERMINAL_STATUSES:
+        response = cache_response(request, 'page', related_uuid, response, expire_time)
+    return response
+
+
+def api_results(request):
+    """
+    任务结果 API（JSON，键集分页）
+
+    参数：related_task_id（32 位 hex）、cursor（上一页返回的 next_cursor）、limit（默认 60，最大 200）、
+    fields（逗号分隔的返回字段，默认全部）、disk_type / site_source（按名称精确过滤）
+    """
+    try:
+        related_uuid = uuid.UUID(hex=(request.GET.get('related_task_id') or '').strip().lower())
+    except ValueError:
+        return JsonResponse({'ok': False, 'error': 'invalid_task_id'}, status=400)
+
+    fields = [f.strip() for f in (request.GET.get('fields') or '').split(',') if f.strip()] or list(RESULT_API_COLUMNS)
+    if any(f not in RESULT_API_COLUMNS for f in fields):
+        return JsonResponse({'ok': False, 'error': 'invalid_fields', 'allowed': list(RESULT_API_COLUMNS)}, status=400)
+
+    try:
+        limit = min(max(int(request.GET.get('limit') or RESULT_PAGE_SIZE), 1), RESULT_PAGE_MAX)
+        cursor = request.GET.get('cursor')
+        cursor = _decode_result_cursor(cursor) if cursor else None
+    except ValueError:
+        return JsonResponse({'ok': False, 'error': 'invalid_params'}, status=400)
+
+    cached = get_cached_response(request, 'api', related_uuid)
+    if cached is not None:
+        return cached
+
+    task, expire_time = _load_result_task(related_uuid)
+    if not task:
+        return JsonResponse({'ok': False, 'error': 'task_not_found'}, status=404)
+    if _is_expired(expire_time):
+        return JsonResponse({'ok': False, 'error': 'expired'}, status=410)
+
+    results, next_cursor = _result_page(
+        related_uuid, cursor=cursor, limit=limit, fields=fields,
+        disk_type=(request.GET.get('disk_type') or '').strip() or None,
+        site_source=(request.GET.get('site_source') or '').strip() or None,
+    )
+    response = JsonResponse({
+        'ok': True, 'status': task.status, 'status_display': task.get_status_display(),
+        'results': results, 'next_cursor': next_cursor,
+    })
+    if task.status in TERMINAL_STATUSES:
+        response = cache_response(request, 'api', related_uuid, response, expire_time)
+    return response
+
+
+# SSE 连接上没有新事件时发送心跳的间隔（秒），同时检查任务状态（兜底状态事件推送失败的情况）
+RESULT_EVENTS_PING_SECONDS = 15
+# 单个 SSE 连接的最长时间（秒），到时断开，浏览器带 Last-Event-ID 自动重连，不会长期占用 web 工作线程
+RESULT_EVENTS_MAX_SECONDS = 300
+# 每个 web 进程同时保持的 SSE 连接数上限：每个连接占用一个工作线程，超过时返回 503，页面改为轮询结果 API
+RESULT_EVENTS_MAX_STREAMS = 16
+# 页面轮询结果 API 的间隔（秒）
+RESULT_EVENTS_POLL_SECONDS = 5
+
+_result_event_slots = threading.BoundedSemaphore(RESULT_EVENTS_MAX_STREAMS)
+
+
+def _sse(event_type: str, data: str, event_id: str = None) -> str:
+    return (f"id: {event_id}\n" if event_id else '') + f"event: {event_type}\ndata: {data}\n\n"
+
+
+def _result_event_stream(related_uuid, task, last_id: str):
+    rds = get_redis_client()
+    deadline = time.monotonic() + RESULT_EVENTS_MAX_SECONDS
+    try:
+        yield 'retry: 3000\n\n'
+        while time.monotonic() < deadline:
+            events = read_result_events(rds, related_uuid, last_id, RESULT_EVENTS_PING_SECONDS * 1000)
+            if not events:
+                status = SearchTask.objects.filter(pk=task.pk).values_list('status', flat=True).first()
+                if status in TERMINAL_STATUSES:
+                    data = {'status': status, 'display': dict(SearchTask.STATUS_CHOICES).get(status, status)}
+                    yield _sse('status', json.dumps(data, ensure_ascii=False))
+                    return
+                yield ': ping\n\n'
+                continue
+            for event_id, event_type, data in events:
+                last_id = event_id
+                yield _sse(event_type, data, event_id)
+                if event_type == 'status' and json.loads(data).get('status') in TERMINAL_STATUSES:
+                    return
+    except redis.RedisError as e:
+        # 连接断开后浏览器自动重连
+        logger.warning(f"结果事件读取失败: task_id={related_uuid}, error={e}")
+    finally:
+        rds.close()
+
+
+class _EventStreamSlot:
+    """占用一个 SSE 连接名额的事件流：响应关闭（推送结束或客户端断开）时释放名额"""
+
+    def __init__(self, events):
+        self.events = events
+        self.released = False
+
+    def __iter__(self):
+        return self.events
+
+    def close(self):
+        self.events.close()
+        if not self.released:
+            self.released = True
+            _result_event_slots.release()
+
+
+def result_events(request):
+    """
+    任务结果实时推送（Server-Sent Events）
+
+    参数：related_task_id（32 位 hex）、since（结果页渲染时的事件流位置）；
+    断线重连时浏览器发送的 Last-Event-ID 优先。事件：results（一批新结果）、status（任务状态变化），
+    推送最终状态后连接结束。本进程的 SSE 连接数达到 RESULT_EVENTS_MAX_STREAMS 时返回 503，页面改为轮询结果 API
+    """
+    try:
+        related_uuid = uuid.UUID(hex=(request.GET.get('related_task_id') or '').strip().lower())
+    except ValueError:
+        return JsonResponse({'ok': False, 'error': 'invalid_task_id'}, status=400)
+
+    task, expire_time = _load_result_task(related_uuid)
+    if not task:
+        return JsonResponse({'ok': False, 'error': 'task_not_found'}, status=404)
+    if _is_expired(expire_time):
+        return JsonResponse({'ok': False, 'error': 'expired'}, status=410)
+
+    last_id = request.headers.get('Last-Event-ID') or request.GET.get('since') or '0-0'
+    if not re.fullmatch(r'\d+-\d+', last_id):
+        return JsonResponse({'ok': False, 'error': 'invalid_params'}, status=400)
+
+    if task.status in TERMINAL_STATUSES:
+        data = {'status': task.status, 'display': task.get_status_display()}
+        events = [_sse('status', json.dumps(data, ensure_ascii=False))]
+    elif _result_event_slots.acquire(blocking=False):
+        events = _EventStreamSlot(_result_event_stream(related_uuid, task, last_id))
+    else:
+        response = JsonResponse({'ok': False, 'error': 'too_many_streams'}, status=503)
+        response['Retry-After'] = str(RESULT_EVENTS_POLL_SECONDS)
+        return response
+    response = StreamingHttpResponse(events, content_type='text/event-stream; charset=utf-8')
+    response['Cache-Control'] = 'no-cache'
+    # 禁止 nginx 缓冲事件流
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 
 def result_legacy(request, task_id):
@@ -0,0 +1,526 @@
+"""
+爬虫热点函数的微基准测试
+
+    python -m scraper.bench [--links 链接文件] [--pages 页面目录] [--site 站点key] [--count 20000] [--items 2000] [--repeat 5]
+    python -m scraper.bench --crawl 20 [--crawl-items 20] [--workers CPU核心数] [--latency 0.05]
+
+链接文件每行一条链接；不指定时生成模拟详情页/列表页中提取到的链接（少量网盘链接混在大量普通链接中）。
+结果项测试模拟不进入详情页的列表页：每个结果项提取链接后经 finalize_item_safe 生成 item。
+整页提取测试使用页面目录中保存的 UTF-8 页面，不指定时生成模拟详情页（大段脚本、哈希值、Base64 数据与各种空白字符）。
+JSON 提取测试模拟返回数百个结果项的搜索接口（json 模式、不进入详情页）。
+详情页区域提取测试对比整页提取与只提取 detail_rules.link_container 区域的扫描字节数与耗时：
+指定 --site 时使用 config/sites.yaml 中该站点的 detail_rules 与 --pages 中保存的该站点详情页，
+否则使用模拟详情页（页头导航、广告位、推荐列表、脚本与页脚包围正文）。
+--crawl N 只运行多站点爬取测试：本地模拟 N 个站点（每个响应带固定延迟），在同一进程中各用一个 UniversalSpider 爬取，
+对比解析在 reactor 线程中执行与提交到线程池/进程池（EXTRACT_WORKERS）时的总耗时与 reactor 最长停顿。
+每项测试先校验新旧实现的结果完全一致，再分别计时。
+"""
+import argparse
+import base64
+import hashlib
+import html
+import json
+import os
+import random
+import re
+import timeit
+import multiprocessing
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import yaml
+from scrapy import signals
+from scrapy.http import HtmlResponse
+
+from scraper.spiders.extraction import parse_detail_page
+from scraper.spiders.utils import (
+    OTHER_DISK, canonicalize_link, classify_link, extract_classified_links, extract_json_links,
+    extract_links, get_md5, load_rules, match_netdisk_link
+)
+
+_NETDISK_SAMPLES = [
+    'https://pan.baidu.com/s/1{code}?pwd=ab12',
+    'https://pan.quark.cn/s/{code}',
+    'https://pan.xunlei.com/s/VN{code}?pwd=x1y2#',
+    'https://drive.uc.cn/s/{code}',
+    'https://www.aliyundrive.com/s/{code}',
+    'https://www.alipan.com/s/{code}',
+    'https://cloud.189.cn/t/{code}',
+    'https://caiyun.139.com/m/i?{code}',
+    'https://www.123pan.com/s/{code}',
+    'https://www.123684.com/s/{code}',
+    'https://115cdn.com/s/{code}?password=a1b2',
+    'https://mypikpak.com/s/{code}',
+    'magnet:?xt=urn:btih:{code}{code}',
+    'thunder://QUFodHRwOi8ve{code}WlwWg==',
+    'ed2k://|file|{code}.mkv|1234567|ABCDEF|/',
+]
+
+_OTHER_SAMPLES = [
+    'https://www.example.com/d/{code}',
+    'https://static.example.com/images/{code}.jpg',
+    'https://cdn.jsdelivr.net/npm/jquery@3/{code}.min.js',
+    'https://fonts.googleapis.com/css?family={code}',
+    'https://www.google.com/search?q={code}',
+    'http://bbs.example.org/thread-{code}-1-1.html',
+    'https://t.me/{code}',
+    'https://www.douban.com/subject/{code}/',
+    'https://example.net/go?url=https%3A%2F%2F{code}',
+]
+
+
+def _legacy_match_netdisk_link(link: str) -> str:
+    """优化前的实现：逐条规则 re.search"""
+    link_lower = link.strip().lower()
+    for rule in load_rules():
+        if re.search(rule['pattern'], link_lower, re.IGNORECASE):
+            return rule['name']
+    return OTHER_DISK
+
+
+def build_link_corpus(count: int, netdisk_ratio: float = 0.2, seed: int = 1) -> list:
+    """生成模拟链接列表：约 netdisk_ratio 比例为网盘链接，其余为站点页面、静态资源等普通链接"""
+    rnd = random.Random(seed)
+    links = []
+    for _ in range(count):
+        samples = _NETDISK_SAMPLES if rnd.random() < netdisk_ratio else _OTHER_SAMPLES
+        code = ''.join(rnd.choices('abcdefghijkmnpqrstuvwxyzABCDEFGHJKLMNPQRSTUVWXYZ23456789', k=rnd.randint(8, 23)))
+        links.append(rnd.choice(samples).format(code=code))
+    return links
+
+
+def _legacy_extract_links(text: str) -> list:
+    """优化前的 extract_links：整页文本转义替换后逐个尝试解码所有 Base64 片段，返回 [(link, disk_type), ...]"""
+    text = text.replace('\\/', '/')
+    universal_pattern = r'(https?://[^\s\"\'><]+|magnet:\?xt=urn:btih:[a-zA-Z0-9]+|thunder://[A-Za-z0-9+/=]+|ed2k://[^\s\"\'><]+)'
+    raw_links = re.findall(universal_pattern, text)
+    potential_b64 = re.findall(r'[A-Za-z0-9+/]{40,}=*', text)
+    for b in potential_b64:
+        try:
+            decoded = base64.b64decode(b).decode('utf-8', errors='ignore')
+            if "http" in decoded or "magnet" in decoded:
+                raw_links.extend(re.findall(universal_pattern, decoded))
+        except Exception:
+            continue
+    clean_results = []
+    for link in raw_links:
+        link = link.rstrip('.,;)!?')
+        disk_name = classify_link(link)
+        if disk_name != OTHER_DISK and link not in [l for l, _ in clean_results]:
+            clean_results.append((link, disk_name))
+    return clean_results
+
+
+def build_fixture_pages(count: int = 40, seed: int = 1) -> list:
+    """
+    生成模拟详情页（UTF-8 字节）：正文链接紧邻中文、各种 Unicode 空白与非法字节，JSON 转义斜杠，
+    压缩脚本中的哈希与随机 Base64 片段（含各种填充），Base64 编码的链接与内嵌图片
+    """
+    rnd = random.Random(seed)
+    spaces = [' ', '\t', '\n', '\xa0', '\u3000', '\u2003', '\u200b', '\x1c', '']
+    b64_alphabet = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/'
+    pages = []
+    for i in range(count):
+        parts = ['<html><head><meta charset="utf-8"><title>测试资源 第%d页</title><script>' % i]
+        for j in range(rnd.randint(50, 150)):
+            # 压缩脚本：哈希值、随机 Base64 风格片段（长度与填充随机，多数无法解码）
+            token = hashlib.sha1(f'{seed}-{i}-{j}'.encode()).hexdigest() * rnd.randint(1, 2)
+            blob = ''.join(rnd.choices(b64_alphabet, k=rnd.randint(30, 120))) + '=' * rnd.randint(0, 3)
+            parts.append(f'var a{j}="{token}",b{j}="{blob}";')
+        parts.append('</script></head><body>')
+        for link in build_link_corpus(rnd.randint(10, 40), netdisk_ratio=0.5, seed=seed * 7919 + i):
+            sep = rnd.choice(spaces)
+            tail = rnd.choice(['', '提取码：1234', '。', ').', '\ufffd'])
+            escaped = link.replace('/', '\\/') if rnd.random() < 0.2 else link
+            parts.append(f'<p>资源{sep}{escaped}{tail}{rnd.choice(spaces)}说明</p>')
+        for k in range(rnd.randint(1, 4)):
+            # Base64 编码的链接（部分混入非 UTF-8 字节，解码后才拼出 http）
+            payload = f'下载地址 https://pan.quark.cn/s/b64{i}x{k} 备用 magnet:?xt=urn:btih:{i:04d}{k:04d}ABCDEF'.encode()
+            if rnd.random() < 0.3:
+                payload = b'\xff\xfe ht\xfftp://pan.baidu.com/s/1mix' + str(i).encode() + b' ' + payload
+            encoded = base64.b64encode(payload).decode()
+            parts.append(f'<div data-x="{encoded}"></div>')
+        # 内嵌图片（超过 Base64 片段长度上限）
+        image = base64.b64encode(rnd.randbytes(24000)).decode()
+        parts.append(f'<img src="data:image/png;base64,{image}">')
+        parts.append('</body></html>')
+        body = ''.join(parts).encode('utf-8')
+        if rnd.random() < 0.3:
+            body = body.replace(b'</p>', b'\xff</p>', 3)
+        pages.append(body)
+    return pages
+
+
+def bench_extractor(pages, repeat):
+    texts = [body.decode('utf-8', 'replace') for body in pages]
+    for index, (body, text) in enumerate(zip(pages, texts)):
+        expected = _legacy_extract_links(text)
+        if extract_classified_links(text) != expected:
+            raise SystemExit(f"整页提取结果与旧实现不一致（第 {index + 1} 个页面）")
+
+    def run_legacy():
+        for text in texts:
+            _legacy_extract_links(text)
+
+    def run_text():
+        for text in texts:
+            extract_classified_links(text)
+
+    size = sum(len(body) for body in pages)
+    links = sum(len(extract_classified_links(text)) for text in texts)
+    print(f"整页提取：{len(pages)} 个页面，共 {size / 1024:.0f} KB，提取网盘链接 {links} 条，结果与旧实现一致")
+    legacy = min(timeit.repeat(run_legacy, number=1, repeat=repeat))
+    current = min(timeit.repeat(run_text, number=1, repeat=repeat))
+    print(f"  旧实现 {legacy * 1e3 / len(pages):.2f} ms/页，新实现 {current * 1e3 / len(pages):.2f} ms/页，"
+          f"加速比 {legacy / current:.2f}x")
+
+
+def build_api_response(count: int, seed: int = 1) -> bytes:
+    """生成模拟搜索接口响应：每个结果项含嵌套的链接列表、封面、简介、哈希等字段"""
+    rnd = random.Random(seed)
+    items = []
+    for i in range(count):
+        links = build_link_corpus(rnd.randint(1, 4), netdisk_ratio=0.8, seed=seed * 31 + i)
+        items.append({
+            'id': i,
+            'name': f'流浪地球 第{i}集',
+            'cover': f'https://img.example.com/cover/{i}.jpg',
+            'desc': '简介：' + '很好看的短剧，' * rnd.randint(5, 30),
+            'hash': hashlib.sha256(str(i).encode()).hexdigest(),
+            'links': [{'type': 'pan', 'href': link, 'code': str(rnd.randint(1000, 9999))} for link in links],
+            'extra': {'note': base64.b64encode(f'备用 {links[0]}'.encode()).decode(), 'updated': '2024-01-01'},
+            'tags': ['短剧', '完结', '4K'],
+        })
+    return json.dumps({'code': 0, 'data': items}, ensure_ascii=False).encode('utf-8')
+
+
+def bench_json(body, repeat):
+    def run_legacy():
+        data = json.loads(body.decode('utf-8'))
+        return [_legacy_extract_links(json.dumps(item, ensure_ascii=False)) for item in data['data']]
+
+    def run_current():
+        data = json.loads(body)
+        return [extract_json_links(item) for item in data['data']]
+
+    def run_paths():
+        data = json.loads(body)
+        return [extract_json_links(item, ['links.*.href', 'extra']) for item in data['data']]
+
+    expected = [sorted(links) for links in run_legacy()]
+    for func in (run_current, run_paths):
+        if [sorted(links) for links in func()] != expected:
+            raise SystemExit("JSON 提取结果与旧实现不一致")
+
+    items = len(expected)
+    print(f"JSON 提取：{items} 个结果项，共 {len(body) / 1024:.0f} KB，提取网盘链接 {sum(map(len, expected))} 条，结果与旧实现一致")
+    legacy = min(timeit.repeat(run_legacy, number=1, repeat=repeat))
+    for label, func in (('遍历整个结果项', run_current), ('指定 json_link_paths', run_paths)):
+        current = min(timeit.repeat(func, number=1, repeat=repeat))
+        print(f"  {label}：序列化后正则 {legacy * 1e6 / items:.2f} µs/结果项，遍历字符串字段 {current * 1e6 / items:.2f} µs/结果项，"
+              f"加速比 {legacy / current:.2f}x")
+
+
+def build_detail_pages(count: int = 40, seed: int = 1) -> list:
+    """生成模拟详情页：正文中的资源链接被页头导航、广告位（含无关网盘链接）、推荐列表、脚本与页脚包围"""
+    rnd = random.Random(seed)
+    pages = []
+    for i in range(count):
+        nav = ''.join(f'<li><a href="https://www.example.com/c/{n}">分类{n}</a></li>' for n in range(30))
+        ads = ''.join(f'<div class="ad"><a href="{link}">推广资源</a></div>'
+                      for link in build_link_corpus(5, netdisk_ratio=1, seed=seed * 13 + i))
+        related = ''.join(f'<li><a href="https://www.example.com/d/{rnd.randint(1, 99999)}">相关影片 {n}</a></li>'
+                          for n in range(40))
+        script = ';'.join(f'var h{n}="{hashlib.md5(f"{i}-{n}".encode()).hexdigest() * 2}"' for n in range(200))
+        links = ''.join(f'<p>网盘下载：<a href="{link}">{link}</a> 提取码：{rnd.randint(1000, 9999)}</p>'
+                        for link in build_link_corpus(rnd.randint(2, 6), netdisk_ratio=1, seed=seed * 17 + i))
+        pages.append((
+            f'<html><head><title>流浪地球 {i}</title><script>{script}</script></head><body>'
+            f'<header><ul>{nav}</ul></header>{ads}'
+            f'<div class="content"><h1>流浪地球 {i}</h1><p>{"剧情简介。" * 100}</p>{links}'
+            f'<div class="ad"><a href="https://pan.baidu.com/s/1adv{i}">推广</a></div></div>'
+            f'<aside><ul>{related}</ul></aside><footer>{"版权所有 " * 50}</footer></body></html>'
+        ).encode('utf-8'))
+    return pages
+
+
+class _BenchStats(dict):
+    def inc_value(self, key, count=1, start=0):
+        self[key] = self.get(key, start) + count
+
+
+def bench_region(pages, detail_rules, repeat):
+    whole_rules = {k: v for k, v in detail_rules.items() if k not in ('link_container', 'link_exclude')}
+
+    def run(rules):
+        stats = _BenchStats()
+        results = []
+        for body in pages:
+            # 每次都重新构建选择器树（标题提取本来就需要），区域提取会从树中删除排除的节点
+            response = HtmlResponse('https://example.com/d/1', body=body, encoding='utf-8')
+            page = parse_detail_page(response.body, response.encoding, rules, '', response.selector)
+            for key, value in page['stats'].items():
+                stats.inc_value(f'extract/{key}', value)
+            results.append([link for _, links in page['items'] for link in links])
+        return results, stats
+
+    print(f"详情页区域提取：{len(pages)} 个页面，link_container={detail_rules['link_container']!r}，"
+          f"link_exclude={detail_rules.get('link_exclude')!r}")
+    for label, rules in (('整页提取', whole_rules), ('区域提取', detail_rules)):
+        results, stats = run(rules)
+        elapsed = min(timeit.repeat(lambda: run(rules), number=1, repeat=repeat))
+        print(f"  {label}：扫描 {stats['extract/bytes_scanned'] / len(pages) / 1024:.1f} KB/页，"
+              f"网盘链接 {sum(map(len, results)) / len(pages):.1f} 条/页，{elapsed * 1e3 / len(pages):.2f} ms/页"
+              + (f"（{stats['extract/container_missed']} 个页面未命中区域，整页提取）"
+                 if stats.get('extract/container_missed') else ''))
+
+
+def start_crawl_server(detail_pages, items, latency):
+    """
+    本地模拟站点：/{site}/search 返回 items 个结果项，/{site}/d/{n} 返回模拟详情页，
+    每个响应延迟 latency 秒（模拟网络往返）。返回 (server, port)
+    """
+    result_page = lambda site: ('<html><body>' + ''.join(
+        f'<div class="item"><a href="/{site}/d/{n}">流浪地球 {n}</a></div>' for n in range(items)
+    ) + '</body></html>').encode('utf-8')
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            parts = self.path.split('?')[0].strip('/').split('/')
+            body = (result_page(parts[0]) if parts[-1] == 'search'
+                    else detail_pages[int(parts[-1]) % len(detail_pages)])
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, server.server_address[1]
+
+
+def run_crawl(port, sites, workers, pool, queue):
+    """在独立进程中爬取 sites 个模拟站点（reactor 不能重启），结果写入 queue"""
+    from scrapy.crawler import CrawlerProcess
+    from twisted.internet import task
+
+    from scraper.spiders.universal import UniversalSpider
+
+    process = CrawlerProcess({
+        'LOG_ENABLED': False,
+        'ROBOTSTXT_OBEY': False,
+        'TELNETCONSOLE_ENABLED': False,
+        'DOWNLOADER_MIDDLEWARES': {'scraper.offload.ExtractBackpressureMiddleware': 330},
+        'EXTRACT_WORKERS': workers,
+        'EXTRACT_POOL': pool,
+    })
+    counts = {'items': 0, 'backpressure_waits': 0}
+    for n in range(sites):
+        site_cfg = {
+            'name': f'bench{n}', 'key': f'bench{n}', 'host': f'127.0.0.1:{port}',
+            'start_url': f'http://127.0.0.1:{port}/bench{n}/search?q={{keyword}}', 'concurrent': 4, 'delay': 0,
+            'list_rules': {'item_nodes': '//div[@class="item"]', 'title_node': './a/text()',
+                           'detail_link': './a/@href'},
+            'detail_rules': {'link_container': 'css:div.content', 'link_exclude': ['css:.ad']},
+        }
+        crawler = process.create_crawler(UniversalSpider)
+        crawler.settings.set('CONCURRENT_REQUESTS', 4, priority='spider')
+        crawler.settings.set('DOWNLOAD_DELAY', 0, priority='spider')
+
+        def _closed(spider, reason, crawler=crawler):
+            counts['items'] += crawler.stats.get_value('item_scraped_count', 0)
+            counts['backpressure_waits'] += crawler.stats.get_value('extract/backpressure_waits', 0)
+
+        crawler.signals.connect(_closed, signal=signals.spider_closed, weak=False)
+        process.crawl(crawler, site_cfg=site_cfg, jobs=[('bench', '流浪地球')])
+
+    # 每 10ms 检查一次 reactor 是否按时调度，记录最长的停顿（期间所有站点的下载都无法推进）
+    lag = {'last': None, 'max': 0.0}
+
+    def _tick():
+        now = time.perf_counter()
+        if lag['last'] is not None:
+            lag['max'] = max(lag['max'], now - lag['last'] - 0.01)
+        lag['last'] = now
+
+    task.LoopingCall(_tick).start(0.01)
+    started = time.perf_counter()
+    process.start(stop_after_crawl=True)
+    queue.put(dict(counts, elapsed=time.perf_counter() - started, max_stall=lag['max']))
+
+
+def bench_crawl(sites, items, latency, modes):
+    """多站点爬取总耗时：解析在 reactor 线程中执行 vs 提交到线程池/进程池"""
+    server, port = start_crawl_server(build_detail_pages(), items, latency)
+    ctx = multiprocessing.get_context('spawn')
+    print(f"多站点爬取：{sites} 个站点 x {items} 个详情页，响应延迟 {latency * 1e3:.0f} ms，CPU 核心数 {os.cpu_count()}")
+    try:
+        for workers, pool in modes:
+            queue = ctx.Queue()
+            proc = ctx.Process(target=run_crawl, args=(port, sites, workers, pool, queue))
+            proc.start()
+            result = queue.get()
+            proc.join()
+            label = f'{pool} x {workers}' if workers else 'reactor 线程'
+            print(f"  {label}：总耗时 {result['elapsed']:.2f} s，item {result['items']}，"
+                  f"reactor 最长停顿 {result['max_stall'] * 1e3:.0f} ms，背压等待 {result['backpressure_waits']} 次")
+    finally:
+        server.shutdown()
+
+
+def _legacy_finalize_item(title, links, keyword, seen):
+    """优化前 finalize_item_safe 的处理流程：每个 item 重新拆分关键词，每条链接重新 extract_links 识别网盘类型"""
+    clean_title = html.unescape(re.sub(r'<[^>]+>', '', str(title or "无标题"))).strip()
+    keyword_list = re.split(r'[ ,，|;；\t\n]+', keyword)
+    keyword_set = {word.lower() for word in keyword_list if word.strip()}
+    if keyword_set:
+        title_lower = clean_title.lower()
+        if not any(kw in title_lower for kw in keyword_set):
+            return []
+    raw_list = [l.strip() for l in links.split(',') if l.strip()]
+    items = []
+    for link in dict.fromkeys(raw_list):
+        _, single_disk = extract_links(link)
+        # 链接规范化与去重规则与当前实现一致
+        link, dedup_key = canonicalize_link(link, single_disk or None)
+        fingerprint = get_md5(dedup_key)
+        if fingerprint in seen:
+            continue
+        seen.add(fingerprint)
+        items.append((clean_title, str(single_disk or "未知"), link))
+    return items
+
+
+def build_result_page(count: int, seed: int = 1) -> list:
+    """生成模拟列表页的结果项 [(title, html), ...]：每项含若干网盘链接与站内/静态资源链接，部分标题不含关键词"""
+    rnd = random.Random(seed)
+    nodes = []
+    for i in range(count):
+        title = f"{'流浪地球' if rnd.random() < 0.7 else '其他电影'} {i} 4K 高码 合集"
+        links = build_link_corpus(rnd.randint(3, 8), netdisk_ratio=0.4, seed=seed * 100003 + i)
+        body = ''.join(f'<p><a href="{link}">{link}</a></p>' for link in links)
+        nodes.append((title, f'<div class="item"><h3>{title}</h3>{body}</div>'))
+    return nodes
+
+
+def _time(func, items, repeat):
+    def run():
+        for item in items:
+            func(item)
+    return min(timeit.repeat(run, number=1, repeat=repeat))
+
+
+def bench_classifier(links, repeat):
+    mismatches = [link for link in links if match_netdisk_link(link) != _legacy_match_netdisk_link(link)]
+    if mismatches:
+        raise SystemExit(f"网盘识别结果与旧实现不一致（{len(mismatches)} 条），例如: {mismatches[0]}")
+
+    legacy = _time(_legacy_match_netdisk_link, links, repeat)
+    current = _time(match_netdisk_link, links, repeat)
+    matched = sum(1 for link in links if match_netdisk_link(link) != OTHER_DISK)
+    print(f"网盘识别 match_netdisk_link：{len(links)} 条链接（网盘 {matched} 条），规则 {len(load_rules())} 条")
+    print(f"  逐条 re.search : {legacy * 1e6 / len(links):8.2f} µs/条")
+    print(f"  预编译规则集   : {current * 1e6 / len(links):8.2f} µs/条")
+    print(f"  加速比         : {legacy / current:8.2f}x")
+
+
+def bench_finalize(nodes, repeat, keyword='流浪地球 4k,蓝光'):
+    from scraper.spiders.universal import UniversalSpider
+
+    spider = UniversalSpider(site_cfg={'name': 'bench', 'host': 'example.com'}, jobs=[('bench', keyword)])
+    job = spider.jobs[0]
+
+    def run_current(extracted=None):
+        spider.seen_resources = set()
+        items = []
+        for index, (title, text) in enumerate(nodes):
+            links = extracted[index] if extracted else extract_classified_links(text)
+            if links:
+                items.extend(spider.finalize_item_safe(title, links, 'https://example.com/search', job))
+        return items
+
+    def run_legacy(extracted=None):
+        seen = set()
+        items = []
+        for index, (title, text) in enumerate(nodes):
+            links = extracted[index] if extracted else extract_links(text)[0]
+            if links:
+                items.extend(_legacy_finalize_item(title, links, keyword, seen))
+        return items
+
+    current_items = [(item['title'], item['disk_type'], item['resource_url']) for item in run_current()]
+    if current_items != run_legacy():
+        raise SystemExit("结果项与旧实现不一致")
+
+    print(f"结果项处理 extract + finalize_item_safe：{len(nodes)} 个结果项，生成 {len(current_items)} 个 item")
+    legacy_extracted = [extract_links(text)[0] for _, text in nodes]
+    current_extracted = [extract_classified_links(text) for _, text in nodes]
+    for label, legacy_args, current_args in (
+        ('提取 + 生成 item', (), ()),
+        ('仅 finalize_item_safe', (legacy_extracted,), (current_extracted,)),
+    ):
+        legacy = min(timeit.repeat(lambda: run_legacy(*legacy_args), number=1, repeat=repeat))
+        current = min(timeit.repeat(lambda: run_current(*current_args), number=1, repeat=repeat))
+        print(f"  {label}：逐链接重新提取 {legacy * 1e6 / len(nodes):.2f} µs/结果项，"
+              f"沿用提取结果 {current * 1e6 / len(nodes):.2f} µs/结果项，加速比 {legacy / current:.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='爬虫热点函数微基准测试')
+    parser.add_argument('--links', help='链接文件（每行一条），默认生成模拟链接')
+    parser.add_argument('--pages', help='页面目录（UTF-8 页面文件），默认生成模拟详情页')
+    parser.add_argument('--site', help='详情页区域提取测试使用 config/sites.yaml 中该站点的 detail_rules（需同时指定 --pages）')
+    parser.add_argument('--count', type=int, default=20000, help='模拟链接数量')
+    parser.add_argument('--items', type=int, default=2000, help='模拟列表页结果项数量')
+    parser.add_argument('--repeat', type=int, default=5, help='重复次数（取最快一次）')
+    parser.add_argument('--crawl', type=int, metavar='SITES',
+                        help='只运行多站点爬取测试：模拟站点数量（对比 reactor 线程、线程池、进程池解析）')
+    parser.add_argument('--crawl-items', type=int, default=20, help='多站点爬取测试每个站点的详情页数量')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='多站点爬取测试的解析池大小')
+    parser.add_argument('--latency', type=float, default=0.05, help='多站点爬取测试的模拟响应延迟（秒）')
+    args = parser.parse_args(argv)
+
+    if args.crawl:
+        bench_crawl(args.crawl, args.crawl_items, args.latency,
+                    [(0, 'thread'), (args.workers, 'thread'), (args.workers, 'process')])
+        return
+
+    if args.links:
+        with open(args.links, 'r', encoding='utf-8') as f:
+            links = [line.strip() for line in f if line.strip()]
+    else:
+        links = build_link_corpus(args.count)
+    bench_classifier(links, args.repeat)
+    bench_finalize(build_result_page(args.items), args.repeat)
+
+    if args.pages:
+        pages = []
+        for name in sorted(os.listdir(args.pages)):
+            with open(os.path.join(args.pages, name), 'rb') as f:
+                pages.append(f.read())
+    else:
+        pages = build_fixture_pages()
+    bench_extractor(pages, args.repeat)
+    bench_json(build_api_response(args.items), args.repeat)
+
+    if args.site:
+        with open(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config', 'sites.yaml'),
+                  'r', encoding='utf-8') as f:
+            detail_rules = (yaml.safe_load(f)['sites'][args.site].get('detail_rules') or {})
+        if not detail_rules.get('link_container') or not args.pages:
+            raise SystemExit(f"站点 {args.site} 未配置 detail_rules.link_container，或未指定 --pages")
+        bench_region(pages, detail_rules, args.repeat)
+    else:
+        bench_region(build_detail_pages(), {'link_container': 'css:div.content', 'link_exclude': ['css:.ad']},
+                     args.repeat)
+
+
+if __name__ == '__main__':
+    main()
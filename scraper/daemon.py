@@ -0,0 +1,354 @@
+"""
+常驻爬虫服务（crawler daemon）
+
+子进程模式下每个 crawl_task 都要重新启动解释器、导入 Django/Scrapy/Twisted、执行 django.setup()
+并启动新的 reactor，冷启动开销在高峰期占据了大部分检索耗时。
+
+常驻服务由一个监督进程（CrawlerDaemon）和若干工作进程（CrawlerWorker）组成：
+- 工作进程保持 reactor 常驻，通过 Redis 队列接收爬取任务（job_id、[(task_id, keyword), ...]、站点集合），
+  在同一个 reactor 上调度 UniversalSpider；
+- 每个任务有独立的超时，超时后停止该任务的全部 crawler；crawler 在宽限期内仍未停止时只回写该任务失败，
+  工作进程不再领取新任务，同一进程中的其他任务正常结束后再退出重启；
+- 工作进程执行 N 个任务（或内存超过阈值）后主动退出，由监督进程重新拉起（内存回收）；
+- 工作进程崩溃或失去心跳时，监督进程负责重启，并为其在途任务回写失败结果。
+"""
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import signal
+import time
+import uuid
+
+from apps.search.redis_utils import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUE_KEY = 'crawl:daemon:jobs'
+INFLIGHT_KEY = 'crawl:daemon:inflight'
+HEARTBEAT_KEY = 'crawl:daemon:heartbeat'
+WORKER_HEARTBEAT_KEY = 'crawl:daemon:worker:{worker_id}'
+RESULT_KEY = 'crawl:daemon:result:{job_id}'
+
+HEARTBEAT_TTL = 15
+WORKER_HEARTBEAT_TTL = 60
+RESULT_TTL = 3600
+# 任务超时后等待 crawler 优雅停止的时间，超过则判定工作进程失控并回收
+STOP_GRACE_SECONDS = 30
+
+
+def is_daemon_alive(rds) -> bool:
+    """常驻服务是否在线（监督进程定期刷新心跳）"""
+    return bool(rds.exists(HEARTBEAT_KEY))
+
+
+def submit_job(rds, job_id, jobs, timeout, site_keys=None):
+    """
+    向常驻服务提交一个爬取任务
+
+    Args:
+        job_id: 服务侧任务标识（单个关键词任务即其 task_id，批量任务为批次 ID），结果按它回写
+        jobs: [(task_id, keyword), ...]
+    """
+    job = {
+        'job_id': str(job_id),
+        'jobs': [[str(task_id), str(keyword)] for task_id, keyword in jobs],
+        'site_keys': list(site_keys) if site_keys else None,
+        'timeout': int(timeout),
+        'submitted_at': time.time(),
+    }
+    rds.delete(RESULT_KEY.format(job_id=job['job_id']))
+    rds.rpush(JOB_QUEUE_KEY, json.dumps(job, ensure_ascii=False))
+    return job
+
+
+def wait_job_result(rds, job_id, timeout):
+    """
+    阻塞等待常驻服务回写的任务结果
+
+    Returns:
+        结果字典（ok / timed_out / error / sites），超时未返回则为 None
+    """
+    popped = rds.blpop(RESULT_KEY.format(job_id=str(job_id)), timeout=max(int(timeout), 1))
+    if not popped:
+        return None
+    return json.loads(popped[1])
+
+
+def _push_result(rds, job_id, result):
+    key = RESULT_KEY.format(job_id=str(job_id))
+    pipe = rds.pipeline()
+    pipe.rpush(key, json.dumps(result, ensure_ascii=False))
+    pipe.expire(key, RESULT_TTL)
+    pipe.hdel(INFLIGHT_KEY, str(job_id))
+    pipe.execute()
+
+
+class CrawlerWorker:
+    """工作进程：常驻 reactor，循环从 Redis 队列领取任务并调度爬虫"""
+
+    def __init__(self, worker_id, max_jobs=50, max_concurrent=4, max_rss_mb=0):
+        self.worker_id = worker_id
+        self.max_jobs = max_jobs
+        self.max_concurrent = max_concurrent
+        self.max_rss_mb = max_rss_mb
+        self.jobs_started = 0
+        self.active = {}
+        # 宽限期内未能停止的任务：其 crawler 可能仍占用线程池，进程只能直接退出
+        self.stuck = set()
+        self.draining = False
+        self.polling = False
+
+    def run(self):
+        from scrapy.utils.reactor import install_reactor
+        install_reactor('twisted.internet.asyncioreactor.AsyncioSelectorReactor')
+
+        from scraper.runner import ensure_django, build_crawl_settings
+        ensure_django()
+
+        from twisted.internet import reactor, task
+        from scrapy.crawler import CrawlerRunner
+
+        self.reactor = reactor
+        self.rds = get_redis_client()
+        self.runner = CrawlerRunner(build_crawl_settings())
+
+        heartbeat = task.LoopingCall(self._heartbeat)
+        heartbeat.start(WORKER_HEARTBEAT_TTL / 4)
+        reactor.callWhenRunning(self._poll)
+        logger.info(f"爬虫工作进程已启动: worker={self.worker_id}, pid={os.getpid()}")
+        reactor.run(installSignalHandlers=False)
+
+    def _heartbeat(self):
+        key = WORKER_HEARTBEAT_KEY.format(worker_id=self.worker_id)
+        self.rds.setex(key, WORKER_HEARTBEAT_TTL, str(os.getpid()))
+
+    def _should_recycle(self):
+        if self.max_jobs and self.jobs_started >= self.max_jobs:
+            return True
+        if self.max_rss_mb:
+            rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            if rss_mb >= self.max_rss_mb:
+                return True
+        return False
+
+    def _poll(self):
+        from twisted.internet import threads
+
+        if self.draining or self.polling or len(self.active) >= self.max_concurrent:
+            return
+        if self._should_recycle():
+            self._drain('达到回收阈值')
+            return
+
+        self.polling = True
+        d = threads.deferToThread(self._fetch_job)
+        d.addCallbacks(self._on_job, self._on_poll_error)
+
+    def _fetch_job(self):
+        # 在线程中执行：BLPOP 与数据库查询都是阻塞调用，不能放在 reactor（asyncio 事件循环）线程
+        from django.db import close_old_connections
+        from scraper.runner import load_site_configs, load_crawl_settings
+
+        popped = self.rds.blpop(JOB_QUEUE_KEY, timeout=2)
+        if not popped:
+            return None
+        job = json.loads(popped[1])
+        self.rds.hset(INFLIGHT_KEY, job['job_id'], json.dumps({'worker_id': self.worker_id, 'job': job}))
+        close_old_connections()
+        try:
+            sites = load_site_configs(job.get('site_keys'))
+            crawl_settings = load_crawl_settings()
+        finally:
+            close_old_connections()
+        return job, sites, crawl_settings
+
+    def _on_poll_error(self, failure):
+        self.polling = False
+        logger.error(f"领取爬取任务失败: {failure.getErrorMessage()}")
+        self.reactor.callLater(2, self._poll)
+
+    def _on_job(self, fetched):
+        self.polling = False
+        if fetched:
+            job, sites, crawl_settings = fetched
+            try:
+                self._start_job(job, sites, crawl_settings)
+            except Exception as e:
+                logger.error(f"爬取任务调度失败: {e}", exc_info=True)
+                self.active.pop(job['job_id'], None)
+                _push_result(self.rds, job['job_id'], {'ok': False, 'timed_out': False, 'error': str(e)})
+        self.reactor.callLater(0, self._poll)
+
+    def _start_job(self, job, sites, crawl_settings=None):
+        from twisted.internet.defer import DeferredList
+        from scraper.runner import compute_deadline, schedule_crawl
+
+        job_id = job['job_id']
+        remaining = job['submitted_at'] + job['timeout'] - time.time()
+        if remaining <= 0:
+            _push_result(self.rds, job_id, {'ok': False, 'timed_out': True, 'error': '任务排队超时'})
+            return
+        if not sites:
+            _push_result(self.rds, job_id, {'ok': False, 'timed_out': False, 'error': '没有可用的站点配置'})
+            return
+
+        self.jobs_started += 1
+        report = {}
+        deadline = compute_deadline(job['timeout'], job['submitted_at'])
+        scheduled = schedule_crawl(self.runner, job['jobs'], sites, deadline=deadline, report=report,
+                                   crawl_settings=crawl_settings)
+        state = {
+            'crawlers': [crawler for _, crawler, _ in scheduled],
+            'timed_out': False,
+            'report': report,
+        }
+        state['timer'] = self.reactor.callLater(remaining, self._expire_job, job_id)
+        self.active[job_id] = state
+        logger.info(f"常驻服务开始爬取: job_id={job_id}, jobs={len(job['jobs'])}, sites={len(sites)}, worker={self.worker_id}")
+
+        done = DeferredList([d for _, _, d in scheduled], consumeErrors=True)
+        done.addCallback(self._finish_job, job_id)
+
+    def _expire_job(self, job_id):
+        state = self.active.get(job_id)
+        if not state:
+            return
+        state['timed_out'] = True
+        logger.warning(f"爬取任务超时，停止 crawler: job_id={job_id}")
+        for crawler in state['crawlers']:
+            crawler.stop()
+        state['timer'] = self.reactor.callLater(STOP_GRACE_SECONDS, self._abort_job, job_id)
+
+    def _abort_job(self, job_id):
+        # crawler 无法在宽限期内停止：只回写该任务超时，其他任务继续执行；之后不再领取新任务，
+        # 其他任务都结束后退出进程，由监督进程重启
+        logger.error(f"crawler 未能在宽限期内停止，工作进程将在其他任务结束后回收: job_id={job_id}")
+        state = self.active.pop(job_id, None) or {}
+        _push_result(self.rds, job_id, {
+            'ok': False, 'timed_out': True, 'error': '爬虫停止超时', 'sites': state.get('report') or {},
+        })
+        self.stuck.add(job_id)
+        self._drain('crawler 停止超时')
+
+    def _finish_job(self, results, job_id):
+        state = self.active.pop(job_id, None)
+        if state is None:
+            return
+        if state['timer'].active():
+            state['timer'].cancel()
+
+        errors = [f.getErrorMessage() for ok, f in results if not ok]
+        result = {
+            'ok': not state['timed_out'] and not errors,
+            'timed_out': state['timed_out'],
+            'error': '; '.join(errors) or None,
+            'sites': state['report'],
+        }
+        _push_result(self.rds, job_id, result)
+        logger.info(f"常驻服务爬取结束: job_id={job_id}, result={result}")
+
+        if self.draining and not self.active:
+            self._stop()
+        else:
+            self._poll()
+
+    def _drain(self, reason):
+        self.draining = True
+        logger.info(f"工作进程准备退出({reason}): worker={self.worker_id}, jobs={self.jobs_started}")
+        if not self.active:
+            self._stop()
+
+    def _stop(self):
+        if self.stuck:
+            # 失控的 crawler 可能阻塞在线程池中，reactor.stop() 等待线程池时会一直挂起：直接退出
+            logger.error(f"工作进程存在未能停止的 crawler，直接退出: jobs={sorted(self.stuck)}")
+            os._exit(1)
+        self.reactor.stop()
+
+
+def _worker_entry(worker_id, max_jobs, max_concurrent, max_rss_mb):
+    CrawlerWorker(worker_id, max_jobs, max_concurrent, max_rss_mb).run()
+
+
+class CrawlerDaemon:
+    """监督进程：维护工作进程池、刷新服务心跳、处理崩溃重启与在途任务回收"""
+
+    def __init__(self, workers=1, max_jobs=50, max_concurrent=4, max_rss_mb=0):
+        self.workers = workers
+        self.max_jobs = max_jobs
+        self.max_concurrent = max_concurrent
+        self.max_rss_mb = max_rss_mb
+        self.procs = {}
+        self.started_at = {}
+        self.stopping = False
+        self.rds = get_redis_client()
+        self.ctx = multiprocessing.get_context('spawn')
+
+    def serve_forever(self):
+        signal.signal(signal.SIGTERM, self._on_signal)
+        signal.signal(signal.SIGINT, self._on_signal)
+        logger.info(f"常驻爬虫服务启动: workers={self.workers}, max_jobs={self.max_jobs}")
+        try:
+            while not self.stopping:
+                self.rds.setex(HEARTBEAT_KEY, HEARTBEAT_TTL, str(os.getpid()))
+                for slot in range(self.workers):
+                    self._check_slot(slot)
+                time.sleep(1)
+        finally:
+            self.rds.delete(HEARTBEAT_KEY)
+            for proc, _ in self.procs.values():
+                if proc.is_alive():
+                    proc.terminate()
+            for proc, worker_id in self.procs.values():
+                proc.join(timeout=10)
+                self._recover_inflight(worker_id)
+            logger.info("常驻爬虫服务已停止")
+
+    def _on_signal(self, signum, frame):
+        self.stopping = True
+
+    def _check_slot(self, slot):
+        entry = self.procs.get(slot)
+        if entry:
+            proc, worker_id = entry
+            if proc.is_alive() and not self._heartbeat_lost(worker_id, proc):
+                return
+            if proc.is_alive():
+                logger.error(f"工作进程失去心跳，强制终止: worker={worker_id}, pid={proc.pid}")
+                proc.kill()
+                proc.join(timeout=10)
+            if proc.exitcode == 0:
+                logger.info(f"工作进程已回收: worker={worker_id}")
+            else:
+                logger.error(f"工作进程异常退出: worker={worker_id}, exitcode={proc.exitcode}")
+            self._recover_inflight(worker_id)
+            self.started_at.pop(worker_id, None)
+
+        worker_id = f"{slot}-{uuid.uuid4().hex[:8]}"
+        proc = self.ctx.Process(
+            target=_worker_entry,
+            args=(worker_id, self.max_jobs, self.max_concurrent, self.max_rss_mb),
+            daemon=True,
+        )
+        proc.start()
+        self.procs[slot] = (proc, worker_id)
+        self.started_at[worker_id] = time.time()
+
+    def _heartbeat_lost(self, worker_id, proc):
+        # 刚启动的进程还在导入依赖，给一个心跳周期的宽限
+        if time.time() - self.started_at.get(worker_id, 0) < WORKER_HEARTBEAT_TTL:
+            return False
+        return not self.rds.exists(WORKER_HEARTBEAT_KEY.format(worker_id=worker_id))
+
+    def _recover_inflight(self, worker_id):
+        for job_id, raw in self.rds.hgetall(INFLIGHT_KEY).items():
+            try:
+                owner = json.loads(raw).get('worker_id')
+            except ValueError:
+                owner = None
+            if owner == worker_id:
+                logger.warning(f"回收在途任务: job_id={job_id}, worker={worker_id}")
+                _push_result(self.rds, job_id, {'ok': False, 'timed_out': False, 'error': '爬虫工作进程异常退出'})
+        self.rds.delete(WORKER_HEARTBEAT_KEY.format(worker_id=worker_id))
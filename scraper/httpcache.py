@@ -0,0 +1,95 @@
+"""
+跨任务共享的 HTTP 响应缓存（Scrapy HTTPCACHE_STORAGE / HTTPCACHE_POLICY）
+
+热门资源的详情页会被大量关键词重复访问，相同的搜索请求也会在缓存失效前重复出现。
+响应按规范化请求（method、URL、body，即 Scrapy 请求指纹）缓存在 Redis 中，所有爬虫进程共用：
+- 缓存时间由 Spider 按站点与请求类型（workflow / search / detail）写入 request.meta['cache_ttl']，
+  为 0 时不缓存（工作流请求默认不缓存，避免复用过期的 token / cookie）；
+- 只缓存 200 响应，过期由 Redis TTL 负责；
+- 命中次数与节省的下载字节数记录在爬虫 stats 中（httpcache/hit、httpcache/bytes_saved），随站点报告写入任务。
+"""
+import logging
+import zlib
+
+import redis
+from scrapy.extensions.httpcache import DummyPolicy
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+from scrapy.utils.python import to_unicode
+
+from apps.search.redis_utils import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+HTTP_CACHE_KEY = 'crawl:httpcache:{fingerprint}'
+
+
+class SiteTTLPolicy(DummyPolicy):
+    """只缓存设置了缓存时间的请求与 200 响应"""
+
+    def should_cache_request(self, request):
+        return super().should_cache_request(request) and request.meta.get('cache_ttl', 0) > 0
+
+    def should_cache_response(self, response, request):
+        return response.status == 200
+
+
+class RedisCacheStorage:
+    def __init__(self, settings):
+        self.rds = None
+        self.fingerprinter = None
+        self.stats = None
+
+    def open_spider(self, spider):
+        # 响应体是二进制数据，使用不解码的连接
+        self.rds = get_redis_client(decode_responses=False)
+        self.fingerprinter = spider.crawler.request_fingerprinter
+        self.stats = spider.crawler.stats
+
+    def close_spider(self, spider):
+        if self.rds is not None:
+            self.rds.close()
+
+    def _key(self, request):
+        return HTTP_CACHE_KEY.format(fingerprint=self.fingerprinter.fingerprint(request).hex())
+
+    def retrieve_response(self, spider, request):
+        try:
+            data = self.rds.hgetall(self._key(request))
+        except redis.RedisError as e:
+            logger.warning(f"响应缓存读取失败: {e}")
+            return None
+        if not data:
+            return None
+
+        body = zlib.decompress(data[b'body'])
+        url = to_unicode(data[b'url'])
+        headers = Headers()
+        for line in data[b'headers'].split(b'\r\n'):
+            if b':' in line:
+                name, value = line.split(b':', 1)
+                headers.appendlist(name.strip(), value.strip())
+        respcls = responsetypes.from_args(headers=headers, url=url, body=body)
+        self.stats.inc_value('httpcache/bytes_saved', len(body))
+        return respcls(url=url, headers=headers, status=int(data[b'status']), body=body)
+
+    def store_response(self, spider, request, response):
+        ttl = int(request.meta.get('cache_ttl', 0))
+        if ttl <= 0:
+            return
+        raw_headers = b'\r\n'.join(
+            name + b': ' + value for name, values in response.headers.items() for value in values
+        )
+        key = self._key(request)
+        try:
+            pipe = self.rds.pipeline()
+            pipe.hset(key, mapping={
+                'status': response.status,
+                'url': response.url,
+                'headers': raw_headers,
+                'body': zlib.compress(response.body),
+            })
+            pipe.expire(key, ttl)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"响应缓存写入失败: {e}")
@@ -0,0 +1,106 @@
+import logging
+import time
+
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+from scrapy.utils.httpobj import urlparse_cached
+
+from scraper.ratelimit import THROTTLE_HTTP_CODES, HostRateLimiter
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineMiddleware:
+    """
+    按爬虫截止时间收紧单个请求的下载超时
+
+    爬虫到达截止时间关闭时，Scrapy 会等待在途请求结束；把每个请求的 download_timeout
+    限制在剩余时间内，保证在途请求不会把爬虫拖过任务超时
+    """
+
+    def process_request(self, request, spider):
+        deadline = getattr(spider, 'deadline', None)
+        if not deadline:
+            return None
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            raise IgnoreRequest('爬虫已到达截止时间')
+        timeout = request.meta.get('download_timeout') or spider.settings.getfloat('DOWNLOAD_TIMEOUT')
+        request.meta['download_timeout'] = min(timeout, remaining)
+        return None
+
+
+class HostRateLimitMiddleware:
+    """
+    站点级全局限速：所有 crawler 进程通过 Redis 共享同一站点（SiteConfig.host）的令牌桶
+
+    站点配置的 delay 作为最小请求间隔（速率上限，不超过全局最大速率）、concurrent 作为桶容量，
+    从上限开始按响应自适应调整速率（见 scraper.ratelimit）。需要排队的请求在进入下载器前延迟，不占用下载槽位。
+    """
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.settings = crawler.settings
+        self.limiter = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('RATE_LIMIT_ENABLED'):
+            raise NotConfigured
+        return cls(crawler)
+
+    def _get_limiter(self, request, spider):
+        if self.limiter is None:
+            from apps.search.redis_utils import get_redis_client
+
+            site_cfg = getattr(spider, 'site_cfg', None) or {}
+            host = site_cfg.get('host') or urlparse_cached(request).hostname or ''
+            delay = float(site_cfg.get('delay', 1.0) or 0)
+            max_rate = self.settings.getfloat('RATE_LIMIT_MAX_RATE', 5.0)
+            if delay > 0:
+                max_rate = min(max_rate, 1 / delay)
+            self.limiter = HostRateLimiter(
+                get_redis_client(), host,
+                start_rate=max_rate,
+                burst=site_cfg.get('concurrent', 4),
+                min_rate=self.settings.getfloat('RATE_LIMIT_MIN_RATE', 0.2),
+                max_rate=max_rate,
+                increase=self.settings.getfloat('RATE_LIMIT_INCREASE', 0.1),
+                decrease_factor=self.settings.getfloat('RATE_LIMIT_DECREASE_FACTOR', 0.5),
+            )
+        return self.limiter
+
+    def process_request(self, request, spider):
+        from twisted.internet import reactor
+        from twisted.internet.task import deferLater
+        from twisted.internet.threads import deferToThread
+
+        limiter = self._get_limiter(request, spider)
+        d = deferToThread(limiter.acquire)
+
+        def _wait(wait):
+            if wait <= 0:
+                return None
+            deadline = getattr(spider, 'deadline', None)
+            if deadline and time.time() + wait >= deadline:
+                spider.crawler.stats.inc_value('deadline/skipped_requests')
+                raise IgnoreRequest('限速排队超过爬虫截止时间')
+            stats = spider.crawler.stats
+            stats.inc_value('ratelimit/delayed_requests')
+            stats.inc_value('ratelimit/delay_seconds', wait)
+            return deferLater(reactor, wait, lambda: None)
+
+        d.addCallback(_wait)
+        return d
+
+    def process_response(self, request, response, spider):
+        # 命中 HTTP 缓存的响应没有访问站点，不参与速率调整
+        if 'cached' in response.flags:
+            return response
+        throttled = response.status in THROTTLE_HTTP_CODES
+        if throttled:
+            spider.crawler.stats.inc_value('ratelimit/throttled_responses')
+            logger.warning(f"站点返回限流响应 {response.status}，降低请求速率: {request.url}")
+        if self.limiter is not None:
+            from twisted.internet.threads import deferToThread
+            deferToThread(self.limiter.feedback, throttled)
+        return response
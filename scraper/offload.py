@@ -0,0 +1,147 @@
+"""
+结果页 / 详情页解析的线程池、进程池执行
+
+解析（lxml、XPath、正则、Base64 解码）默认在 reactor 线程中执行，解析大页面期间同一进程中
+所有站点的下载都会停顿。启用 EXTRACT_WORKERS 后，Spider 把 scraper.spiders.extraction 中的解析函数
+提交到进程内共享的执行池，通过 Deferred 等待结果，reactor 线程继续处理其他站点的下载：
+- EXTRACT_POOL=thread：线程池，lxml 与 re 解析期间大部分时间仍持有 GIL，主要作用是让出 reactor；
+- EXTRACT_POOL=process：进程池（spawn），解析可以利用多个 CPU 核心，代价是响应字节的序列化开销；
+- 背压：在途解析任务（执行中 + 排队）达到 workers * EXTRACT_QUEUE_FACTOR 时，
+  ExtractBackpressureMiddleware 暂缓发出新的下载请求，直到有解析任务完成，
+  下载速度不会超过解析能力，响应不会在内存中无限堆积。
+"""
+import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from scrapy.exceptions import NotConfigured
+from twisted.internet import defer
+from twisted.python.failure import Failure
+
+logger = logging.getLogger(__name__)
+
+EXTRACT_POOL_KINDS = ('thread', 'process')
+# 每个工作线程/进程允许的在途解析任务数（1 个执行中 + 排队）
+EXTRACT_QUEUE_FACTOR = 2
+
+_pool = None
+
+
+class ExtractPool:
+    def __init__(self, kind: str, workers: int):
+        if kind not in EXTRACT_POOL_KINDS:
+            raise ValueError(f"未知的解析池类型: {kind}")
+        self.kind = kind
+        self.workers = workers
+        self.capacity = workers * EXTRACT_QUEUE_FACTOR
+        self.pending = 0
+        self.waiters = deque()
+        if kind == 'process':
+            # fork 会复制 reactor 与 Redis / 数据库连接，子进程使用 spawn 启动
+            self.executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+        else:
+            self.executor = ThreadPoolExecutor(workers, thread_name_prefix='extract')
+
+    def saturated(self) -> bool:
+        return self.pending >= self.capacity
+
+    def run(self, func, *args):
+        """提交解析函数，返回在 reactor 线程中触发的 Deferred"""
+        from twisted.internet import reactor
+
+        d = defer.Deferred()
+        self.pending += 1
+        try:
+            future = self.executor.submit(func, *args)
+        except Exception:
+            self._done()
+            return defer.fail()
+        future.add_done_callback(lambda f: reactor.callFromThread(self._resolve, d, f))
+        return d
+
+    def _resolve(self, d, future):
+        self._done()
+        try:
+            result = future.result()
+        except BaseException as e:
+            d.errback(Failure(e))
+        else:
+            d.callback(result)
+
+    def _done(self):
+        self.pending -= 1
+        # 有空位后放行所有等待的下载请求：放行的请求不一定产生解析任务（被忽略、下载失败、403 等），
+        # 逐个放行可能让剩余请求永远等待；超出的解析任务在执行池中排队，数量不超过爬虫并发数
+        if self.saturated():
+            return
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.called:
+                waiter.callback(None)
+
+    def wait_for_slot(self):
+        """解析池饱和时返回在有空位后触发的 Deferred"""
+        if not self.saturated():
+            return defer.succeed(None)
+        d = defer.Deferred()
+        self.waiters.append(d)
+        return d
+
+    def shutdown(self):
+        # 不取消已提交的任务：仍在使用旧解析池的爬虫可以等到结果
+        self.executor.shutdown(wait=False)
+
+
+def get_extract_pool(kind: str, workers: int):
+    """
+    返回进程内共享的解析池；workers 为 0 时返回 None（在 reactor 线程中解析）
+
+    同一进程中所有站点的 crawler 共用一个解析池，背压按整个进程的解析能力计算；
+    设置变化时（常驻爬虫服务按任务读取 SystemConfig）重建解析池
+    """
+    from twisted.internet import reactor
+
+    global _pool
+    if workers <= 0:
+        return None
+    if _pool is None or (_pool.kind, _pool.workers) != (kind, workers):
+        if _pool is not None:
+            _pool.shutdown()
+        else:
+            # reactor 停止后关闭解析池：进程池的工作进程不会随主进程退出，需要显式关闭
+            reactor.addSystemEventTrigger('after', 'shutdown', shutdown_extract_pool)
+        _pool = ExtractPool(kind, workers)
+        logger.info(f"解析池已创建: {kind} x {workers}")
+    return _pool
+
+
+def shutdown_extract_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
+
+class ExtractBackpressureMiddleware:
+    """
+    解析池背压：解析池饱和时暂缓发出新的下载请求
+
+    请求在进入下载器前等待，不占用下载槽位；命中响应缓存的请求同样需要解析，因此排在 HttpCacheMiddleware 之前
+    """
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if crawler.settings.getint('EXTRACT_WORKERS', 0) <= 0:
+            raise NotConfigured
+        return cls(crawler)
+
+    def process_request(self, request, spider):
+        pool = getattr(spider, 'extract_pool', None)
+        if pool is None or not pool.saturated():
+            return None
+        self.crawler.stats.inc_value('extract/backpressure_waits')
+        return pool.wait_for_slot().addCallback(lambda _: None)
@@ -1,30 +1,340 @@
+import csv
+import io
 import json
 import asyncio
 import logging
-from apps.search.models import ResourceResult, SearchTask
+import time
+import uuid
+import redis
+from apps.search.models import DiskType, Resource, SearchTask, SiteSource, TaskResource
+from apps.search.redis_utils import get_redis_client
+from apps.search.result_events import publish_results
+from apps.search.retention import ensure_result_partitions
+from apps.search.search_index import search_text
 from asgiref.sync import sync_to_async
+from django.db import DatabaseError, InterfaceError, OperationalError, close_old_connections, connection, transaction
+from django.db.models import Case, DateTimeField, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from scrapy.exceptions import DropItem
+from scrapy.utils.defer import deferred_from_coro
+from twisted.internet import task
+
+from scraper.spiders.utils import get_md5
 
 logger = logging.getLogger(__name__)
 
+# 缓冲的结果达到该条数时写库
+RESULT_BATCH_SIZE = 500
+# 缓冲的结果最长等待时间（秒），到时未满一批也写库
+RESULT_FLUSH_INTERVAL = 2.0
+# 写库遇到连接断开、锁超时等临时错误时的重试次数
+RESULT_FLUSH_RETRIES = 3
+# PostgreSQL 下一批超过该条数时使用 COPY 写入
+RESULT_COPY_THRESHOLD = 2000
+
+# 任务内已入库资源的去重集合（规范化链接的 md5，同一任务的所有站点、所有爬虫进程共用）
+RESULT_SEEN_KEY = 'crawl:seen:{task_id}'
+RESULT_SEEN_TTL = 24 * 3600
+
+# COPY 暂存表的列，与 process_item 构建、write_resource_results 补充维度 id、检索词与任务日期后的行字典一致
+_STAGING_COLUMNS = ('task_id', 'url_hash', 'title', 'disk_id', 'url', 'site_id', 'seen_at', 'search_text', 'task_date')
+
+
 class DebugPipeline:
     def process_item(self, item, spider):
         # logger.debug(f"DebugPipeline: {json.dumps(item, ensure_ascii=False, indent=2)}")
         return item
 
+
+def copy_resource_results(rows):
+    """
+    PostgreSQL：COPY 到事务级临时表，再用两条 INSERT ... SELECT ... ON CONFLICT 合并到资源表与关联表
+    （COPY 本身不支持 ON CONFLICT）
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        writer.writerow([row[column] for column in _STAGING_COLUMNS])
+    buf.seek(0)
+    resources, links = Resource._meta.db_table, TaskResource._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "CREATE TEMP TABLE resource_staging (task_id uuid, url_hash varchar(32), title varchar(500), "
+            "disk_id smallint, url text, site_id smallint, seen_at timestamptz, search_text text, task_date date) "
+            "ON COMMIT DROP"
+        )
+        cursor.copy_expert(f"COPY resource_staging ({', '.join(_STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buf)
+        # 同一条 INSERT 不能两次更新同一行，批内相同资源只取最早的一条
+        cursor.execute(
+            f"INSERT INTO {resources} (url_hash, title, disk_id, url, site_id, created_at, last_seen_at, search_text) "
+            f"SELECT DISTINCT ON (url_hash) url_hash, title, disk_id, url, site_id, seen_at, seen_at, search_text "
+            f"FROM resource_staging ORDER BY url_hash, seen_at "
+            f"ON CONFLICT (url_hash) DO UPDATE SET last_seen_at = GREATEST({resources}.last_seen_at, EXCLUDED.last_seen_at)"
+        )
+        cursor.execute(
+            f"INSERT INTO {links} (task_id, resource_id, site_id, created_at, task_date) "
+            f"SELECT s.task_id, r.id, s.site_id, s.seen_at, s.task_date "
+            f"FROM resource_staging s JOIN {resources} r USING (url_hash) "
+            # 不指定冲突列：PostgreSQL 分区表的唯一约束包含分区键 task_date（见迁移 0016）
+            f"ON CONFLICT DO NOTHING"
+        )
+
+
+def upsert_resource_results(rows):
+    """
+    ORM：资源表按 url_hash 插入（已存在时跳过），已有资源的 last_seen_at 只向后更新（与 COPY 路径的 GREATEST 一致，
+    迟到的批次不会把最近被找到的时间改早），再插入任务关联（已存在时跳过）
+    """
+    resources, seen = {}, {}
+    for row in rows:
+        resources.setdefault(row['url_hash'], Resource(
+            url_hash=row['url_hash'], title=row['title'], disk_id=row['disk_id'], url=row['url'],
+            site_id=row['site_id'], last_seen_at=row['seen_at'], search_text=row['search_text'],
+        ))
+        seen[row['url_hash']] = max(seen.get(row['url_hash'], row['seen_at']), row['seen_at'])
+    Resource.objects.bulk_create(list(resources.values()), ignore_conflicts=True)
+    # ignore_conflicts 不回填主键，按 url_hash 查回（分段执行，避开 SQLite 的参数个数限制）
+    hashes = list(resources)
+    ids = {}
+    for i in range(0, len(hashes), 500):
+        chunk = hashes[i:i + 500]
+        Resource.objects.filter(url_hash__in=chunk).update(last_seen_at=Greatest('last_seen_at', Case(
+            *[When(url_hash=h, then=Value(seen[h])) for h in chunk], output_field=DateTimeField(),
+        )))
+        ids.update(Resource.objects.filter(url_hash__in=chunk).values_list('url_hash', 'id'))
+    TaskResource.objects.bulk_create([
+        TaskResource(task_id=row['task_id'], resource_id=ids[row['url_hash']], site_id=row['site_id'],
+                     created_at=row['seen_at'], task_date=row['task_date'])
+        for row in rows
+    ], ignore_conflicts=True)
+
+
+def resolve_dimensions(rows):
+    """为每行补充网盘类型、站点的维度 id（进程内缓存，新名称插入维度表）"""
+    for row in rows:
+        row['disk_id'] = DiskType.id_for(row['disk_type'])
+        row['site_id'] = SiteSource.id_for(row['site_source'])
+
+
+def resolve_task_dates(rows):
+    """为每行补充任务日期（爬取任务的创建日期，结果表的分区键），任务不存在时取发现日期"""
+    task_ids = {uuid.UUID(str(row['task_id'])) for row in rows if 'task_date' not in row}
+    if not task_ids:
+        return
+    dates = {task_id: created_at.date() for task_id, created_at in
+             SearchTask.objects.filter(task_id__in=task_ids).values_list('task_id', 'created_at')}
+    for row in rows:
+        if 'task_date' not in row:
+            row['task_date'] = dates.get(uuid.UUID(str(row['task_id']))) or row['seen_at'].date()
+
+
+def write_resource_results(rows, copy_threshold=RESULT_COPY_THRESHOLD):
+    """一个事务写入一批结果：大批量且为 PostgreSQL 时使用 COPY，否则 bulk_create"""
+    # 维度在写入结果的事务之外插入：结果回滚时缓存中的维度 id 仍然有效
+    resolve_dimensions(rows)
+    resolve_task_dates(rows)
+    # 分区同样在事务之外创建：创建分区会锁住整张结果表直到事务结束
+    ensure_result_partitions({row['task_date'] for row in rows})
+    for row in rows:
+        row['search_text'] = search_text(row['title'], row['url'])
+    with transaction.atomic():
+        if connection.vendor == 'postgresql' and len(rows) >= copy_threshold:
+            copy_resource_results(rows)
+        else:
+            upsert_resource_results(rows)
+
+
+def claim_resource_keys(rows):
+    """
+    把一批结果的 url_hash 加入所属任务的去重集合，返回首次出现的行（其他站点已写入的资源被过滤）
+
+    Redis 不可用时不去重，全部返回（写库时由关联表的唯一约束兜底）
+    """
+    if not rows:
+        return rows
+    try:
+        rds = get_redis_client()
+        try:
+            pipe = rds.pipeline(transaction=False)
+            for row in rows:
+                pipe.sadd(RESULT_SEEN_KEY.format(task_id=row['task_id']), row['url_hash'])
+            for task_id in {row['task_id'] for row in rows}:
+                pipe.expire(RESULT_SEEN_KEY.format(task_id=task_id), RESULT_SEEN_TTL)
+            added = pipe.execute()[:len(rows)]
+        finally:
+            rds.close()
+    except redis.RedisError as e:
+        logger.warning(f"结果去重集合写入失败，本批不去重: {e}")
+        return rows
+    return [row for row, new in zip(rows, added) if new]
+
+
+def release_resource_keys(rows):
+    """写库失败时从去重集合中移除这批结果，其他站点找到相同资源时仍可写入"""
+    if not rows:
+        return
+    try:
+        rds = get_redis_client()
+        try:
+            pipe = rds.pipeline(transaction=False)
+            for row in rows:
+                pipe.srem(RESULT_SEEN_KEY.format(task_id=row['task_id']), row['url_hash'])
+            pipe.execute()
+        finally:
+            rds.close()
+    except redis.RedisError as e:
+        logger.warning(f"结果去重集合清理失败: {e}")
+
+
 class DjangoPipeline:
+    """
+    结果批量写库
+
+    资源写入全局资源表 Resource（按规范化链接唯一），任务与资源的关联写入 TaskResource，冲突时 ON CONFLICT 合并；
+    网盘类型与站点名称写库时换成维度表（DiskType / SiteSource）的 smallint id。
+    item 先进入内存缓冲区，缓冲区达到 RESULT_BATCH_SIZE 条、距上次写库超过 RESULT_FLUSH_INTERVAL 秒
+    或爬虫关闭时，一个事务批量写入（bulk_create / COPY）。同一时间只有一批在写，缓冲区满时 process_item
+    等待当前写库完成，缓冲区不会无限增长。
+    写库前按 resource_key（规范化链接的 md5）在 Redis 中做任务级去重：同一资源被多个站点找到时只写入一次。
+    写库遇到临时错误（连接断开等）时重连重试；数据错误时逐条写入，跳过出错的行；其他异常丢弃整批。
+    写入失败的行从去重集合中移除，其他站点找到相同资源时仍可写入；task_id 不是合法 UUID 的 item 直接丢弃。
+    写库次数、条数、重试与失败数记录在爬虫 stats 中（pipeline/*）。
+    每批写入成功的结果推送到任务的结果事件流（apps.search.result_events），结果页实时追加。
+    """
+
+    def __init__(self, stats, batch_size=RESULT_BATCH_SIZE, flush_interval=RESULT_FLUSH_INTERVAL,
+                 max_retries=RESULT_FLUSH_RETRIES, copy_threshold=RESULT_COPY_THRESHOLD):
+        self.stats = stats
+        self.batch_size = max(batch_size, 1)
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.copy_threshold = copy_threshold
+        self.buffer = []
+        self.lock = None
+        self.ticker = None
+        self.last_flush = time.monotonic()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            crawler.stats,
+            batch_size=settings.getint('RESULT_BATCH_SIZE', RESULT_BATCH_SIZE),
+            flush_interval=settings.getfloat('RESULT_FLUSH_INTERVAL', RESULT_FLUSH_INTERVAL),
+            max_retries=settings.getint('RESULT_FLUSH_RETRIES', RESULT_FLUSH_RETRIES),
+            copy_threshold=settings.getint('RESULT_COPY_THRESHOLD', RESULT_COPY_THRESHOLD),
+        )
+
+    def open_spider(self, spider):
+        self.lock = asyncio.Lock()
+        self.last_flush = time.monotonic()
+        if self.flush_interval > 0:
+            self.ticker = task.LoopingCall(self._flush_if_due)
+            self.ticker.start(self.flush_interval, now=False)
+
     async def process_item(self, item, spider):
-        # 使用sync_to_async将同步的数据库操作包装为异步操作
+        task_id = item.get('task_id') or spider.task_id
         try:
-            # 存入资源，处理字段映射关系
-            create_resource = sync_to_async(ResourceResult.objects.create)
-            await create_resource(
-                task_id=spider.task_id,
-                title=item['title'],
-                disk_type=item['disk_type'],
-                url=item['resource_url'],  # 修正：使用resource_url代替url
-                site_source=item['site_name']  # 修正：使用site_name代替site_source
-            )
-            return item
-        except Exception as e:
-            logger.error(f"DjangoPipeline错误: {e}", exc_info=True)
-            return item
\ No newline at end of file
+            uuid.UUID(str(task_id))
+        except ValueError:
+            self.stats.inc_value('pipeline/invalid_items')
+            raise DropItem(f"task_id 不是合法的 UUID: {task_id!r}")
+        # 存入资源，处理字段映射关系
+        self.buffer.append({
+            'task_id': task_id,
+            'url_hash': item.get('resource_key') or get_md5(item['resource_url']),
+            'title': item['title'][:500],
+            'disk_type': item['disk_type'],
+            'url': item['resource_url'],  # 修正：使用resource_url代替url
+            'site_source': item['site_name'],  # 修正：使用site_name代替site_source
+            'seen_at': timezone.now(),
+        })
+        if len(self.buffer) >= self.batch_size:
+            await self.flush()
+        return item
+
+    def _flush_if_due(self):
+        # 异常不能传给 LoopingCall，否则定时写库在本次爬取中停止
+        if self.buffer and not self.lock.locked() and time.monotonic() - self.last_flush >= self.flush_interval:
+            d = deferred_from_coro(self.flush())
+            d.addErrback(lambda failure: logger.error(f"DjangoPipeline定时写库出错: {failure.getErrorMessage()}"))
+            return d
+
+    async def flush(self):
+        async with self.lock:
+            if not self.buffer:
+                return
+            rows, self.buffer = self.buffer, []
+            self.last_flush = time.monotonic()
+            started = time.monotonic()
+            try:
+                result = await sync_to_async(self.write_rows)(rows)
+            except Exception as e:
+                # write_rows 已处理写库异常，这里只兜底去重集合等其他步骤的异常
+                logger.error(f"DjangoPipeline写库出错，丢弃 {len(rows)} 条结果: {e}", exc_info=True)
+                result = {'flush_errors': 1, 'rows_failed': len(rows)}
+            self.stats.inc_value('pipeline/flushes')
+            self.stats.inc_value('pipeline/db_seconds', time.monotonic() - started)
+            for key, value in result.items():
+                if value:
+                    self.stats.inc_value(f'pipeline/{key}', value)
+
+    def write_rows(self, rows):
+        """在写库线程中执行，返回 {'rows_written', 'rows_duplicate', 'retries', 'rows_failed', 'flush_errors'}"""
+        result = {'rows_written': 0, 'rows_duplicate': 0, 'retries': 0, 'rows_failed': 0, 'flush_errors': 0}
+        fresh = claim_resource_keys(rows)
+        result['rows_duplicate'] = len(rows) - len(fresh)
+        if not fresh:
+            return result
+        rows = fresh
+        for attempt in range(self.max_retries + 1):
+            try:
+                write_resource_results(rows, self.copy_threshold)
+                written, failed = rows, []
+                break
+            except (OperationalError, InterfaceError) as e:
+                # 连接断开、锁等待超时等临时错误：关闭连接后重试（下次查询自动重连）
+                if attempt == self.max_retries:
+                    logger.error(f"DjangoPipeline写库失败，丢弃 {len(rows)} 条结果: {e}", exc_info=True)
+                    written, failed = [], rows
+                    break
+                result['retries'] += 1
+                logger.warning(f"DjangoPipeline写库失败，第 {attempt + 1} 次重试: {e}")
+                connection.close()
+                time.sleep(min(0.5 * 2 ** attempt, 5))
+            except DatabaseError as e:
+                # 数据错误（超长字段等）整批回滚，逐条写入跳过出错的行
+                logger.warning(f"DjangoPipeline批量写入失败，改为逐条写入: {e}")
+                result['flush_errors'] = 1
+                written, failed = [], []
+                for row in rows:
+                    try:
+                        write_resource_results([row])
+                        written.append(row)
+                    except Exception as row_error:
+                        logger.error(f"DjangoPipeline错误: {row_error}, url={row['url']}")
+                        failed.append(row)
+                break
+            except Exception as e:
+                # 其他异常（数据校验等）不会因重试而成功，丢弃整批
+                logger.error(f"DjangoPipeline写库出错，丢弃 {len(rows)} 条结果: {e}", exc_info=True)
+                written, failed = [], rows
+                break
+        if failed:
+            result['flush_errors'] = 1
+            release_resource_keys(failed)
+        result['rows_written'] = len(written)
+        result['rows_failed'] = len(failed)
+        publish_results(written)
+        return result
+
+    async def _close(self):
+        if self.ticker is not None and self.ticker.running:
+            self.ticker.stop()
+        await self.flush()
+        # 常驻爬虫服务中进程会长期存活，爬虫结束时释放写库线程上的过期连接
+        await sync_to_async(close_old_connections)()
+
+    def close_spider(self, spider):
+        return deferred_from_coro(self._close())
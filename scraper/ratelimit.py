@@ -0,0 +1,103 @@
+"""
+跨进程共享的站点限速器
+
+同一站点可能同时被多个关键词任务（多个子进程、常驻服务的多个 crawler）爬取，
+各 crawler 自己的 DOWNLOAD_DELAY 互不知情，合起来的请求速率很容易触发 403/429。
+
+限速状态以令牌桶的形式保存在 Redis（按 SiteConfig.host 分 key），所有 crawler 共用：
+- 每个请求从桶中预约一个令牌，令牌不足时返回需要等待的秒数（排队，不丢弃请求）；
+- 速率按 AIMD 自适应：收到 403/429/503 时乘性下降，正常响应时加性回升，
+  在不被封禁的前提下逼近站点能承受的最大吞吐，但不超过速率上限（站点配置的 delay 对应的速率）。
+"""
+import logging
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_KEY = 'crawl:ratelimit:{host}'
+# 一段时间没有请求的站点，限速状态自动过期，下次重新从站点配置的初始速率开始
+RATE_LIMIT_TTL = 3600
+# 视为站点限流信号的响应码
+THROTTLE_HTTP_CODES = (403, 429, 503)
+
+# KEYS[1]=限速 key；ARGV: 初始速率, 桶容量, TTL, 最大速率
+# 返回需要等待的秒数（字符串，Lua 数字返回值会被截断为整数）；已保存的速率超过最大速率（站点配置变更）时按最大速率
+_ACQUIRE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local burst = tonumber(ARGV[2])
+local rate = math.min(tonumber(ARGV[4]), tonumber(redis.call('HGET', KEYS[1], 'rate') or ARGV[1]))
+local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens') or burst)
+local ts = tonumber(redis.call('HGET', KEYS[1], 'ts') or now)
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate) - 1
+redis.call('HSET', KEYS[1], 'rate', rate, 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+if tokens >= 0 then
+    return '0'
+end
+return tostring(-tokens / rate)
+"""
+
+# KEYS[1]=限速 key；ARGV: throttled(1/0), 初始速率, 最小速率, 最大速率, 加性步长, 乘性因子, TTL
+# 返回调整后的速率
+# - 限流响应：乘性下降；同一波限流响应只降速一次（距上次降速不足一个请求间隔、至少 1 秒时忽略），
+#   并清空桶内剩余令牌（保留已预约的排队），后续请求按新速率排队
+# - 正常响应：每个响应增加 step/rate，折合每秒约增加 step 个请求/秒
+_FEEDBACK_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local rate = tonumber(redis.call('HGET', KEYS[1], 'rate') or ARGV[2])
+local min_rate = tonumber(ARGV[3])
+local max_rate = tonumber(ARGV[4])
+if ARGV[1] == '1' then
+    local last_cut = tonumber(redis.call('HGET', KEYS[1], 'cut_at') or 0)
+    if now - last_cut >= math.max(1, 1 / rate) then
+        rate = math.max(min_rate, rate * tonumber(ARGV[6]))
+        local tokens = math.min(0, tonumber(redis.call('HGET', KEYS[1], 'tokens') or 0))
+        redis.call('HSET', KEYS[1], 'rate', rate, 'cut_at', now, 'tokens', tokens, 'ts', now)
+    end
+else
+    rate = math.min(max_rate, rate + tonumber(ARGV[5]) / rate)
+    redis.call('HSET', KEYS[1], 'rate', rate)
+end
+redis.call('EXPIRE', KEYS[1], ARGV[7])
+return tostring(rate)
+"""
+
+
+class HostRateLimiter:
+    """基于 Redis 的单站点令牌桶 + AIMD 速率控制"""
+
+    def __init__(self, rds, host, start_rate, burst=1, min_rate=0.2, max_rate=5.0,
+                 increase=0.1, decrease_factor=0.5):
+        self.rds = rds
+        self.key = RATE_LIMIT_KEY.format(host=host)
+        # 站点的速率上限可能低于全局最小速率（delay 很大的站点），以上限为准
+        self.max_rate = max_rate
+        self.min_rate = min(min_rate, max_rate)
+        self.start_rate = min(max(start_rate, self.min_rate), self.max_rate)
+        self.burst = max(int(burst), 1)
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self._acquire = rds.register_script(_ACQUIRE_SCRIPT)
+        self._feedback = rds.register_script(_FEEDBACK_SCRIPT)
+
+    def acquire(self) -> float:
+        """预约一个请求令牌，返回需要等待的秒数；Redis 不可用时不限速"""
+        try:
+            return float(self._acquire(keys=[self.key], args=[self.start_rate, self.burst, RATE_LIMIT_TTL, self.max_rate]))
+        except redis.RedisError as e:
+            logger.warning(f"站点限速器不可用，跳过限速: key={self.key}, error={e}")
+            return 0.0
+
+    def feedback(self, throttled: bool):
+        """根据响应结果调整速率，返回调整后的速率"""
+        try:
+            return float(self._feedback(keys=[self.key], args=[
+                1 if throttled else 0, self.start_rate, self.min_rate, self.max_rate,
+                self.increase, self.decrease_factor, RATE_LIMIT_TTL,
+            ]))
+        except redis.RedisError as e:
+            logger.warning(f"站点限速器反馈失败: key={self.key}, error={e}")
+            return None
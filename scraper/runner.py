@@ -0,0 +1,249 @@
+"""
+Scrapy 爬取执行器
+crawl_task 子进程模式（python -m scraper.runner）与常驻爬虫服务（scraper.daemon）共用同一套
+站点加载、Settings 构建与 Spider 调度逻辑，保证两种模式的行为一致。
+"""
+import json
+import os
+import sys
+import time
+
+from scrapy import signals
+from scrapy.utils.project import get_project_settings
+
+# 截止时间前预留给进程启动/退出与结果落库的时间
+SHUTDOWN_GRACE_SECONDS = 15
+# Spider 在截止时间前这么多秒停止调度新请求，留给在途请求完成
+DEADLINE_MARGIN_SECONDS = 10
+# 子进程模式下每个站点结束时输出到 stdout 的报告行前缀
+SITE_REPORT_PREFIX = 'CRAWL_SITE_REPORT '
+
+
+def ensure_django():
+    """独立进程入口需要先初始化 Django，才能访问 SiteConfig 与 DjangoPipeline"""
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        if base_dir not in sys.path:
+            sys.path.append(base_dir)
+        os.environ.setdefault("DJANGO_SETTINGS_MODULE", "scraper.settings")
+        django.setup()
+
+
+def load_site_configs(site_keys=None) -> dict:
+    """
+    从数据库读取启用的站点配置
+
+    Args:
+        site_keys: 仅加载指定 key 的站点（None 表示全部启用站点）
+
+    Returns:
+        {site_key: site_cfg} 字典
+    """
+    from apps.search.models import SiteConfig
+
+    qs = SiteConfig.objects.filter(enabled=True).order_by('key')
+    if site_keys:
+        qs = qs.filter(key__in=list(site_keys))
+
+    sites = {}
+    for s in qs:
+        cfg = dict(s.config or {})
+        cfg.setdefault('name', s.name)
+        cfg.setdefault('key', s.key)
+        if s.host:
+            cfg.setdefault('host', s.host)
+        sites[s.key] = cfg
+    return sites
+
+
+def build_crawl_settings():
+    """构建 Celery 爬取使用的 Scrapy Settings"""
+    settings = get_project_settings()
+    settings.set('ITEM_PIPELINES', {
+        'scraper.pipelines.DebugPipeline': 200,
+        'scraper.pipelines.DjangoPipeline': 300,
+    })
+    settings.set('DOWNLOADER_MIDDLEWARES', {
+        # 解析池饱和时暂缓下载（仅启用 EXTRACT_WORKERS 时生效），命中缓存的响应同样需要解析
+        'scraper.offload.ExtractBackpressureMiddleware': 330,
+        # 响应缓存（默认 900）提前到限速与截止时间检查之前：命中缓存的请求不排队、不受截止时间影响
+        'scrapy.downloadermiddlewares.httpcache.HttpCacheMiddleware': 340,
+        # 先按站点全局限速排队，排队结束后再检查截止时间
+        'scraper.middlewares.HostRateLimitMiddleware': 355,
+        # 排在 DownloadTimeoutMiddleware(350) 之后，在其设置的超时基础上按截止时间收紧
+        'scraper.middlewares.DeadlineMiddleware': 360,
+    })
+    # 禁用 Scrapy 的原生日志输出，统一使用 Django 的日志系统
+    settings.set('LOG_ENABLED', False)
+    settings.set('FEED_EXPORT_ENCODING', 'utf-8')
+    settings.set('HTTPCACHE_STORAGE', 'scraper.httpcache.RedisCacheStorage')
+    settings.set('HTTPCACHE_POLICY', 'scraper.httpcache.SiteTTLPolicy')
+    return settings
+
+
+def load_crawl_settings() -> dict:
+    """
+    从 SystemConfig 读取按任务生效的 Scrapy 设置（需在 reactor 线程之外调用）
+
+    Returns:
+        {setting_name: value}，由 schedule_crawl 应用到每个 crawler
+    """
+    from apps.search.config_utils import (
+        get_extract_pool_config, get_http_cache_ttls, get_rate_limit_config, get_workflow_cache_ttl
+    )
+
+    rate_limit = get_rate_limit_config()
+    cache_ttls = get_http_cache_ttls()
+    extract_pool = get_extract_pool_config()
+    return {
+        'HTTPCACHE_ENABLED': any(cache_ttls.values()),
+        'HTTPCACHE_TTLS': cache_ttls,
+        'WORKFLOW_CACHE_TTL': get_workflow_cache_ttl(),
+        'EXTRACT_WORKERS': extract_pool['workers'],
+        'EXTRACT_POOL': extract_pool['pool'],
+        'RATE_LIMIT_ENABLED': rate_limit['enabled'],
+        'RATE_LIMIT_MIN_RATE': rate_limit['min_rate'],
+        'RATE_LIMIT_MAX_RATE': rate_limit['max_rate'],
+        'RATE_LIMIT_INCREASE': rate_limit['increase'],
+        'RATE_LIMIT_DECREASE_FACTOR': rate_limit['decrease_factor'],
+    }
+
+
+def site_crawl_settings(site_cfg: dict, crawl_settings: dict) -> dict:
+    """站点级 Scrapy 设置：sites.yaml 中的 concurrent / delay"""
+    concurrent = site_cfg.get('concurrent', 4)
+    settings = {
+        # 每个 crawler 只爬一个站点：总并发与站点并发一致，请求不会堆积在下载槽位队列中
+        # （排队请求的下载超时在进入队列时就已按截止时间计算，堆积会拖过截止时间）
+        'CONCURRENT_REQUESTS': concurrent,
+        'CONCURRENT_REQUESTS_PER_DOMAIN': concurrent,
+        'DOWNLOAD_DELAY': site_cfg.get('delay', 1.0),
+    }
+    if crawl_settings.get('RATE_LIMIT_ENABLED'):
+        # 启用全局限速时 delay 作为共享令牌桶的最小间隔（速率上限），crawler 自身不再额外延迟
+        settings['DOWNLOAD_DELAY'] = 0
+    return settings
+
+
+def compute_deadline(timeout_seconds, started_at=None) -> float:
+    """根据任务超时时间计算爬虫截止时间（时间戳），预留进程退出与落库的宽限"""
+    started_at = started_at or time.time()
+    grace = min(SHUTDOWN_GRACE_SECONDS, timeout_seconds / 4)
+    return started_at + timeout_seconds - grace
+
+
+def schedule_crawl(runner, jobs, sites: dict, deadline=None, report=None, on_site_closed=None,
+                   crawl_settings=None):
+    """
+    在 runner（CrawlerProcess / CrawlerRunner）上为每个站点调度一个 UniversalSpider
+
+    Args:
+        jobs: [(task_id, keyword), ...]，同一批次的多个关键词任务共用每个站点的 Spider
+        crawl_settings: load_crawl_settings() 的结果，与站点级设置一起应用到每个 crawler
+        deadline: 截止时间戳；到达前 DEADLINE_MARGIN_SECONDS 秒 Spider 停止调度新请求，
+            在途请求的下载超时收紧到截止时间，到达时通过 CLOSESPIDER_TIMEOUT 正常关闭爬虫
+        report: 站点完成情况字典，每个站点结束时写入 {site_key: {...}}
+        on_site_closed: 站点结束回调 (site_key, site_report)
+
+    Returns:
+        [(site_key, crawler, deferred), ...]
+    """
+    from scraper.spiders.universal import UniversalSpider
+
+    report = {} if report is None else report
+    crawl_settings = crawl_settings or {}
+    scheduled = []
+    jobs = [(str(task_id), str(keyword)) for task_id, keyword in jobs]
+    for site_key, site_cfg in sites.items():
+        crawler = runner.create_crawler(UniversalSpider)
+        for name, value in dict(crawl_settings, **site_crawl_settings(site_cfg, crawl_settings)).items():
+            crawler.settings.set(name, value, priority='spider')
+
+        if deadline:
+            remaining = max(deadline - time.time(), 1)
+            crawler.settings.set('CLOSESPIDER_TIMEOUT', remaining, priority='spider')
+            crawler.settings.set('CRAWL_DEADLINE_MARGIN', min(DEADLINE_MARGIN_SECONDS, remaining / 4), priority='spider')
+
+        crawler.signals.connect(
+            _make_site_closed_handler(site_key, crawler, jobs, report, on_site_closed),
+            signal=signals.spider_closed,
+            weak=False,
+        )
+        d = runner.crawl(crawler, site_cfg=dict(site_cfg), jobs=jobs, deadline=deadline)
+        scheduled.append((site_key, crawler, d))
+    return scheduled
+
+
+def _make_site_closed_handler(site_key, crawler, jobs, report, on_site_closed):
+    def _closed(spider, reason):
+        stats = crawler.stats
+        skipped = stats.get_value('deadline/skipped_requests', 0) if stats else 0
+        site_report = {
+            'name': spider.site_cfg.get('name'),
+            'reason': reason,
+            # 只有自然结束且没有因截止时间放弃请求的站点才算完整完成
+            'complete': reason == 'finished' and not skipped,
+            'items': stats.get_value('item_scraped_count', 0) if stats else 0,
+            'skipped_requests': skipped,
+            'cache_hits': stats.get_value('httpcache/hit', 0) if stats else 0,
+            'cache_misses': stats.get_value('httpcache/miss', 0) if stats else 0,
+            'cache_bytes_saved': stats.get_value('httpcache/bytes_saved', 0) if stats else 0,
+        }
+        detail_pages = stats.get_value('extract/pages', 0) if stats else 0
+        if detail_pages:
+            # 详情页平均扫描字节数（配置 detail_rules.link_container 后只扫描链接区域）
+            site_report['scanned_bytes_per_page'] = stats.get_value('extract/bytes_scanned', 0) // detail_pages
+        if len(jobs) > 1:
+            # 批量爬取时按任务拆分结果数，供各任务单独收尾
+            site_report['task_items'] = {
+                task_id: stats.get_value(f'batch/items/{task_id}', 0) if stats else 0 for task_id, _ in jobs
+            }
+        report[site_key] = site_report
+        if on_site_closed:
+            on_site_closed(site_key, site_report)
+    return _closed
+
+
+def parse_site_reports(output: str) -> dict:
+    """从子进程 stdout 中解析各站点的完成报告"""
+    report = {}
+    for line in (output or '').splitlines():
+        if not line.startswith(SITE_REPORT_PREFIX):
+            continue
+        try:
+            data = json.loads(line[len(SITE_REPORT_PREFIX):])
+        except ValueError:
+            continue
+        report[data.pop('site_key')] = data
+    return report
+
+
+def _print_site_report(site_key, site_report):
+    # 子进程被超时终止时，已结束站点的报告仍可从 stdout 中恢复
+    print(SITE_REPORT_PREFIX + json.dumps(dict(site_report, site_key=site_key), ensure_ascii=False), flush=True)
+
+
+def main():
+    ensure_django()
+
+    from scrapy.crawler import CrawlerProcess
+
+    # CRAWL_JOBS 为批量任务 [[task_id, keyword], ...]；单个任务也可以只传 CRAWL_TASK_ID / CRAWL_KEYWORD
+    jobs = json.loads(os.environ.get("CRAWL_JOBS") or 'null') or [
+        (os.environ.get("CRAWL_TASK_ID"), os.environ.get("CRAWL_KEYWORD")),
+    ]
+    site_keys = [k for k in (os.environ.get("CRAWL_SITE_KEYS") or '').split(',') if k]
+    deadline = float(os.environ.get("CRAWL_DEADLINE") or 0) or None
+
+    sites = load_site_configs(site_keys or None)
+    crawl_settings = load_crawl_settings()
+    process = CrawlerProcess(build_crawl_settings())
+    schedule_crawl(process, jobs, sites, deadline=deadline, on_site_closed=_print_site_report,
+                   crawl_settings=crawl_settings)
+    process.start(stop_after_crawl=True)
+
+
+if __name__ == "__main__":
+    main()
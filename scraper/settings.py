@@ -70,6 +70,14 @@ CELERY_ACCEPT_CONTENT = ['application/json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'Asia/Shanghai'
+# 定时任务（需要同时启动 celery beat）
+CELERY_BEAT_SCHEDULE = {
+    # 清理过期任务与结果，补齐结果表的按天分区
+    'purge-expired-results': {
+        'task': 'apps.search.tasks.purge_expired_results_task',
+        'schedule': 3600.0,
+    },
+}
 
 # 缓存配置
 # 优先使用Redis，如果没有配置则使用本地内存缓存
@@ -0,0 +1,169 @@
+"""
+结果页与详情页的解析提取
+
+UniversalSpider 中 CPU 密集的部分（lxml 解析、XPath、正则与 Base64 解码、标题清洗与关键词过滤）
+集中在这里的纯函数中：参数与返回值都是可序列化的普通数据（响应字节、站点配置），
+既可以在 reactor 线程中直接调用，也可以交给线程池/进程池执行（见 scraper.offload），两种方式走同一套逻辑。
+"""
+import html
+import json
+import re
+
+from parsel import Selector
+
+from .utils import B64Budget, KeywordMatcher, extract_classified_links, extract_json_links
+
+
+def get_json_value(obj, path):
+    if not path: return None
+    try:
+        for key in path.split('.'):
+            if isinstance(obj, dict):
+                obj = obj.get(key)
+            elif isinstance(obj, list) and key.isdigit():
+                obj = obj[int(key)]
+            else:
+                return None
+        return obj
+    except:
+        return None
+
+
+def decode_body(body: bytes, encoding: str) -> str:
+    return body.decode(encoding or 'utf-8', 'replace')
+
+
+def load_json_body(body: bytes, encoding: str):
+    # 直接从响应字节解析（json 自动识别 UTF-8/16/32），其他编码或带 BOM 的响应按解码后的文本解析
+    try:
+        return json.loads(body)
+    except ValueError:
+        return json.loads(decode_body(body, encoding).lstrip('﻿'))
+
+
+def clean_title(title) -> str:
+    # 去掉标题中的 HTML 标签与实体
+    return html.unescape(re.sub(r'<[^>]+>', '', str(title or "无标题"))).strip()
+
+
+def match_items(results, keyword):
+    """清洗标题并按关键词过滤：[(title, links), ...] -> [(clean_title, links), ...]"""
+    matcher = KeywordMatcher(keyword)
+    matched = []
+    for title, links in results:
+        title = clean_title(title)
+        if links and matcher.matches(title):
+            matched.append((title, links))
+    return matched
+
+
+def parse_result_page(body: bytes, encoding: str, cfg: dict, keyword: str) -> dict:
+    """
+    解析搜索结果页
+
+    Returns:
+        {'items': [(clean_title, links), ...], 'details': [...]}
+        站点不进入详情页（has_detail: false）时直接提取链接，items 已完成标题清洗与关键词过滤；
+        否则 details 为待请求的详情页引用（json 模式为 id，regex_json / html 模式为相对或绝对 URL）
+    """
+    has_detail = cfg.get('has_detail', True)
+    mode = cfg.get('parse_mode', 'html')
+    results, details = [], []
+    # 整个结果页的所有条目共用 Base64 解码名额
+    b64_budget = B64Budget()
+
+    if mode == 'json':
+        items = load_json_body(body, encoding)
+        for key in cfg.get('json_items_path', 'data').split('.'):
+            if isinstance(items, dict): items = items.get(key, [])
+        if not isinstance(items, list): items = [items]
+
+        for item in items:
+            title = get_json_value(item, cfg.get('json_title_path', 'name'))
+            if not title or (keyword and keyword.lower() not in str(title).lower()):
+                continue
+            if not has_detail:
+                # 站点配置了 json_link_paths 时只检查这些路径；否则item中包含url字段时只检查url，没有时遍历整个item
+                paths = cfg.get('json_link_paths')
+                if not paths and isinstance(item, dict) and 'url' in item:
+                    paths = ['url']
+                results.append((title, extract_json_links(item, paths, b64_budget=b64_budget)))
+            else:
+                id_val = item.get('id') or item.get('slug') or item.get('uuid')
+                if id_val:
+                    details.append(id_val)
+
+    elif mode == 'regex_json':
+        match = re.search(cfg['extract_regex'], decode_body(body, encoding))
+        if match:
+            try:
+                data = json.loads(match.group(1).replace('\\/', '/'))
+                for item in data:
+                    if not has_detail:
+                        results.append((item.get(cfg.get('json_title', 'title')),
+                                        extract_json_links(item, cfg.get('json_link_paths'), b64_budget=b64_budget)))
+                    else:
+                        url_val = item.get(cfg.get('json_url', 'url'))
+                        if url_val:
+                            details.append(url_val)
+            except:
+                pass
+
+    else:
+        rules = cfg.get('list_rules', {})
+        selector = Selector(text=decode_body(body, encoding))
+        for node in selector.xpath(rules.get('item_nodes', '')):
+            title = node.xpath(rules.get('title_node', './/text()')).get()
+            if not title: continue
+            if not has_detail:
+                results.append((title, extract_classified_links(node.get(), b64_budget=b64_budget)))
+            else:
+                link = node.xpath(rules.get('detail_link', '')).get()
+                if link:
+                    details.append(link)
+
+    return {'items': match_items(results, keyword), 'details': details}
+
+
+def select(selector, expr):
+    # 选择器表达式默认为 XPath，以 css: 开头时按 CSS 选择器处理
+    return selector.css(expr[4:]) if expr.startswith('css:') else selector.xpath(expr)
+
+
+def parse_detail_page(body: bytes, encoding: str, detail_rules: dict, keyword: str, selector=None) -> dict:
+    """
+    解析详情页
+
+    detail_rules.link_container 选中的节点（去掉 link_exclude 选中的广告、推荐等子节点）序列化后提取，
+    没有配置或没有选中任何节点时（页面结构变化）整页扫描解码后的文本；
+    selector 为已构建的选择器树（可选，在 reactor 线程中调用时复用 Scrapy 响应的选择器）
+
+    Returns:
+        {'items': [(clean_title, links)] 或 [], 'stats': {'pages', 'bytes_scanned', 'container_missed', ...}}
+    """
+    page_text = None
+    if selector is None:
+        page_text = decode_body(body, encoding)
+        selector = Selector(text=page_text)
+    fields = detail_rules.get('fields', {})
+    title = "".join(selector.xpath(fields.get('title', '//title/text()')).getall()).strip()
+
+    stats = {'pages': 1}
+    container = detail_rules.get('link_container')
+    nodes = select(selector, container) if container else None
+    if nodes:
+        exclude = detail_rules.get('link_exclude')
+        if isinstance(exclude, str):
+            exclude = [exclude]
+        for node in nodes:
+            for expr in exclude or ():
+                select(node, expr).drop()
+        text = '\n'.join(nodes.getall())
+        stats['bytes_scanned'] = len(text.encode('utf-8'))
+        links = extract_classified_links(text, stats)
+    else:
+        if container:
+            stats['container_missed'] = 1
+        stats['bytes_scanned'] = len(body)
+        links = extract_classified_links(page_text if page_text is not None else decode_body(body, encoding), stats)
+    return {'items': match_items([(title, links)], keyword), 'stats': stats}
@@ -2,57 +2,121 @@ import scrapy
 from scrapy.crawler import CrawlerProcess
 from scrapy import FormRequest
 from scrapy.exceptions import CloseSpider
+from scrapy.utils.defer import maybe_deferred_to_future
+from twisted.internet.threads import deferToThread
 import yaml
 import urllib.parse
 import json
 import re
-import html
 import os
-from .utils import extract_links, get_browser_headers, get_md5
+import time
+from .extraction import clean_title, get_json_value, parse_detail_page, parse_result_page
+from .utils import OTHER_DISK, KeywordMatcher, canonicalize_link, classify_link, get_browser_headers, get_md5
+from scraper.offload import get_extract_pool
+from scraper.workflowcache import (
+    WORKFLOW_INVALID_HTTP_CODES, invalidate_workflow_cache, load_workflow_cache, save_workflow_cache,
+    workflow_cacheable
+)
 
 
 class UniversalSpider(scrapy.Spider):
     name = "universal_spider"
 
-    def __init__(self, site_cfg, keyword, *args, **kwargs):
+    def __init__(self, site_cfg, keyword=None, deadline=None, jobs=None, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.site_cfg = site_cfg
-        self.keyword = keyword
-        # 从site_cfg中获取task_id
-        self.task_id = site_cfg.get('task_id')
-        self.context = {"host": site_cfg.get('host'), "keyword": keyword}
+        # 截止时间戳：到达前 CRAWL_DEADLINE_MARGIN 秒不再调度新的请求（搜索/详情），
+        # 让爬虫在任务超时前自然结束
+        self.deadline = float(deadline) if deadline else None
+        # 批量爬取：一个 Spider 依次检索多个关键词，jobs 为 [(task_id, keyword), ...]，
+        # 每个 job 有独立的模板上下文，产出的 item 带上所属 task_id
+        if not jobs:
+            jobs = [(site_cfg.get('task_id'), keyword)]
+        # cookies 为工作流响应设置的会话 cookie；workflow_cache 为该 job 使用的工作流缓存原始值；
+        # matcher 为标题关键词过滤器（每个 job 构建一次）
+        self.jobs = [
+            {'task_id': task_id, 'keyword': kw, 'context': {"host": site_cfg.get('host'), "keyword": kw},
+             'cookies': {}, 'workflow_cache': None, 'matcher': KeywordMatcher(kw)}
+            for task_id, kw in jobs
+        ]
+        self.task_id = self.jobs[0]['task_id']
+        self.keyword = self.jobs[0]['keyword']
+        self.context = self.jobs[0]['context']
         self.base_headers = get_browser_headers(site_cfg.get('host'))
 
         # 指纹去重集合与错误统计
         self.seen_resources = set()
         self.error_count = 0
         self.max_errors = 10  # 连续错误熔断阈值
+        self.workflow_cache_saved = False
+        # 解析池（EXTRACT_WORKERS 为 0 时为 None，在 reactor 线程中解析），start() 时按 crawler 设置获取
+        self.extract_pool = None
+
+    def deadline_reached(self):
+        if not self.deadline:
+            return False
+        if time.time() < self.deadline - self.settings.getfloat('CRAWL_DEADLINE_MARGIN', 0):
+            return False
+        stats = self.crawler.stats
+        if not stats.get_value('deadline/skipped_requests'):
+            self.logger.warning(f"⏱️ 接近截止时间，停止调度新请求，站点: {self.site_cfg.get('name')}")
+        stats.inc_value('deadline/skipped_requests')
+        return True
+
+    def cache_meta(self, kind):
+        # 响应缓存时间：全局按请求类型配置（HTTPCACHE_TTLS），站点配置 cache_ttl 可覆盖
+        ttls = dict(self.settings.getdict('HTTPCACHE_TTLS'))
+        ttls.update(self.site_cfg.get('cache_ttl') or {})
+        return {'cache_kind': kind, 'cache_ttl': int(ttls.get(kind) or 0)}
+
+    def workflow_cache_ttl(self):
+        # 工作流变量缓存时间：全局配置（WORKFLOW_CACHE_TTL），站点配置 workflow_cache_ttl 可覆盖
+        if not self.site_cfg.get('key') or not workflow_cacheable(self.site_cfg):
+            return 0
+        ttl = self.site_cfg.get('workflow_cache_ttl')
+        if ttl is None:
+            ttl = self.settings.getint('WORKFLOW_CACHE_TTL', 0)
+        return max(int(ttl), 0)
 
     async def start(self):
+        self.extract_pool = get_extract_pool(self.settings.get('EXTRACT_POOL') or 'thread',
+                                             self.settings.getint('EXTRACT_WORKERS', 0))
+        if self.deadline_reached():
+            return
         workflow = self.site_cfg.get('workflow', [])
-        if workflow:
-            for request in self.run_workflow_step(0):
-                yield request
-        else:
-            for request in self.execute_search():
+        raw, cached = None, None
+        if workflow and self.workflow_cache_ttl():
+            raw, cached = await maybe_deferred_to_future(deferToThread(load_workflow_cache, self.site_cfg['key']))
+            self.crawler.stats.inc_value('workflow/cache_hit' if cached else 'workflow/cache_miss')
+        for job in self.jobs:
+            if workflow and not cached:
+                for request in self.run_workflow_step(0, job):
+                    yield request
+                continue
+            if cached:
+                # 工作流缓存命中：直接带上缓存的变量与 cookie 搜索
+                job['context'].update(cached.get('context') or {})
+                job['cookies'] = dict(cached.get('cookies') or {})
+                job['workflow_cache'] = raw
+            for request in self.execute_search(job):
                 yield request
 
-    def run_workflow_step(self, index):
+    def run_workflow_step(self, index, job):
         step = self.site_cfg['workflow'][index]
-        url = self.render_template(step['url'])
+        url = self.render_template(step['url'], job)
         self.logger.info(f"🔄 工作流步骤 {index + 1}: {url}")
 
-        meta = {'handle_httpstatus_list': [403, 429]}
+        meta = {'handle_httpstatus_list': [403, 429], **self.cache_meta('workflow')}
         yield scrapy.Request(
             url,
             headers=self.base_headers,
             callback=self.parse_workflow,
             meta=meta,
-            cb_kwargs={'step_index': index},
+            cb_kwargs={'step_index': index, 'job': job},
             dont_filter=True
         )
 
-    def parse_workflow(self, response, step_index):
+    def parse_workflow(self, response, step_index, job):
         if response.status in [403, 429]:
             self.logger.warning(f"⚠️ 工作流受限 ({response.status})，站点: {self.site_cfg['name']}")
             return
@@ -65,46 +129,83 @@ class UniversalSpider(scrapy.Spider):
             elif rule.startswith('regex:'):
                 match = re.search(rule[6:], response.text)
                 val = match.group(1) if match else None
-            if val: self.context[var_name] = val
+            if val: job['context'][var_name] = val
+        for header in response.headers.getlist('Set-Cookie'):
+            name, _, value = header.decode('latin-1').split(';', 1)[0].partition('=')
+            if name.strip():
+                job['cookies'][name.strip()] = value.strip()
 
+        if self.deadline_reached():
+            return
         if step_index + 1 < len(self.site_cfg['workflow']):
-            yield from self.run_workflow_step(step_index + 1)
+            yield from self.run_workflow_step(step_index + 1, job)
         else:
-            yield from self.execute_search()
+            self.save_workflow_cache(job)
+            yield from self.execute_search(job)
 
-    def execute_search(self):
+    def save_workflow_cache(self, job):
+        ttl = self.workflow_cache_ttl()
+        if not ttl or self.workflow_cache_saved:
+            return
+        self.workflow_cache_saved = True
+        context = {k: v for k, v in job['context'].items() if k not in ('host', 'keyword')}
+        deferToThread(save_workflow_cache, self.site_cfg['key'], context, job['cookies'], ttl)
+        self.crawler.stats.inc_value('workflow/cache_stored')
+
+    def retry_workflow(self, response, job):
+        # 缓存的 token / cookie 已失效：删除缓存，该 job 重新执行一次工作流
+        self.logger.info(f"♻️ 工作流缓存失效 ({response.status})，重新执行工作流，站点: {self.site_cfg['name']}")
+        self.crawler.stats.inc_value('workflow/cache_invalidated')
+        deferToThread(invalidate_workflow_cache, self.site_cfg['key'], job['workflow_cache'])
+        job['workflow_cache'] = None
+        job['context'] = {"host": self.site_cfg.get('host'), "keyword": job['keyword']}
+        job['cookies'] = {}
+        self.workflow_cache_saved = False
+        if not self.deadline_reached():
+            yield from self.run_workflow_step(0, job)
+
+    def execute_search(self, job):
         cfg = self.site_cfg
-        url = self.render_template(cfg['start_url'])
+        url = self.render_template(cfg['start_url'], job)
         method = cfg.get('method', 'GET').upper()
 
-        meta = {'handle_httpstatus_list': [403, 422, 429]}
+        meta = {'handle_httpstatus_list': [403, 422, 429], **self.cache_meta('search')}
         if cfg.get('handle_redirect'):
             meta['handle_redirect'] = True
 
         headers = self.base_headers.copy()
         if 'headers' in cfg:
             headers.update(cfg['headers'])
+        # 使用工作流缓存时 cookie jar 中没有会话 cookie，随请求带上缓存的 cookie
+        cookies = job['cookies'] if job.get('workflow_cache') else None
 
         if method == 'POST':
             raw_payload = cfg.get('payload', {}).copy()
             processed_payload = {}
             for k, v in raw_payload.items():
-                processed_payload[k] = self.render_template(v) if isinstance(v, str) else v
+                processed_payload[k] = self.render_template(v, job) if isinstance(v, str) else v
 
-            processed_payload[cfg.get('kw_field', 'keyboard')] = self.keyword
+            processed_payload[cfg.get('kw_field', 'keyboard')] = job['keyword']
 
             if headers.get('Content-Type') == 'application/json':
                 yield scrapy.Request(url, method='POST', body=json.dumps(processed_payload),
-                                     headers=headers, callback=self.parse_result, meta=meta)
+                                     headers=headers, cookies=cookies, callback=self.parse_result, meta=meta,
+                                     cb_kwargs={'job': job})
             else:
-                yield FormRequest(url, formdata=processed_payload, headers=headers,
-                                  callback=self.parse_result, meta=meta)
+                yield FormRequest(url, formdata=processed_payload, headers=headers, cookies=cookies,
+                                  callback=self.parse_result, meta=meta,
+                                  cb_kwargs={'job': job})
         else:
-            yield scrapy.Request(url, headers=headers, callback=self.parse_result, meta=meta)
+            yield scrapy.Request(url, headers=headers, cookies=cookies, callback=self.parse_result, meta=meta,
+                                 cb_kwargs={'job': job})
 
-    def parse_result(self, response):
+    async def parse_result(self, response, job):
         cfg = self.site_cfg
-        has_detail = cfg.get('has_detail', True)
+
+        if response.status in WORKFLOW_INVALID_HTTP_CODES and job.get('workflow_cache'):
+            for request in self.retry_workflow(response, job):
+                yield request
+            return
 
         if response.status in [403, 422, 429]:
             self.error_count += 1
@@ -114,154 +215,117 @@ class UniversalSpider(scrapy.Spider):
 
         self.error_count = 0
         mode = cfg.get('parse_mode', 'html')
-        detail_meta = {'handle_httpstatus_list': [403], 'referer_url': response.url}
-
-        if mode == 'json':
-            try:
-                data = json.loads(response.text)
-                items_path = cfg.get('json_items_path', 'data')
-                items = data
-                for key in items_path.split('.'):
-                    if isinstance(items, dict): items = items.get(key, [])
-
-                if not isinstance(items, list): items = [items]
-
-                for item in items:
-                    title = self.get_json_value(item, cfg.get('json_title_path', 'name'))
-                    # DEBUG模式下查看跳过的标题
-                    if not title or (self.keyword and self.keyword.lower() not in str(title).lower()):
-                        self.logger.debug(f"跳过标题: {title}")
-                        continue
-
-                    if not has_detail:
-                        # 首先检查item中是否直接包含url字段
-                        if 'url' in item:
-                            links = item['url']
-                        else:
-                            item_str = json.dumps(item, ensure_ascii=False)
-                            links, disks = extract_links(item_str)
-                            if not links:
-                                continue
-                        # 调用extract_links确保能识别网盘类型并格式化链接
-                        formatted_links, disks = extract_links(links)
-                        if formatted_links:
-                            yield from self.finalize_item_safe(title, formatted_links, response.url, disks)
-                    else:
-                        id_val = item.get('id') or item.get('slug') or item.get('uuid')
-                        if id_val:
-                            detail_url = f"https://{cfg.get('host')}/d/{id_val}"
-                            headers = self.base_headers.copy()
-                            headers['Referer'] = response.url
-                            yield scrapy.Request(detail_url, headers=headers, callback=self.parse_detail,
-                                                 meta=detail_meta, dont_filter=True)
-            except Exception as e:
-                self.logger.error(f"JSON 解析失败: {e}")
-
-        elif mode == 'regex_json':
-            match = re.search(cfg['extract_regex'], response.text)
-            if match:
-                try:
-                    data = json.loads(match.group(1).replace('\\/', '/'))
-                    for item in data:
-                        title = item.get(cfg.get('json_title', 'title'))
-                        if not has_detail:
-                            links, disks = extract_links(json.dumps(item))
-                            yield from self.finalize_item_safe(title, links, response.url, disks)
-                        else:
-                            url_val = item.get(cfg.get('json_url', 'url'))
-                            if url_val:
-                                full_url = response.urljoin(url_val)
-                                yield scrapy.Request(full_url, callback=self.parse_detail, meta=detail_meta,
-                                                     dont_filter=True)
-                except:
-                    pass
-        else:
-            rules = cfg.get('list_rules', {})
-            for node in response.xpath(rules.get('item_nodes', '')):
-                title = node.xpath(rules.get('title_node', './/text()')).get()
-                if not title: continue
-
-                if not has_detail:
-                    links, disks = extract_links(node.get())
-                    if links:
-                        yield from self.finalize_item_safe(title, links, response.url, disks)
-                else:
-                    link = node.xpath(rules.get('detail_link', '')).get()
-                    if link:
-                        full_url = response.urljoin(link)
-                        headers = self.base_headers.copy()
-                        headers['Referer'] = response.url
-                        yield scrapy.Request(full_url, headers=headers, callback=self.parse_detail, meta=detail_meta,
-                                             dont_filter=True)
-
-    def parse_detail(self, response):
+        try:
+            page = await self.extract(parse_result_page, response.body, response.encoding, cfg, job['keyword'])
+        except Exception as e:
+            self.logger.error(f"{'JSON 解析' if mode == 'json' else '结果页解析'}失败: {e}")
+            return
+
+        for title, links in page['items']:
+            for item in self.finalize_item_safe(title, links, response.url, job, checked=True):
+                yield item
+
+        detail_meta = {'handle_httpstatus_list': [403], 'referer_url': response.url, **self.cache_meta('detail')}
+        for ref in page['details']:
+            if self.deadline_reached():
+                continue
+            if mode == 'regex_json':
+                yield scrapy.Request(response.urljoin(ref), callback=self.parse_detail, meta=detail_meta,
+                                     cb_kwargs={'job': job}, dont_filter=True)
+                continue
+            full_url = f"https://{cfg.get('host')}/d/{ref}" if mode == 'json' else response.urljoin(ref)
+            headers = self.base_headers.copy()
+            headers['Referer'] = response.url
+            yield scrapy.Request(full_url, headers=headers, callback=self.parse_detail, meta=detail_meta,
+                                 cb_kwargs={'job': job}, dont_filter=True)
+
+    async def parse_detail(self, response, job):
         if response.status == 403: return
-        fields = self.site_cfg.get('detail_rules', {}).get('fields', {})
-        title_raw = response.xpath(fields.get('title', '//title/text()')).getall()
-        title = "".join(title_raw).strip()
-        links, disks = extract_links(response.text)
-        if links:
-            yield from self.finalize_item_safe(title, links, response.url, disks)
-
-    def finalize_item_safe(self, title, links, source_url, disks=None):
-        # 1. 清洗标题
-        clean_title = html.unescape(re.sub(r'<[^>]+>', '', str(title or "无标题"))).strip()
-
-        # 2. 关键词过滤：如果标题中不包含关键词集合中的任何一个词，则过滤掉
-        keyword_list = re.split(r'[ ,，|;；\t\n]+', self.keyword)
-        keyword_set = {word.lower() for word in keyword_list if word.strip()}
-        if keyword_set:
-            # 检查标题中是否包含关键词集合中的任何一个词（不区分大小写）
-            title_lower = clean_title.lower()
-            if not any(kw in title_lower for kw in keyword_set):
-                return  # 标题中不包含任何关键词，过滤掉
-
-        # 3. 链接清洗并去重（保持为列表）
-        if isinstance(links, str):
-            raw_list = [l.strip() for l in links.split(',') if l.strip()]
+        detail_rules = self.site_cfg.get('detail_rules', {})
+        if self.extract_pool is None:
+            # 在 reactor 线程中解析时复用 Scrapy 已构建的选择器树
+            page = parse_detail_page(response.body, response.encoding, detail_rules, job['keyword'],
+                                     response.selector)
         else:
-            raw_list = [str(l).strip() for l in links if str(l).strip()]
-        
-        unique_links = list(dict.fromkeys(raw_list))
+            page = await self.extract(parse_detail_page, response.body, response.encoding, detail_rules,
+                                      job['keyword'])
+        self.record_extract_stats(page['stats'])
+        for title, links in page['items']:
+            for item in self.finalize_item_safe(title, links, response.url, job, checked=True):
+                yield item
+
+    async def extract(self, func, *args):
+        """执行解析函数：启用解析池（EXTRACT_WORKERS）时提交到线程池/进程池，否则在 reactor 线程中直接执行"""
+        if self.extract_pool is None:
+            return func(*args)
+        self.crawler.stats.inc_value('extract/offloaded')
+        return await maybe_deferred_to_future(self.extract_pool.run(func, *args))
+
+    def record_extract_stats(self, stats):
+        # 详情页数、扫描字节数、Base64 解码数与因上限跳过数记入 stats（extract/*）
+        for key, value in stats.items():
+            if value:
+                self.crawler.stats.inc_value(f'extract/{key}', value)
+
+    def finalize_item_safe(self, title, links, source_url, job=None, checked=False):
+        """
+        links: extract_classified_links 的结果 [(link, disk_type), ...]，沿用提取时识别的网盘类型；
+            也可以是逗号分隔的链接字符串或链接列表，此时逐条调用 classify_link 识别
+        checked: 标题已在解析时清洗并通过关键词过滤（extraction.match_items）
+        """
+        job = job or self.jobs[0]
+        if not checked:
+            # 1. 清洗标题
+            title = clean_title(title)
+
+            # 2. 关键词过滤：如果标题中不包含关键词中的任何一个词（不区分大小写），则过滤掉
+            if not job['matcher'].matches(title):
+                return
+
+        # 3. 链接清洗并去重（保持顺序）
+        if isinstance(links, str):
+            links = links.split(',')
+        classified = {}
+        for entry in links:
+            link, disk = entry if isinstance(entry, tuple) else (entry, None)
+            link = str(link).strip()
+            if link and link not in classified:
+                classified[link] = disk
 
         # 4. 遍历链接，每一条链接 yield 一个独立的 item
-        for link in unique_links:
-            fingerprint = get_md5(link)
+        for link, single_disk in classified.items():
+            if single_disk is None:
+                single_disk = classify_link(link)
+                if single_disk == OTHER_DISK:
+                    single_disk = None
+
+            # 按规范化后的链接去重：同一分享的不同写法（域名大小写、提取码参数、别名域名）只保留一份；
+            # 同一资源在不同关键词任务中各保留一份。跨站点的去重由 DjangoPipeline 按 resource_key 完成
+            link, dedup_key = canonicalize_link(link, single_disk)
+            resource_key = get_md5(dedup_key)
+            fingerprint = (job['task_id'], resource_key)
             if fingerprint in self.seen_resources:
                 continue
             self.seen_resources.add(fingerprint)
 
-            # 重新识别单条链接的网盘类型（如果需要的话）
-            # 这样每一条数据都能准确对应它的网盘类型
-            from .utils import extract_links as re_extract
-            _, single_disk = re_extract(link)
-
-            # self.logger.info(f"✨ 发现资源: {clean_title[:20]}... | 链接: {link[:30]}...")
-            
+            if len(self.jobs) > 1:
+                self.crawler.stats.inc_value(f"batch/items/{job['task_id']}")
             yield {
+                'task_id': job['task_id'],
                 'site_name': str(self.site_cfg.get('name')),
-                'title': clean_title,
+                'title': title,
                 'disk_type': str(single_disk or "未知"),
                 'resource_url': link,  # 现在这里只有一个单独的 URL
+                'resource_key': resource_key,
                 'source_url': str(source_url)
             }
 
     def get_json_value(self, obj, path):
-        if not path: return None
-        try:
-            for key in path.split('.'):
-                if isinstance(obj, dict):
-                    obj = obj.get(key)
-                elif isinstance(obj, list) and key.isdigit():
-                    obj = obj[int(key)]
-                else:
-                    return None
-            return obj
-        except:
-            return None
-
-    def render_template(self, text):
-        for k, v in self.context.items():
+        return get_json_value(obj, path)
+
+    def render_template(self, text, job=None):
+        context = job['context'] if job else self.context
+        for k, v in context.items():
             val = urllib.parse.quote(str(v)) if k == "keyword" else str(v)
             text = text.replace(f"{{{k}}}", val)
         return text
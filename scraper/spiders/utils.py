@@ -1,66 +1,347 @@
 import re
 import random
+import time
 import yaml
 import os
-import base64
+import binascii
 import hashlib
+from urllib.parse import unquote, urlsplit, urlunsplit
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+RULES_PATH = os.path.join(BASE_DIR, 'config', 'rules.yaml')
+# rules.yaml 修改时间的检查间隔（秒），修改后自动重新编译
+RULES_CHECK_INTERVAL = 5
+OTHER_DISK = "其他"
+
+# 匹配标准 URL 及 常见网盘特征
+LINK_PATTERN = r'(https?://[^\s\"\'><]+|magnet:\?xt=urn:btih:[a-zA-Z0-9]+|thunder://[A-Za-z0-9+/=]+|ed2k://[^\s\"\'><]+)'
+LINK_RE = re.compile(LINK_PATTERN)
+# 可能是 Base64 编码链接的片段（针对部分防爬站点）
+B64_RE = re.compile(r'[A-Za-z0-9+/]{40,}=*')
+# 每个响应最多解码的 Base64 片段数（见 B64Budget），以及片段长度上限（更长的通常是内嵌图片等二进制数据）
+MAX_B64_CANDIDATES = 256
+MAX_B64_LENGTH = 16384
+_NON_ASCII_BYTES = bytes(range(0x80, 0x100))
+
+# 小写化后仍能在忽略大小写时匹配 ASCII 字母的字符
+_CASE_FOLD_CHARS = ('\u0131', '\u017f')
+# 分享链接中表示提取码的查询参数（规则未配置 code_params 时使用）
+SHARE_CODE_PARAMS = ('pwd', 'password', 'passcode', 'pass')
+_BTIH_RE = re.compile(r'btih:([a-zA-Z0-9]+)')
 
 _NETDISK_RULES = []
+_RULES_MTIME = None
+_RULES_CHECKED_AT = 0.0
+_CLASSIFIER = None
+
+
+class NetdiskClassifier:
+    """
+    网盘类型识别器：规则集一次编译，按 rules.yaml 中的顺序（优先级）识别链接
+
+    Python 的 re 对多分支交替正则没有前缀优化，合并成一个大正则并不比逐条匹配快。
+    规则可配置 prefilter（匹配的链接必然包含的字符串，如 pan.baidu.com、magnet:?xt=），
+    识别时先用子串检查排除不可能匹配的规则，只对候选规则执行正则，结果与逐条 re.search 一致。
+    """
+
+    def __init__(self, rules):
+        self.rules = []
+        # 链接规范化配置：{name: (pattern, canonical_host, code_params)}
+        self.canonical = {}
+        for rule in rules:
+            pattern = re.compile(rule['pattern'], re.IGNORECASE)
+            self.rules.append((rule['name'], pattern, _prefilter_literals(rule)))
+            code_params = tuple(p.lower() for p in rule.get('code_params') or SHARE_CODE_PARAMS)
+            self.canonical[rule['name']] = (pattern, rule.get('canonical_host'), code_params)
+
+    def classify(self, link: str) -> str:
+        link_lower = link.strip().lower()
+        # 忽略大小写时 ı、ſ 分别匹配 i、s（小写化后只剩这两个特例），包含它们的链接不做字面量预筛
+        prefilter = link_lower.isascii() or not any(ch in link_lower for ch in _CASE_FOLD_CHARS)
+        for name, pattern, literals in self.rules:
+            if prefilter and literals:
+                for literal in literals:
+                    if literal in link_lower:
+                        break
+                else:
+                    continue
+            if pattern.search(link_lower):
+                return name
+        return OTHER_DISK
+
+    def canonicalize(self, link: str, disk: str = None):
+        """
+        规范化分享链接，返回 (canonical_url, dedup_key)
+
+        - http(s) 链接：域名小写、去掉默认端口与末尾的 /、合并重复的 /；网盘链接统一为 https，
+          规则配置了 canonical_host 时同一网盘的多个域名统一为该域名；
+          提取码参数（code_params）只保留第一个非空值并放在最后，dedup_key 不含提取码与协议，
+          同一分享带不同提取码写法、大小写不同的域名都视为同一资源；
+          不含 / 的片段（如 #、#abc）去掉，单页应用的路由片段（#/s/xxx）保留
+        - 磁力链接：btih 哈希按编码统一大小写（40 位十六进制小写，32 位 Base32 大写）
+        - ed2k 链接：按文件大小与哈希去重
+        """
+        link = link.strip()
+        lower = link.lower()
+        if lower.startswith('magnet:'):
+            match = _BTIH_RE.search(link)
+            if not match:
+                return link, link
+            info_hash = match.group(1)
+            info_hash = info_hash.lower() if len(info_hash) == 40 else info_hash.upper()
+            link = link[:match.start(1)] + info_hash + link[match.end(1):]
+            return link, f'btih:{info_hash}'
+        if lower.startswith('ed2k://'):
+            parts = link.split('|')
+            if len(parts) >= 5 and parts[1].lower() == 'file':
+                return link, f'ed2k:{parts[3]}:{parts[4].lower()}'
+            return link, link
+        if not lower.startswith(('http://', 'https://')):
+            return link, link
+
+        try:
+            parts = urlsplit(link)
+            host = (parts.hostname or '').rstrip('.')
+            port = parts.port
+        except ValueError:
+            return link, link
+        pattern, canonical_host, code_params = self.canonical.get(disk, (None, None, SHARE_CODE_PARAMS))
+        scheme = parts.scheme.lower()
+        if pattern is not None:
+            scheme = 'https'
+            # 只有链接本身的域名属于该网盘时才替换域名（跳转链接中的网盘地址不处理）
+            if canonical_host and pattern.search(host + '/'):
+                host, port = canonical_host, None
+        if port and port != {'http': 80, 'https': 443}.get(scheme):
+            host = f'{host}:{port}'
+
+        path = re.sub(r'/{2,}', '/', parts.path).rstrip('/') or '/'
+        query, code = [], None
+        for piece in parts.query.split('&'):
+            if not piece:
+                continue
+            name, _, value = piece.partition('=')
+            if unquote(name).lower() in code_params:
+                value = unquote(value).strip()
+                if value and code is None:
+                    code = (name, value)
+                continue
+            query.append(piece)
+        fragment = parts.fragment if '/' in parts.fragment else ''
+
+        key = urlunsplit(('', host, path, '&'.join(query), fragment)).lstrip('/')
+        if code:
+            query.append(f'{code[0]}={code[1]}')
+        return urlunsplit((scheme, host, path, '&'.join(query), fragment)), key
+
+
+def _prefilter_literals(rule):
+    """规则配置的 prefilter（小写）；未配置或包含非 ASCII 字符串时返回 None（该规则总是执行正则）"""
+    literals = [str(lit) for lit in rule.get('prefilter') or ()]
+    if not literals or not all(lit and lit.isascii() for lit in literals):
+        return None
+    return tuple(sorted({lit.lower() for lit in literals}, key=len, reverse=True))
 
 
 def load_rules():
-    global _NETDISK_RULES
-    if not _NETDISK_RULES:
-        # 使用正确的路径计算
-        BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-        config_path = os.path.join(BASE_DIR, 'config', 'rules.yaml')
-        if os.path.exists(config_path):
-            with open(config_path, 'r', encoding='utf-8') as f:
-                config = yaml.safe_load(f)
-                _NETDISK_RULES = config.get('netdisk_rules', [])
-        else:
-            _NETDISK_RULES = []
+    """读取 rules.yaml 中的网盘规则，文件修改后（最多延迟 RULES_CHECK_INTERVAL 秒）重新加载"""
+    global _NETDISK_RULES, _RULES_MTIME, _RULES_CHECKED_AT, _CLASSIFIER
+    now = time.monotonic()
+    if _CLASSIFIER is not None and now - _RULES_CHECKED_AT < RULES_CHECK_INTERVAL:
+        return _NETDISK_RULES
+    _RULES_CHECKED_AT = now
+
+    try:
+        mtime = os.stat(RULES_PATH).st_mtime
+    except OSError:
+        mtime = None
+    if _CLASSIFIER is not None and mtime == _RULES_MTIME:
+        return _NETDISK_RULES
+
+    try:
+        rules = []
+        if mtime is not None:
+            with open(RULES_PATH, 'r', encoding='utf-8') as f:
+                config = yaml.safe_load(f) or {}
+                rules = config.get('netdisk_rules', [])
+        classifier = NetdiskClassifier(rules)
+    except (OSError, yaml.YAMLError, re.error, KeyError, TypeError):
+        # 文件正在编辑或规则有误时继续使用已加载的规则，下次检查时重试
+        if _CLASSIFIER is None:
+            raise
+        return _NETDISK_RULES
+    _NETDISK_RULES = rules
+    _RULES_MTIME = mtime
+    _CLASSIFIER = classifier
     return _NETDISK_RULES
 
 
-def match_netdisk_link(link: str) -> str:
-    link_lower = link.strip().lower()
-    rules = load_rules()
-    for rule in rules:
-        if re.search(rule['pattern'], link_lower, re.IGNORECASE):
-            return rule['name']
-    return "其他"
+def get_classifier() -> NetdiskClassifier:
+    load_rules()
+    return _CLASSIFIER
 
 
-def extract_links(text: str):
+def classify_link(link: str) -> str:
+    """识别单条链接的网盘类型，不是网盘链接时返回 OTHER_DISK"""
+    return get_classifier().classify(link)
+
+
+match_netdisk_link = classify_link
+
+
+def canonicalize_link(link: str, disk_type: str = None):
+    """规范化分享链接，返回 (canonical_url, dedup_key)，disk_type 为 classify_link 的结果"""
+    return get_classifier().canonicalize(link, disk_type)
+
+
+class KeywordMatcher:
+    """
+    标题关键词过滤：关键词按空格、逗号、竖线等分隔为多个词，标题包含任意一个词（不区分大小写）即匹配
+
+    每个任务只构建一次。关键词通常只有几个词，逐词使用 C 实现的子串查找比纯 Python 的多模式匹配更快。
+    """
+    SPLIT_PATTERN = re.compile(r'[ ,，|;；\t\n]+')
+
+    def __init__(self, keyword: str):
+        words = (word.strip().lower() for word in self.SPLIT_PATTERN.split(keyword or ''))
+        self.words = tuple(dict.fromkeys(word for word in words if word))
+
+    def matches(self, text: str) -> bool:
+        if not self.words:
+            return True
+        text_lower = text.lower()
+        for word in self.words:
+            if word in text_lower:
+                return True
+        return False
+
+
+class B64Budget:
+    """一个响应中 Base64 片段的解码名额，同一响应的多次提取（每个结果条目、每个 JSON 字符串）共用"""
+
+    def __init__(self, limit=MAX_B64_CANDIDATES):
+        self.remaining = limit
+
+
+def extract_classified_links(text: str, stats: dict = None, b64_budget: B64Budget = None) -> list:
+    """
+    从文本中提取网盘链接并识别类型
+
+    Args:
+        stats: 可选的统计字典，累加 Base64 片段的解码数（b64_decoded）与因上限跳过数（b64_skipped）
+        b64_budget: 可选的 Base64 解码名额，不指定时本次调用最多解码 MAX_B64_CANDIDATES 个片段
+
+    Returns:
+        [(link, disk_type), ...]，按出现顺序去重，不包含非网盘链接
+    """
+    return _classify_links(_raw_links(text, stats, b64_budget or B64Budget()))
+
+
+def _raw_links(text: str, stats, b64_budget) -> list:
     # 增加对转义字符的处理
     text = text.replace('\\/', '/')
+    raw_links = LINK_RE.findall(text)
+    raw_links.extend(_b64_links([b.encode('ascii') for b in B64_RE.findall(text)], stats, b64_budget))
+    return raw_links
 
-    # 匹配标准 URL 及 常见网盘特征
-    universal_pattern = r'(https?://[^\s\"\'><]+|magnet:\?xt=urn:btih:[a-zA-Z0-9]+|thunder://[A-Za-z0-9+/=]+|ed2k://[^\s\"\'><]+)'
-    raw_links = re.findall(universal_pattern, text)
 
-    # 尝试在文本中寻找可能的 Base64 编码 (针对部分防爬站点)
-    # 仅处理长度大于 20 且看起来像 Base64 的字符串
-    potential_b64 = re.findall(r'[A-Za-z0-9+/]{40,}=*', text)
-    for b in potential_b64:
-        try:
-            decoded = base64.b64decode(b).decode('utf-8', errors='ignore')
-            if "http" in decoded or "magnet" in decoded:
-                raw_links.extend(re.findall(universal_pattern, decoded))
-        except:
+def extract_json_links(obj, paths=None, stats: dict = None, b64_budget: B64Budget = None) -> list:
+    """
+    从已解析的 JSON 结构中提取网盘链接：遍历一次，只检查字符串叶子节点（不重新序列化整个对象）
+
+    Args:
+        paths: 可选的携带链接的路径列表（如 ['url', 'links.*.href', 'extra.0']），
+            按 . 分隔，* 匹配列表的全部元素或字典的全部值，数字为列表下标；不指定时遍历整个对象
+        b64_budget: 可选的 Base64 解码名额，不指定时整个对象（所有字符串叶子）共用 MAX_B64_CANDIDATES 个
+
+    Returns:
+        [(link, disk_type), ...]，按出现顺序去重
+    """
+    b64_budget = b64_budget or B64Budget()
+    roots = [obj] if not paths else [node for path in paths for node in _json_path_nodes(obj, path.split('.'))]
+    raw_links = []
+    stack = list(reversed(roots))
+    while stack:
+        node = stack.pop()
+        if isinstance(node, str):
+            # 链接需要 :// 或 magnet:（可能被转义为 :\/\/），Base64 片段至少 40 个字符
+            if ':' in node or len(node) >= 40:
+                raw_links.extend(_raw_links(node, stats, b64_budget))
+        elif isinstance(node, dict):
+            stack.extend(reversed(list(node.values())))
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+    return _classify_links(raw_links)
+
+
+def _json_path_nodes(obj, keys):
+    if not keys:
+        yield obj
+        return
+    key, rest = keys[0], keys[1:]
+    if key == '*':
+        children = obj.values() if isinstance(obj, dict) else obj if isinstance(obj, list) else ()
+        for child in children:
+            yield from _json_path_nodes(child, rest)
+    elif isinstance(obj, dict):
+        if key in obj:
+            yield from _json_path_nodes(obj[key], rest)
+    elif isinstance(obj, list) and key.isdigit() and int(key) < len(obj):
+        yield from _json_path_nodes(obj[int(key)], rest)
+
+
+def _b64_links(candidates, stats, b64_budget) -> list:
+    """
+    解码 Base64 片段并提取其中的链接
+
+    解码前先按 binascii 的填充规则筛掉必然解码失败的片段（数据字符数 d、尾部 = 个数 p：
+    d % 4 == 0，或 d % 4 == 2 且 p >= 2，或 d % 4 == 3 且 p >= 1 才能解码），避免异常开销；
+    解码后先在去掉非 ASCII 字节的结果上探测 http / magnet（按 errors='ignore' 解码后的 ASCII 字符
+    与原始字节中的 ASCII 字节顺序一致），探测不到的片段不再做 UTF-8 解码。
+    解码数受 b64_budget 限制，名额用完后的片段计入 b64_skipped。
+    """
+    links = []
+    decoded_count = 0
+    skipped = 0
+    for candidate in candidates:
+        data_len = len(candidate.rstrip(b'='))
+        remainder = data_len % 4
+        if remainder == 1 or (remainder == 2 and len(candidate) - data_len < 2) \
+                or (remainder == 3 and len(candidate) == data_len):
+            continue
+        if data_len > MAX_B64_LENGTH or b64_budget.remaining <= 0:
+            skipped += 1
+            continue
+        b64_budget.remaining -= 1
+        decoded_count += 1
+        raw = binascii.a2b_base64(candidate)
+        ascii_raw = raw.translate(None, _NON_ASCII_BYTES)
+        if b'http' not in ascii_raw and b'magnet' not in ascii_raw:
             continue
+        decoded = raw.decode('utf-8', errors='ignore')
+        if "http" in decoded or "magnet" in decoded:
+            links.extend(LINK_RE.findall(decoded))
+    if stats is not None:
+        stats['b64_decoded'] = stats.get('b64_decoded', 0) + decoded_count
+        stats['b64_skipped'] = stats.get('b64_skipped', 0) + skipped
+    return links
 
-    clean_results = []
-    disk_types = set()
+
+def _classify_links(raw_links) -> list:
+    classifier = get_classifier()
+    # 同一链接只识别一次（详情页中同一链接常重复出现）
+    results = {}
     for link in raw_links:
         link = link.rstrip('.,;)!?')
-        disk_name = match_netdisk_link(link)
-        if disk_name != "其他" and link not in clean_results:
-            clean_results.append(link)
-            disk_types.add(disk_name)
+        if link not in results:
+            results[link] = classifier.classify(link)
+    return [(link, disk) for link, disk in results.items() if disk != OTHER_DISK]
+
 
-    return ", ".join(clean_results), "/".join(disk_types)
+def extract_links(text: str):
+    """提取网盘链接，返回 ("链接1, 链接2", "网盘类型1/网盘类型2")"""
+    results = extract_classified_links(text)
+    return ", ".join(link for link, _ in results), "/".join(dict.fromkeys(disk for _, disk in results))
 
 
 def get_browser_headers(host=None):
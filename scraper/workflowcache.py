@@ -0,0 +1,88 @@
+"""
+工作流变量缓存
+
+带 workflow 的站点每次搜索前都要先请求一到多个页面提取 token（CSRF、会话参数等），
+这些变量与配套的会话 cookie 通常几分钟内都有效。工作流执行完成后，
+提取到的变量与 cookie 按站点缓存在 Redis 中（crawl:workflow:{site_key}），所有爬虫进程共用：
+- 缓存有效期内的爬取跳过工作流，直接带上缓存的变量与 cookie 发起搜索；
+- 搜索返回 403/422 说明 token 已失效，删除缓存并重新执行工作流；
+- 工作流 URL 引用了 {keyword} 的站点，提取结果与关键词相关，不缓存。
+"""
+import json
+import logging
+
+import redis
+
+from apps.search.redis_utils import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+WORKFLOW_CACHE_KEY = 'crawl:workflow:{site_key}'
+# 缓存命中后搜索返回这些状态码时，认为缓存的 token / cookie 已失效
+WORKFLOW_INVALID_HTTP_CODES = (403, 422)
+
+# 仅当缓存内容仍是读取到的那一份时才删除，避免删掉其他爬虫刚写入的新缓存
+_COMPARE_AND_DELETE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def workflow_cacheable(site_cfg: dict) -> bool:
+    """工作流的提取结果是否与关键词无关（可以跨关键词复用）"""
+    workflow = site_cfg.get('workflow') or []
+    return bool(workflow) and not any('{keyword}' in (step.get('url') or '') for step in workflow)
+
+
+def load_workflow_cache(site_key: str):
+    """
+    读取站点缓存的工作流变量
+
+    Returns:
+        (raw, {'context': {...}, 'cookies': {...}})；没有缓存或 Redis 不可用时返回 (None, None)
+    """
+    try:
+        rds = get_redis_client()
+        try:
+            raw = rds.get(WORKFLOW_CACHE_KEY.format(site_key=site_key))
+        finally:
+            rds.close()
+    except redis.RedisError as e:
+        logger.warning(f"工作流缓存读取失败: site={site_key}, error={e}")
+        return None, None
+    if not raw:
+        return None, None
+    try:
+        return raw, json.loads(raw)
+    except ValueError:
+        return None, None
+
+
+def save_workflow_cache(site_key: str, context: dict, cookies: dict, ttl: int):
+    """写入站点的工作流变量与会话 cookie，返回写入的原始值"""
+    raw = json.dumps({'context': context, 'cookies': cookies}, ensure_ascii=False, sort_keys=True)
+    try:
+        rds = get_redis_client()
+        try:
+            rds.set(WORKFLOW_CACHE_KEY.format(site_key=site_key), raw, ex=int(ttl))
+        finally:
+            rds.close()
+    except redis.RedisError as e:
+        logger.warning(f"工作流缓存写入失败: site={site_key}, error={e}")
+        return None
+    return raw
+
+
+def invalidate_workflow_cache(site_key: str, raw: str) -> bool:
+    """删除已失效的工作流缓存（仅当缓存仍是 raw 时）"""
+    try:
+        rds = get_redis_client()
+        try:
+            return bool(rds.eval(_COMPARE_AND_DELETE_LUA, 1, WORKFLOW_CACHE_KEY.format(site_key=site_key), raw))
+        finally:
+            rds.close()
+    except redis.RedisError as e:
+        logger.warning(f"工作流缓存删除失败: site={site_key}, error={e}")
+        return False
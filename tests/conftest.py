@@ -0,0 +1,24 @@
+"""
+pytest 入口：加载测试配置并创建测试数据库，测试用例为 Django 的 TestCase / SimpleTestCase
+
+Redis 使用 fakeredis（fake_redis_server 返回共享的内存服务，用 patch_redis 替换各模块的 get_redis_client）
+"""
+import os
+
+import django
+import pytest
+
+os.environ['DJANGO_SETTINGS_MODULE'] = 'tests.settings'
+django.setup()
+
+
+@pytest.fixture(scope='session', autouse=True)
+def django_test_database():
+    from django.test.utils import setup_databases, setup_test_environment, teardown_databases, \
+        teardown_test_environment
+
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    yield
+    teardown_databases(old_config, verbosity=0)
+    teardown_test_environment()
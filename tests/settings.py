@@ -0,0 +1,24 @@
+"""
+测试用 Django 配置：SQLite 内存数据库、本地内存缓存，不依赖 PostgreSQL 与 Redis 服务
+"""
+from scraper.settings import *  # noqa: F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+}
+
+# search 的表按当前模型直接建表：迁移中有 PostgreSQL 专用的分区 DDL，且 search_tasks 的部分字段没有对应的迁移
+MIGRATION_MODULES = {'search': None}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'crawl-res-test',
+    }
+}
+
+EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+CELERY_TASK_ALWAYS_EAGER = True
@@ -0,0 +1,79 @@
+import uuid
+
+from django.test import TestCase
+
+from apps.search.config_utils import get_keyword_cache_hard_ttl, get_keyword_cache_negative_ttl
+from apps.search.keyword_cache import (
+    FRESH_KEY, REFRESH_KEY, claim_keyword, claim_refresh, is_fresh, keyword_cache_key, settle_keyword
+)
+
+from tests.utils import patch_redis
+
+
+class KeywordCacheTests(TestCase):
+    def setUp(self):
+        self.rds = patch_redis(self)
+        self.keyword = '复仇者联盟'
+        self.leader = uuid.uuid4().hex
+        self.follower = uuid.uuid4().hex
+
+    def test_first_claim_wins(self):
+        self.assertEqual(claim_keyword(self.rds, self.keyword, self.leader), (True, self.leader))
+        self.assertEqual(claim_keyword(self.rds, self.keyword, self.follower), (False, self.leader))
+
+    def test_claim_retries_when_key_expires(self):
+        rds = self.rds
+        calls = []
+
+        class ExpiringRedis:
+            # 第一次 SET NX 失败后 key 恰好过期：GET 为空，重试认领
+            def set(self, *args, **kwargs):
+                calls.append('set')
+                return len(calls) > 1 and rds.set(*args, **kwargs)
+
+            def get(self, key):
+                return None
+
+        self.assertEqual(claim_keyword(ExpiringRedis(), self.keyword, self.leader), (True, self.leader))
+        self.assertEqual(calls, ['set', 'set'])
+
+    def test_settle_with_results_extends_to_hard_ttl(self):
+        claim_keyword(self.rds, self.keyword, self.leader)
+        self.assertTrue(settle_keyword(self.rds, self.keyword, self.leader, has_results=True))
+        self.assertTrue(is_fresh(self.rds, self.keyword, self.leader))
+        self.assertEqual(self.rds.ttl(keyword_cache_key(self.keyword)), get_keyword_cache_hard_ttl())
+
+    def test_settle_without_results_is_negative_cache(self):
+        claim_keyword(self.rds, self.keyword, self.leader)
+        self.assertTrue(settle_keyword(self.rds, self.keyword, self.leader, has_results=False))
+        self.assertEqual(self.rds.ttl(keyword_cache_key(self.keyword)), get_keyword_cache_negative_ttl())
+        self.assertEqual(self.rds.ttl(FRESH_KEY.format(keyword=self.keyword)), get_keyword_cache_negative_ttl())
+
+    def test_settle_does_not_overwrite_other_leader(self):
+        claim_keyword(self.rds, self.keyword, self.leader)
+        self.assertFalse(settle_keyword(self.rds, self.keyword, self.follower, has_results=True))
+        self.assertEqual(self.rds.get(keyword_cache_key(self.keyword)), self.leader)
+        self.assertFalse(is_fresh(self.rds, self.keyword, self.follower))
+
+    def test_successful_refresh_switches_to_new_task(self):
+        claim_keyword(self.rds, self.keyword, self.leader)
+        settle_keyword(self.rds, self.keyword, self.leader, has_results=True)
+        refresher = uuid.uuid4().hex
+        self.assertTrue(claim_refresh(self.rds, self.keyword, refresher))
+        self.assertFalse(claim_refresh(self.rds, self.keyword, self.follower))
+
+        self.assertTrue(settle_keyword(self.rds, self.keyword, refresher, has_results=True, refresh=True))
+        self.assertEqual(self.rds.get(keyword_cache_key(self.keyword)), refresher)
+        self.assertTrue(is_fresh(self.rds, self.keyword, refresher))
+        self.assertIsNone(self.rds.get(REFRESH_KEY.format(keyword=self.keyword)))
+
+    def test_failed_refresh_keeps_stale_results(self):
+        claim_keyword(self.rds, self.keyword, self.leader)
+        settle_keyword(self.rds, self.keyword, self.leader, has_results=True)
+        refresher = uuid.uuid4().hex
+        claim_refresh(self.rds, self.keyword, refresher)
+
+        self.assertFalse(settle_keyword(self.rds, self.keyword, refresher, has_results=False, refresh=True))
+        self.assertEqual(self.rds.get(keyword_cache_key(self.keyword)), self.leader)
+        # 负缓存时间后才允许再次刷新
+        self.assertEqual(self.rds.ttl(REFRESH_KEY.format(keyword=self.keyword)), get_keyword_cache_negative_ttl())
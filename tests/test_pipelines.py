@@ -0,0 +1,128 @@
+import asyncio
+import uuid
+from datetime import datetime
+from unittest import mock
+
+from django.db import OperationalError
+from django.test import SimpleTestCase, TestCase
+from scrapy.exceptions import DropItem
+
+from apps.search.models import DiskType, SiteSource, TaskResource
+from scraper.pipelines import RESULT_SEEN_KEY, DjangoPipeline
+
+from tests.utils import FakeStats, patch_redis
+
+
+def make_row(task_id, n):
+    return {
+        'task_id': str(task_id),
+        'url_hash': f'{n:032x}',
+        'title': f'资源 {n}',
+        'disk_type': '百度网盘',
+        'url': f'https://pan.baidu.com/s/{n}',
+        'site_source': '测试站点',
+        'seen_at': datetime(2026, 10, 17, 12, 0, n),
+    }
+
+
+class WriteRowsTests(TestCase):
+    def setUp(self):
+        self.rds = patch_redis(self, 'scraper.pipelines', 'apps.search.result_events')
+        for dim in (DiskType, SiteSource):
+            dim._name_to_id = dim._id_to_name = None
+        self.task_id = uuid.uuid4()
+        self.pipeline = DjangoPipeline(FakeStats(), max_retries=2)
+
+    def seen(self):
+        return self.rds.smembers(RESULT_SEEN_KEY.format(task_id=str(self.task_id)))
+
+    def test_writes_rows_and_skips_duplicates(self):
+        rows = [make_row(self.task_id, 1), make_row(self.task_id, 2)]
+        result = self.pipeline.write_rows(rows)
+        self.assertEqual(result['rows_written'], 2)
+        self.assertEqual(TaskResource.objects.filter(task_id=self.task_id).count(), 2)
+
+        # 其他站点再次找到同一资源：按去重集合过滤，不再写库
+        result = self.pipeline.write_rows([make_row(self.task_id, 1)])
+        self.assertEqual(result['rows_duplicate'], 1)
+        self.assertEqual(result['rows_written'], 0)
+
+    def test_failed_batch_releases_keys(self):
+        rows = [make_row(self.task_id, 1), make_row(self.task_id, 2)]
+        with mock.patch('scraper.pipelines.write_resource_results', side_effect=ValueError('bad row')):
+            result = self.pipeline.write_rows(rows)
+        self.assertEqual(result['rows_failed'], 2)
+        self.assertEqual(result['flush_errors'], 1)
+        self.assertEqual(self.seen(), set())
+
+        # 释放后同一资源仍可写入
+        result = self.pipeline.write_rows([make_row(self.task_id, 1), make_row(self.task_id, 2)])
+        self.assertEqual(result['rows_written'], 2)
+        self.assertEqual(self.seen(), {f'{1:032x}', f'{2:032x}'})
+
+    def test_transient_error_is_retried(self):
+        rows = [make_row(self.task_id, 1)]
+        with mock.patch('scraper.pipelines.write_resource_results',
+                        side_effect=[OperationalError('connection lost'), None]) as write, \
+                mock.patch('scraper.pipelines.connection'), mock.patch('scraper.pipelines.time.sleep'):
+            result = self.pipeline.write_rows(rows)
+        self.assertEqual(write.call_count, 2)
+        self.assertEqual(result['retries'], 1)
+        self.assertEqual(result['rows_written'], 1)
+        self.assertEqual(result['rows_failed'], 0)
+
+    def test_exhausted_retries_release_keys(self):
+        rows = [make_row(self.task_id, 1)]
+        with mock.patch('scraper.pipelines.write_resource_results',
+                        side_effect=OperationalError('connection lost')) as write, \
+                mock.patch('scraper.pipelines.connection'), mock.patch('scraper.pipelines.time.sleep'):
+            result = self.pipeline.write_rows(rows)
+        self.assertEqual(write.call_count, 3)
+        self.assertEqual(result['retries'], 2)
+        self.assertEqual(result['rows_failed'], 1)
+        self.assertEqual(self.seen(), set())
+
+
+class FlushTests(SimpleTestCase):
+    def setUp(self):
+        self.stats = FakeStats()
+        self.pipeline = DjangoPipeline(self.stats, batch_size=2, flush_interval=0)
+        self.pipeline.lock = asyncio.Lock()
+        self.spider = mock.Mock(task_id=str(uuid.uuid4()))
+
+    def item(self, n, task_id=None):
+        return {'task_id': task_id, 'resource_url': f'https://pan.baidu.com/s/{n}', 'title': f'资源 {n}',
+                'disk_type': '百度网盘', 'site_name': '测试站点'}
+
+    def run_async(self, coro):
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(coro)
+        finally:
+            loop.close()
+
+    def test_full_buffer_is_flushed(self):
+        written = []
+        with mock.patch.object(DjangoPipeline, 'write_rows', lambda _, rows: written.extend(rows) or
+                               {'rows_written': len(rows)}):
+            self.run_async(self.pipeline.process_item(self.item(1), self.spider))
+            self.assertEqual(written, [])
+            self.run_async(self.pipeline.process_item(self.item(2), self.spider))
+        self.assertEqual(len(written), 2)
+        self.assertEqual(self.pipeline.buffer, [])
+        self.assertEqual(self.stats.get_value('pipeline/rows_written'), 2)
+        self.assertEqual(self.stats.get_value('pipeline/flushes'), 1)
+
+    def test_unexpected_error_is_counted_not_raised(self):
+        self.pipeline.buffer = [{'task_id': self.spider.task_id}]
+        with mock.patch.object(DjangoPipeline, 'write_rows', side_effect=RuntimeError('redis gone')):
+            self.run_async(self.pipeline.flush())
+        self.assertEqual(self.stats.get_value('pipeline/flush_errors'), 1)
+        self.assertEqual(self.stats.get_value('pipeline/rows_failed'), 1)
+        self.assertEqual(self.pipeline.buffer, [])
+
+    def test_invalid_task_id_is_dropped(self):
+        with self.assertRaises(DropItem):
+            self.run_async(self.pipeline.process_item(self.item(1, task_id='not-a-uuid'), self.spider))
+        self.assertEqual(self.pipeline.buffer, [])
+        self.assertEqual(self.stats.get_value('pipeline/invalid_items'), 1)
@@ -0,0 +1,61 @@
+import uuid
+from datetime import date, datetime, timedelta
+
+from django.test import TestCase
+
+from apps.search.models import DiskType, Resource, SiteSource, TaskResource
+from apps.search.views import _decode_result_cursor, _encode_result_cursor, _result_page
+
+
+class ResultPageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for dim in (DiskType, SiteSource):
+            dim._name_to_id = dim._id_to_name = None
+        cls.task_id = uuid.uuid4()
+        baidu, quark = DiskType.id_for('百度网盘'), DiskType.id_for('夸克网盘')
+        site = SiteSource.id_for('测试站点')
+        base = datetime(2026, 10, 17, 12, 0, 0)
+        for n in range(7):
+            resource = Resource.objects.create(
+                url_hash=f'{n:032x}', title=f'资源 {n}', disk_id=baidu if n % 2 else quark,
+                url=f'https://example.com/{n}', site_id=site, last_seen_at=base,
+            )
+            link = TaskResource.objects.create(task_id=cls.task_id, resource=resource, site_id=site,
+                                               task_date=date(2026, 10, 17))
+            # 两两同一时间：翻页时 created_at 相同的行按 id 区分
+            TaskResource.objects.filter(pk=link.pk).update(created_at=base + timedelta(seconds=n // 2))
+        TaskResource.objects.create(task_id=uuid.uuid4(), resource=resource, site_id=site,
+                                    task_date=date(2026, 10, 17))
+
+    def all_pages(self, limit, **filters):
+        titles, cursor = [], None
+        while True:
+            rows, next_cursor = _result_page(self.task_id, cursor=cursor, limit=limit, fields=('title',), **filters)
+            titles += [row['title'] for row in rows]
+            if next_cursor is None:
+                return titles
+            cursor = _decode_result_cursor(next_cursor)
+
+    def test_cursor_round_trip(self):
+        row = {'created_at': datetime(2026, 10, 17, 12, 0, 0, 123456), 'id': 42}
+        self.assertEqual(_decode_result_cursor(_encode_result_cursor(row)), (row['created_at'], 42))
+
+    def test_invalid_cursor_raises_value_error(self):
+        with self.assertRaises(ValueError):
+            _decode_result_cursor('not-a-cursor')
+
+    def test_pages_cover_all_rows_once_in_order(self):
+        expected = [f'资源 {n}' for n in (6, 5, 4, 3, 2, 1, 0)]
+        for limit in (1, 2, 3, 7, 10):
+            self.assertEqual(self.all_pages(limit), expected)
+
+    def test_last_full_page_has_no_cursor(self):
+        rows, next_cursor = _result_page(self.task_id, limit=7)
+        self.assertEqual(len(rows), 7)
+        self.assertIsNone(next_cursor)
+
+    def test_filters(self):
+        self.assertEqual(self.all_pages(2, disk_type='百度网盘'), ['资源 5', '资源 3', '资源 1'])
+        self.assertEqual(_result_page(self.task_id, disk_type='不存在的网盘'), ([], None))
+        self.assertEqual(len(self.all_pages(3, site_source='测试站点')), 7)
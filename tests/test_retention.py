@@ -0,0 +1,125 @@
+import uuid
+from datetime import date, datetime, timedelta
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from apps.search import retention
+from apps.search.config_utils import get_result_retention_hours
+from apps.search.models import DiskType, Resource, SearchTask, SiteSource, TaskResource
+
+
+class PartitionTests(TestCase):
+    """分区管理只在 PostgreSQL 上生效，SQLite 上用同名普通表验证建表、删表的选择逻辑"""
+
+    def setUp(self):
+        retention._ensured_partition_days.clear()
+
+    def create_tables(self, *names):
+        with connection.cursor() as cursor:
+            for name in names:
+                cursor.execute(f"CREATE TABLE {connection.ops.quote_name(name)} (task_date date)")
+
+    def table_exists(self, name):
+        return name in connection.introspection.table_names()
+
+    def test_partition_names(self):
+        self.assertEqual(retention.partition_name(date(2026, 10, 17)), 'resource_results_p20261017')
+        self.assertEqual(retention.default_partition_name(), 'resource_results_default')
+
+    def test_ensure_is_noop_without_partitioning(self):
+        self.assertFalse(retention.results_partitioned())
+        self.assertEqual(retention.ensure_result_partitions({date(2026, 10, 17)}), [])
+        self.assertIn(date(2026, 10, 17), retention._ensured_partition_days)
+
+    def test_ensure_creates_each_missing_day_once(self):
+        days = {date(2026, 10, 17), date(2026, 10, 18)}
+        with mock.patch.object(retention, 'results_partitioned', return_value=True), \
+                mock.patch.object(retention, 'create_result_partitions',
+                                  side_effect=lambda day, n: [retention.partition_name(day)]) as create, \
+                self.assertLogs(retention.logger, 'ERROR'):
+            self.assertEqual(retention.ensure_result_partitions(days),
+                             ['resource_results_p20261017', 'resource_results_p20261018'])
+            self.assertEqual(retention.ensure_result_partitions(days), [])
+        self.assertEqual(create.call_count, 2)
+
+    def test_create_skips_existing_and_defaulted_days(self):
+        start = date(2026, 10, 17)
+        self.create_tables(retention.default_partition_name())
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO resource_results_default (task_date) VALUES (%s)", [start + timedelta(days=1)])
+        with mock.patch.object(retention, 'list_result_partitions', return_value=['resource_results_p20261017']), \
+                self.assertLogs(retention.logger, 'WARNING') as logs:
+            created = retention.create_result_partitions(start, 3)
+        # 第一天已存在，第二天默认分区中有数据，第三天在 SQLite 上建表失败：都不计入新建
+        self.assertEqual(created, [])
+        self.assertEqual(len(logs.output), 2)
+        self.assertIn('默认分区中已有', logs.output[0])
+        self.assertIn('resource_results_p20261019 创建失败', logs.output[1])
+
+    def test_drop_only_fully_expired_partitions(self):
+        names = ['resource_results_p20261015', 'resource_results_p20261016', 'resource_results_p20261017',
+                 'resource_results_default']
+        self.create_tables(*names)
+        with mock.patch.object(retention, 'list_result_partitions', return_value=names):
+            dropped = retention.drop_result_partitions(datetime(2026, 10, 17, 6, 0))
+        # p20261016 覆盖到 17 日零点，已整体早于 cutoff；p20261017 还有未过期的行，默认分区从不删除
+        self.assertEqual(dropped, ['resource_results_p20261015', 'resource_results_p20261016'])
+        self.assertFalse(self.table_exists('resource_results_p20261016'))
+        self.assertTrue(self.table_exists('resource_results_p20261017'))
+        self.assertTrue(self.table_exists('resource_results_default'))
+
+    def test_partition_horizon(self):
+        names = ['resource_results_p20261017', 'resource_results_p20261018', 'resource_results_p20261020']
+        with mock.patch.object(retention, 'list_result_partitions', return_value=names):
+            self.assertEqual(retention.partition_horizon_days(date(2026, 10, 17)), 2)
+            self.assertEqual(retention.partition_horizon_days(date(2026, 10, 19)), 0)
+
+
+class PurgeExpiredTests(TestCase):
+    """SQLite 上结果表未分区，过期的行按主键分批 DELETE"""
+
+    def setUp(self):
+        for dim in (DiskType, SiteSource):
+            dim._name_to_id = dim._id_to_name = None
+        self.now = timezone.now()
+        self.expired = self.now - timedelta(hours=get_result_retention_hours() + 1)
+        self.disk, self.site = DiskType.id_for('百度网盘'), SiteSource.id_for('测试站点')
+
+    def add_result(self, n, at, last_seen_at=None):
+        task = SearchTask.objects.create(keyword=f'关键词 {n}', email='user@example.com')
+        resource = Resource.objects.create(url_hash=f'{n:032x}', title=f'资源 {n}', disk_id=self.disk,
+                                           url=f'https://pan.baidu.com/s/{n}', site_id=self.site,
+                                           last_seen_at=last_seen_at or at)
+        link = TaskResource.objects.create(task_id=task.task_id, resource=resource, site_id=self.site,
+                                           task_date=at.date())
+        SearchTask.objects.filter(pk=task.pk).update(created_at=at)
+        TaskResource.objects.filter(pk=link.pk).update(created_at=at)
+        return task, resource, link
+
+    def test_purges_expired_rows(self):
+        old = [self.add_result(n, self.expired) for n in range(3)]
+        # 过期任务的资源最近又被其他任务找到：只删除过期的关联，资源保留
+        shared = self.add_result(3, self.expired, last_seen_at=self.now)
+        fresh = self.add_result(4, self.now)
+
+        report = retention.purge_expired(self.now)
+
+        self.assertEqual(report['partitions_created'], [])
+        self.assertEqual(report['partitions_dropped'], [])
+        self.assertEqual(report['results_deleted'], 4)
+        self.assertEqual(report['resources_deleted'], 3)
+        self.assertEqual(report['tasks_deleted'], 4)
+        self.assertEqual(list(TaskResource.objects.values_list('pk', flat=True)), [fresh[2].pk])
+        self.assertEqual(set(Resource.objects.values_list('pk', flat=True)), {shared[1].pk, fresh[1].pk})
+        self.assertEqual(list(SearchTask.objects.values_list('pk', flat=True)), [fresh[0].pk])
+        self.assertFalse(Resource.objects.filter(pk__in=[resource.pk for _, resource, _ in old]).exists())
+
+    def test_delete_in_batches_counts_rows(self):
+        for n in range(5):
+            self.add_result(n, self.expired)
+        deleted = retention.delete_in_batches(TaskResource.objects.filter(task_date__lt=self.now.date()), 2)
+        self.assertEqual(deleted, 5)
+        self.assertFalse(TaskResource.objects.exists())
@@ -0,0 +1,33 @@
+from django.test import SimpleTestCase
+
+from apps.search.search_index import build_tsquery, search_text
+
+
+class BuildTsqueryTests(SimpleTestCase):
+    def test_cjk_bigrams_are_adjacent(self):
+        self.assertEqual(build_tsquery('复仇者'), '(复仇 <-> 仇者)')
+        self.assertEqual(build_tsquery('剧'), '剧')
+
+    def test_alnum_terms_are_prefix_matched(self):
+        self.assertEqual(build_tsquery('Avengers 1080P'), 'avengers:* & 1080:* & p:*')
+        # 全角字母数字转半角
+        self.assertEqual(build_tsquery('ＡＢＣ２'), 'abc:* & 2:*')
+
+    def test_tsquery_operators_are_dropped(self):
+        for q in ("a & b", "a | b", "!a", "a:*", "(a)", "a <-> b", "'a'", "a\\b", 'a"b'):
+            tsquery = build_tsquery(q)
+            self.assertNotRegex(tsquery.replace(':*', '').replace(' & ', ''), r"[&|!():<>'\\\"]", q)
+        self.assertEqual(build_tsquery("复仇者' | !(x"), '(复仇 <-> 仇者) & x:*')
+
+    def test_no_terms(self):
+        self.assertEqual(build_tsquery(''), '')
+        self.assertEqual(build_tsquery('  !@#&|  '), '')
+
+    def test_query_terms_match_search_text(self):
+        tokens = set(search_text('复仇者联盟4 终局之战 1080P', 'https://pan.baidu.com/s/1abc').split())
+        for q in ('复仇者', '终局', '盟', '1080p'):
+            for term in build_tsquery(q).strip('()').split(' & '):
+                for token in term.strip('()').split(' <-> '):
+                    prefix = token.endswith(':*')
+                    token = token.removesuffix(':*')
+                    self.assertTrue(any(t.startswith(token) for t in tokens) if prefix else token in tokens, q)
@@ -0,0 +1,77 @@
+from django.test import SimpleTestCase
+
+from scraper.spiders.utils import NetdiskClassifier
+
+RULES = [
+    {'name': '百度网盘', 'pattern': r'(?:https?://)?(?:pan\.baidu\.com|bdpan\.com|baiduyun\.com)/',
+     'prefilter': ['pan.baidu.com', 'bdpan.com', 'baiduyun.com']},
+    {'name': '阿里云盘', 'pattern': r'(?:https?://)?(?:drive\.aliyun\.com|aliyundrive\.com|alipan\.com)/',
+     'canonical_host': 'www.alipan.com'},
+    {'name': '123云盘', 'pattern': r'(?:https?://)?(?:123pan\.com|123\d{3}\.com)/', 'code_params': ['提取码']},
+    {'name': '磁力链接', 'pattern': r'^magnet:\?xt=urn:btih:'},
+    {'name': '电驴链接', 'pattern': r'^ed2k://'},
+]
+
+
+class CanonicalizeTests(SimpleTestCase):
+    def setUp(self):
+        self.classifier = NetdiskClassifier(RULES)
+
+    def canonicalize(self, link):
+        return self.classifier.canonicalize(link, self.classifier.classify(link))
+
+    def test_netdisk_link_is_normalized(self):
+        url, key = self.canonicalize('http://PAN.baidu.com//s/1AbC/?pwd=x1y2#top')
+        self.assertEqual(url, 'https://pan.baidu.com/s/1AbC?pwd=x1y2')
+        self.assertEqual(key, 'pan.baidu.com/s/1AbC')
+
+    def test_share_code_variants_share_key(self):
+        keys = {self.canonicalize(link)[1] for link in (
+            'https://pan.baidu.com/s/1AbC',
+            'https://pan.baidu.com/s/1AbC?pwd=abcd',
+            'https://pan.baidu.com/s/1AbC?password=&pwd=efgh',
+            'http://Pan.Baidu.com/s/1AbC/?PWD=abcd',
+        )}
+        self.assertEqual(keys, {'pan.baidu.com/s/1AbC'})
+
+    def test_first_non_empty_code_is_kept_last(self):
+        url, _ = self.canonicalize('https://pan.baidu.com/s/1AbC?pwd=&from=web&password=abcd&pwd=efgh')
+        self.assertEqual(url, 'https://pan.baidu.com/s/1AbC?from=web&password=abcd')
+
+    def test_canonical_host(self):
+        a = self.canonicalize('https://aliyundrive.com/s/XyZ')
+        b = self.canonicalize('https://www.alipan.com/s/XyZ')
+        self.assertEqual(a, b)
+        self.assertEqual(a[0], 'https://www.alipan.com/s/XyZ')
+
+    def test_custom_code_params(self):
+        url, key = self.canonicalize('https://www.123pan.com/s/abc?%E6%8F%90%E5%8F%96%E7%A0%81=1234')
+        self.assertEqual(url, 'https://www.123pan.com/s/abc?%E6%8F%90%E5%8F%96%E7%A0%81=1234')
+        self.assertEqual(key, 'www.123pan.com/s/abc')
+
+    def test_spa_route_fragment_is_kept(self):
+        url, key = self.canonicalize('https://pan.baidu.com/share/#/s/1AbC')
+        self.assertEqual(url, 'https://pan.baidu.com/share#/s/1AbC')
+        self.assertEqual(key, 'pan.baidu.com/share#/s/1AbC')
+
+    def test_non_netdisk_link_keeps_scheme(self):
+        url, key = self.canonicalize('http://Example.com:8080/a//b/')
+        self.assertEqual(url, 'http://example.com:8080/a/b')
+        self.assertEqual(key, 'example.com:8080/a/b')
+        self.assertEqual(self.canonicalize('https://example.com:443/a')[0], 'https://example.com/a')
+
+    def test_magnet_hash_case(self):
+        hex_hash = 'ABCDEF0123456789ABCDEF0123456789ABCDEF01'
+        url, key = self.canonicalize(f'magnet:?xt=urn:btih:{hex_hash}&dn=x')
+        self.assertEqual(url, f'magnet:?xt=urn:btih:{hex_hash.lower()}&dn=x')
+        self.assertEqual(key, f'btih:{hex_hash.lower()}')
+        base32_hash = 'abcdefghijklmnopqrstuvwxyz234567'
+        self.assertEqual(self.canonicalize(f'magnet:?xt=urn:btih:{base32_hash}')[1], f'btih:{base32_hash.upper()}')
+
+    def test_ed2k_key(self):
+        link = 'ed2k://|file|Movie.mkv|1024|0123456789ABCDEF0123456789ABCDEF|/'
+        self.assertEqual(self.canonicalize(link), (link, 'ed2k:1024:0123456789abcdef0123456789abcdef'))
+
+    def test_unparsable_link_is_returned_as_is(self):
+        link = 'https://pan.baidu.com:99999/s/1'
+        self.assertEqual(self.canonicalize(link), (link, link))
@@ -0,0 +1,31 @@
+"""测试辅助：fakeredis 替换 Redis 客户端、内存中的爬虫 stats"""
+from unittest import mock
+
+import fakeredis
+
+
+class FakeStats:
+    """只实现 DjangoPipeline 用到的 inc_value"""
+
+    def __init__(self):
+        self.values = {}
+
+    def inc_value(self, key, count=1):
+        self.values[key] = self.values.get(key, 0) + count
+
+    def get_value(self, key, default=None):
+        return self.values.get(key, default)
+
+
+def patch_redis(testcase, *modules):
+    """在 testcase 期间把 modules 中的 get_redis_client 换成同一个 fakeredis 服务，返回该服务的客户端"""
+    server = fakeredis.FakeServer()
+
+    def client(decode_responses=True):
+        return fakeredis.FakeRedis(server=server, decode_responses=decode_responses)
+
+    for module in modules:
+        patcher = mock.patch(f'{module}.get_redis_client', client)
+        patcher.start()
+        testcase.addCleanup(patcher.stop)
+    return client()